@@ -0,0 +1,113 @@
+"""
+Chunking benchmark: simple vs recursive vs semantic ChunkDocument modes.
+
+Builds a synthetic corpus of documents that switch topic every few
+sentences, plants one "fact" sentence per segment, and queries for each
+fact with a hashing embedder. Reports chunk count, average tokens per
+chunk, recall@k (a retrieved chunk contains the whole fact sentence) and
+chunking time for each mode.
+
+    python benchmarks/bench_chunking.py --docs 50 --top-k 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from langchain.schema import Document  # noqa: E402
+
+from data_pipeline.preprocessor import ChunkDocument  # noqa: E402
+from fakes import HashingEmbedder, load_tokenizer  # noqa: E402
+
+TOPICS = {
+    "finance": "revenue profit margin quarter earnings dividend equity cash debt audit",
+    "medicine": "patient dosage clinical trial symptom diagnosis therapy vaccine cardiac",
+    "legal": "contract clause liability plaintiff statute court appeal breach tenant",
+    "software": "server latency cache deploy kernel thread compiler database index query",
+    "travel": "flight hotel passport luggage itinerary airport visa beach museum tour",
+    "farming": "harvest soil irrigation crop tractor fertilizer cattle barn seed yield",
+}
+
+
+def make_corpus(rng, n_docs):
+    docs, facts = [], []
+    names = list(TOPICS)
+    for d in range(n_docs):
+        sentences = []
+        for _ in range(rng.randint(4, 8)):
+            topic = rng.choice(names)
+            vocab = TOPICS[topic].split()
+            segment = [
+                " ".join(rng.choice(vocab) for _ in range(rng.randint(8, 18))).capitalize() + "."
+                for _ in range(rng.randint(3, 8))
+            ]
+            marker = f"fact{len(facts)}"
+            fact = f"The {marker} record notes {' '.join(rng.sample(vocab, 4))}."
+            segment.insert(rng.randrange(len(segment) + 1), fact)
+            facts.append((fact, f"{marker} {' '.join(rng.sample(vocab, 3))}"))
+            sentences.extend(segment)
+        docs.append(Document(page_content=" ".join(sentences), metadata={"doc_id": f"doc{d}"}))
+    return docs, facts
+
+
+def evaluate(chunker, docs, facts, embedder, tokenizer, top_k):
+    start = time.perf_counter()
+    chunks = [chunk.page_content for chunk in chunker.chunk(docs)]
+    elapsed = time.perf_counter() - start
+
+    vectors = np.asarray(embedder.embed_documents(chunks), dtype=np.float32)
+    queries = np.asarray(embedder.embed_documents([q for _, q in facts]), dtype=np.float32)
+    top = np.argsort(-(queries @ vectors.T), axis=1)[:, :top_k]
+    hits = sum(
+        any(fact in chunks[i] for i in row) for (fact, _), row in zip(facts, top)
+    )
+    tokens = [len(t) for t in tokenizer.encode_batch(chunks)]
+    return {
+        "chunks": len(chunks),
+        "avg_tokens": float(np.mean(tokens)),
+        "recall": hits / len(facts),
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    docs, facts = make_corpus(rng, args.docs)
+    embedder = HashingEmbedder()
+    tokenizer = load_tokenizer()
+
+    print(f"{args.docs} documents, {len(facts)} queries, recall@{args.top_k}")
+    print(f"{'mode':<10} {'chunks':>7} {'avg_tok':>8} {'recall':>7} {'time_ms':>8}")
+    for mode in ("simple", "recursive", "semantic"):
+        configs = {
+            "mode": mode,
+            "chunk_size": args.chunk_size,
+            "chunk_overlap": args.chunk_overlap,
+            "max_tokens": args.max_tokens,
+        }
+        chunker = ChunkDocument(configs, embedding_model=embedder if mode == "semantic" else None)
+        chunker.tokenizer = tokenizer
+        result = evaluate(chunker, docs, facts, embedder, tokenizer, args.top_k)
+        print(
+            f"{mode:<10} {result['chunks']:>7} {result['avg_tokens']:>8.1f} "
+            f"{result['recall']:>7.3f} {result['seconds'] * 1000:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
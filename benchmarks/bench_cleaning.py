@@ -0,0 +1,141 @@
+"""
+Cleaning benchmark.
+
+Checks that the cleaning engine produces byte-identical output to the original
+seven-pass cleaner on generated documents, then times both on multi-MB
+inputs.
+
+    python benchmarks/bench_cleaning.py --size-mb 4
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from data_pipeline.cleaning import clean_text, clean_text_stream  # noqa: E402
+
+
+def legacy_clean(text):
+    """The cleaner as it was before precompiled patterns, kept as the reference."""
+    text = unicodedata.normalize("NFKC", text)
+    text = text.replace("\x00", "").replace("\x0c", "")
+    text = re.sub(r"<script.*?>.*?</script>", "", text, flags=re.DOTALL)
+    text = re.sub(r"<style.*?>.*?</style>", "", text, flags=re.DOTALL)
+    text = re.sub(r"<[^>]+>", "", text)
+    text = re.sub(r"(\w+)-\s*\n\s*(\w+)", r"\1\2", text)
+    text = re.sub(r"Page\s+\d+(\s+of\s+\d+)?", "", text, flags=re.IGNORECASE)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = re.sub(r"[ \t]{2,}", " ", text)
+    text = text.strip()
+    lines = text.splitlines()
+    if len(lines) > 4:
+        header = lines[0]
+        footer = lines[-1]
+        lines = [
+            line for line in lines
+            if line.strip() != header.strip() and line.strip() != footer.strip()
+        ]
+        text = "\n".join(lines)
+    return text.strip()
+
+
+FRAGMENTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Revenue grew by 12% year over year",
+    "inter-\nnational", "multi-  \n  line", "a-\nbc-\nd", "state-of-the-art",
+    "Page 3 of 10", "page 7", "PAGE  12", "Page\n4",
+    "<p>para</p>", "<script>var x = 1;</script>", "<style>p {}</style>",
+    "<style><script></style>x</script>", "<<script>y</script>b>", "a < b > c",
+    "\x00", "\x0c", "ﬁnance", "Ⅻ", "café", "ｆｕｌｌｗｉｄｔｈ",
+    "  ", "\t\t", " \t ", "\n", "\n\n", "\n\n\n\n", "\r\n", " ",
+]
+
+
+def random_document(rng, n_fragments):
+    header = "ACME Corp Annual Report"
+    parts = [header, "\n"]
+    for _ in range(n_fragments):
+        parts.append(rng.choice(FRAGMENTS))
+        parts.append(rng.choice([" ", "\n", "", "  "]))
+    parts.extend(["\n", "Confidential"])
+    return "".join(parts)
+
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog revenue grew by twelve percent "
+    "year over international multi-line agreement policy section"
+).split()
+SEPARATORS = [" "] * 20 + ["\n", "  ", "-\n", "\n\n\n"]
+
+
+def random_prose(rng, n_chars):
+    """Mostly-ASCII running text, closer to what PDF extraction produces."""
+    parts = []
+    size = 0
+    while size < n_chars:
+        word = rng.choice(WORDS)
+        sep = rng.choice(SEPARATORS)
+        parts.append(word)
+        parts.append(sep)
+        size += len(word) + len(sep)
+    return "".join(parts)
+
+
+def check_golden(n_docs=2000, seed=0):
+    rng = random.Random(seed)
+    for i in range(n_docs):
+        if i % 10:
+            doc = random_document(rng, rng.randint(0, 200))
+        else:
+            doc = random_prose(rng, rng.randint(0, 5000))
+        expected = legacy_clean(doc)
+        actual = clean_text(doc)
+        if expected != actual:
+            raise AssertionError(f"output mismatch on document {i}: {doc!r}")
+    print(f"golden: {n_docs} documents identical")
+
+
+def bench(name, fn, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    mb = len(text.encode("utf-8")) / 1e6
+    print(f"{name:<10} {best * 1000:9.1f} ms  {mb / best:8.1f} MB/s")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=4.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    check_golden(seed=args.seed)
+
+    rng = random.Random(args.seed)
+    n_chars = int(args.size_mb * 1e6)
+    mixed = random_document(rng, 1000)
+    while len(mixed) < n_chars:
+        mixed += random_document(rng, 1000)
+    inputs = {"mixed": mixed, "prose": random_prose(rng, n_chars)}
+
+    for name, text in inputs.items():
+        print(f"\n{name}: {len(text) / 1e6:.1f}M chars")
+        legacy = bench("legacy", legacy_clean, text, args.repeat)
+        compiled = bench("compiled", clean_text, text, args.repeat)
+        bench("streaming", lambda t: "\n\n".join(clean_text_stream(
+            t[i:i + 65536] for i in range(0, len(t), 65536))), text, args.repeat)
+        print(f"speedup: {legacy / compiled:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
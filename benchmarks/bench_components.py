@@ -0,0 +1,215 @@
+"""
+Micro-benchmarks for the building blocks of the RAG service.
+
+Sections (pick with --only):
+  embed     EmbedDocument batches through the hashing embedder
+  search    FAISS search per Indexer type (IVF/flat, HNSW, IVF_PQ)
+  diversify MMR + near-duplicate collapse over 100 candidate vectors
+  minhash   MinHash signature of one chunk, and an LSH lookup among 10k chunks
+  rerank    Reranker.rerank with a tiny torch cross-encoder, per candidate count
+  chunking  ChunkDocument simple vs recursive
+  cleaning  clean_text on mixed HTML/PDF-style text
+  cache     encode+decode of an embedding: JSON (Cache_client) vs raw float32
+
+Inputs are generated from fixed seeds, so runs on the same machine are
+comparable. Save a run with --save-baseline and check later runs with
+--baseline; the script exits non-zero when a metric regresses.
+
+    python benchmarks/bench_components.py --save-baseline benchmarks/baselines/components.json
+    python benchmarks/bench_components.py --baseline benchmarks/baselines/components.json
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from langchain.schema import Document  # noqa: E402
+
+from data_pipeline.cleaning import clean_text  # noqa: E402
+from data_pipeline.indexer import Indexer  # noqa: E402
+from data_pipeline.preprocessor import ChunkDocument, EmbedDocument  # noqa: E402
+from data_pipeline.near_duplicates import NearDuplicateIndex  # noqa: E402
+from engine.diversify import Diversifier  # noqa: E402
+from fakes import HashingEmbedder, make_cross_encoder  # noqa: E402
+from report import add_baseline_args, bench, finish  # noqa: E402
+
+WORDS = (
+    "revenue profit margin quarter earnings patient dosage clinical trial contract "
+    "clause liability server latency cache deploy kernel flight hotel harvest soil "
+    "irrigation index query thread compiler statute appeal vaccine cardiac audit"
+).split()
+
+
+def sentence(rng, n=12):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def paragraph(rng, sentences=6):
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+
+def bench_embed(rng, args):
+    texts = [paragraph(rng, 3) for _ in range(512)]
+    docs = [Document(page_content=text, metadata={}) for text in texts]
+    results = {}
+    for batch_size in (16, 64, 256):
+        embedder = EmbedDocument(HashingEmbedder(args.dims), batch_size=batch_size)
+        results[f"embed/batch={batch_size}"] = bench(
+            lambda: embedder.embed(docs), repeat=args.repeat
+        )
+    return results
+
+
+def bench_search(rng, args):
+    np_rng = np.random.default_rng(args.seed)
+    vectors = np_rng.standard_normal((args.vectors, args.dims)).astype("float32")
+    queries = np_rng.standard_normal((args.queries, args.dims)).astype("float32")
+    results = {}
+    for index_type in ("IVF", "HNSW", "IVF_PQ"):
+        indexer = Indexer(args.dims, index_type, "cosine", n_list=64, m=16)
+        indexer.train(vectors.copy())
+        indexer.add(vectors.copy())
+
+        def search():
+            for i in range(len(queries)):
+                indexer.search(queries[i:i + 1].copy(), 10)
+
+        timing = bench(search, repeat=args.repeat)
+        # report per query, not per batch of queries
+        results[f"search/{index_type}"] = {
+            "median_ms": timing["median_ms"] / len(queries),
+            "ops_per_s": timing["ops_per_s"] * len(queries),
+        }
+    return results
+
+
+def bench_diversify(rng, args):
+    np_rng = np.random.default_rng(args.seed)
+    query = np_rng.standard_normal(args.dims).astype("float32")
+    # 100 candidates: 50 distinct vectors plus a slightly perturbed copy of each,
+    # like overlapping chunk windows
+    base = np_rng.standard_normal((50, args.dims)).astype("float32")
+    vectors = np.vstack([base, base + 0.05 * np_rng.standard_normal(base.shape).astype("float32")])
+    docs = list(range(len(vectors)))
+    results = {}
+    for k in (10, 20):
+        diversifier = Diversifier(lambda_=0.5, duplicate_threshold=0.95, k=k)
+        results[f"diversify/100->{k}"] = bench(
+            lambda: diversifier.select(query, docs, vectors), repeat=args.repeat, number=100
+        )
+    return results
+
+
+def bench_minhash(rng, args):
+    index = NearDuplicateIndex(":memory:")
+    chunks = [paragraph(rng, 8) for _ in range(10000)]
+    index.add_many((str(i), index.signature(chunk)) for i, chunk in enumerate(chunks))
+    probe = chunks[0]
+    signature = index.signature(probe)
+    return {
+        "minhash/signature": bench(lambda: index.signature(probe), repeat=args.repeat, number=100),
+        "minhash/query": bench(lambda: index.query(signature), repeat=args.repeat, number=100),
+    }
+
+
+def bench_rerank(rng, args):
+    try:
+        model, tokenizer = make_cross_encoder(seed=args.seed)
+    except ImportError:
+        print("rerank: skipped (torch is not installed)")
+        return {}
+    from engine.reranker import Reranker
+
+    reranker = Reranker(model, tokenizer, top_n=5)
+    query = sentence(rng, 8)
+    results = {}
+    for candidates in (10, 25, 50, 100):
+        docs = [Document(page_content=paragraph(rng, 4), metadata={}) for _ in range(candidates)]
+        results[f"rerank/candidates={candidates}"] = bench(
+            lambda: reranker.rerank(query, docs), repeat=args.repeat
+        )
+    return results
+
+
+def bench_chunking(rng, args):
+    docs = [
+        Document(page_content="\n\n".join(paragraph(rng) for _ in range(20)), metadata={"doc_id": str(i)})
+        for i in range(20)
+    ]
+    results = {}
+    for mode in ("simple", "recursive"):
+        chunker = ChunkDocument({"mode": mode, "chunk_size": 800, "chunk_overlap": 80})
+        results[f"chunking/{mode}"] = bench(lambda: chunker.chunk(docs), repeat=args.repeat)
+    return results
+
+
+def bench_cleaning(rng, args):
+    pages = []
+    for i in range(200):
+        body = paragraph(rng, 8).replace(" kernel ", " ker-\nnel ")
+        pages.append(f"ACME Corp Annual Report\n<p>{body}</p>\n\n\n{i + 1}\n")
+    text = "\f".join(pages)
+    return {"cleaning/clean_text": bench(lambda: clean_text(text), repeat=args.repeat)}
+
+
+def bench_cache(rng, args):
+    vector = np.random.default_rng(args.seed).standard_normal(args.dims).astype("float32")
+    as_list = vector.tolist()
+
+    def json_codec():
+        # what Cache_client does for set_cached_embedding / get_cached_embedding
+        json.loads(json.dumps(as_list))
+
+    def float32_codec():
+        np.frombuffer(base64.b64decode(base64.b64encode(vector.tobytes())), dtype=np.float32)
+
+    return {
+        "cache/json": {**bench(json_codec, repeat=args.repeat, number=200),
+                       "bytes": len(json.dumps(as_list))},
+        "cache/float32_b64": {**bench(float32_codec, repeat=args.repeat, number=200),
+                              "bytes": len(base64.b64encode(vector.tobytes()))},
+    }
+
+
+SECTIONS = {
+    "embed": bench_embed,
+    "search": bench_search,
+    "diversify": bench_diversify,
+    "minhash": bench_minhash,
+    "rerank": bench_rerank,
+    "chunking": bench_chunking,
+    "cleaning": bench_cleaning,
+    "cache": bench_cache,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", nargs="+", choices=sorted(SECTIONS), default=list(SECTIONS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.only:
+        results.update(SECTIONS[name](random.Random(args.seed), args))
+
+    print(f"{'benchmark':<34} {'median_ms':>10} {'ops/s':>12}")
+    for name, metrics in results.items():
+        print(f"{name:<34} {metrics['median_ms']:>10.3f} {metrics['ops_per_s']:>12.1f}")
+    return finish(args, results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+AsyncLLMClient against a fake LLM with injected tail latency.
+
+Runs the same request stream with hedging off and on and reports latency
+percentiles, retries and hedge counts.
+
+    python benchmarks/bench_llm_client.py --requests 500 --tail-prob 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from engine.llm_client import AsyncLLMClient  # noqa: E402
+from fakes import FakeLLM  # noqa: E402
+
+
+async def drive(client, n_requests, concurrency):
+    latencies = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with gate:
+            start = time.perf_counter()
+            await client.invoke(f"prompt {i}")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    return np.asarray(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--tail-prob", type=float, default=0.05)
+    parser.add_argument("--tail-latency", type=float, default=0.3)
+    parser.add_argument("--fail-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    print(f"{'hedge':<6} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'retries':>8} {'hedges':>7} {'wins':>5}")
+    for hedge in (False, True):
+        llm = FakeLLM(args.latency, args.latency / 2, args.tail_prob, args.tail_latency,
+                      args.fail_rate, seed=0)
+        client = AsyncLLMClient(llm, max_concurrency=args.concurrency * 2, hedge=hedge,
+                                backoff=args.latency)
+        latencies = asyncio.run(drive(client, args.requests, args.concurrency)) * 1000
+        stats = client.stats()
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"{str(hedge):<6} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} "
+              f"{stats['retries']:>8} {stats['hedges']:>7} {stats['hedge_wins']:>5}")
+
+
+if __name__ == "__main__":
+    main()
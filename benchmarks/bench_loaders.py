@@ -0,0 +1,105 @@
+"""
+Throughput and memory of LoaderDocument per input format.
+
+Each format gets the same generated content (headed sections of
+paragraphs), written to a temp file and streamed through
+LoaderDocument.load_documents(). Reported per format:
+
+  mb_per_s      input megabytes parsed per second
+  sections      Documents produced
+  peak_heap_mb  tracemalloc peak while parsing; streaming keeps this flat
+                as the file grows, so compare it against file_mb
+
+    python benchmarks/bench_loaders.py --sections 2000
+    python benchmarks/bench_loaders.py --save-baseline benchmarks/baselines/loaders.json
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from data_pipeline.loader import LoaderDocument  # noqa: E402
+from fakes import make_docx, make_html, make_pdf  # noqa: E402
+from report import add_baseline_args, finish  # noqa: E402
+
+WORDS = (
+    "revenue profit margin quarter earnings patient dosage clinical trial contract "
+    "clause liability server latency cache deploy kernel flight hotel harvest soil"
+).split()
+
+
+def paragraph(rng, sentences=4):
+    return " ".join(
+        " ".join(rng.choice(WORDS) for _ in range(12)).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+def make_sections(rng, n, paragraphs):
+    return [(f"Section {i + 1}", [paragraph(rng) for _ in range(paragraphs)]) for i in range(n)]
+
+
+def make_text(sections):
+    return "\f".join(
+        heading + "\n\n" + "\n\n".join(paragraphs) for heading, paragraphs in sections
+    ).encode("utf-8")
+
+
+def measure(loader, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    sections = sum(1 for _ in loader.load_documents(path, os.path.basename(path)))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = os.path.getsize(path) / 2**20
+    return {
+        "file_mb": size,
+        "sections": sections,
+        "mb_per_s": size / elapsed,
+        "peak_heap_mb": peak / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, default=1000)
+    parser.add_argument("--paragraphs", type=int, default=8)
+    parser.add_argument("--pdf-pages", type=int, default=200,
+                        help="PDF extraction is much slower, so it gets fewer pages")
+    parser.add_argument("--seed", type=int, default=0)
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sections = make_sections(rng, args.sections, args.paragraphs)
+    inputs = {
+        "docx": make_docx(sections),
+        "html": make_html(sections),
+        "txt": make_text(sections),
+        "pdf": make_pdf(["\n".join(paragraphs) for _, paragraphs in sections[:args.pdf_pages]]),
+    }
+    loader = LoaderDocument({"section_chars": 4000})
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for extension, data in inputs.items():
+            path = os.path.join(workdir, f"input.{extension}")
+            with open(path, "wb") as f:
+                f.write(data)
+            results[f"loader/{extension}"] = measure(loader, path)
+
+    print(f"{'format':<14} {'file_mb':>8} {'sections':>9} {'mb_per_s':>9} {'peak_heap_mb':>13}")
+    for name, metrics in results.items():
+        print(f"{name:<14} {metrics['file_mb']:>8.2f} {metrics['sections']:>9} "
+              f"{metrics['mb_per_s']:>9.2f} {metrics['peak_heap_mb']:>13.2f}")
+    return finish(args, results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
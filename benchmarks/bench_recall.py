@@ -0,0 +1,115 @@
+"""
+Recall, latency and memory of the vector index modes.
+
+Builds every index over the same clustered synthetic embeddings (real
+embeddings cluster by topic, and isotropic noise is a needlessly hard
+case for sign quantization), then reports per mode:
+
+  recall     recall@k against exact cosine search
+  median_ms  per-query search latency
+  index_mb   serialized index size, i.e. what search keeps in RAM
+
+BINARY modes are listed twice: with rescoring from the float store and
+with rescore_factor=1, which is what Hamming ranking alone gets.
+
+    python benchmarks/bench_recall.py --vectors 100000 --dims 384
+    python benchmarks/bench_recall.py --save-baseline benchmarks/baselines/recall.json
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from data_pipeline.binary_indexer import BinaryIndexer  # noqa: E402
+from data_pipeline.indexer import Indexer  # noqa: E402
+from report import add_baseline_args, bench, finish  # noqa: E402
+
+
+def clustered(rng, n, dims, centers, spread):
+    labels = rng.integers(len(centers), size=n)
+    return (centers[labels] + spread * rng.standard_normal((n, dims))).astype("float32")
+
+
+def normalized(vectors):
+    vectors = vectors.copy()
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def index_bytes(indexer):
+    if isinstance(indexer, BinaryIndexer):
+        return faiss.serialize_index_binary(indexer.index).nbytes
+    return faiss.serialize_index(indexer.index).nbytes
+
+
+def evaluate(indexer, queries, truth, k, repeat):
+    _, found = indexer.search(queries.copy(), k)
+    hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth))
+
+    def search():
+        for i in range(len(queries)):
+            indexer.search(queries[i:i + 1].copy(), k)
+
+    timing = bench(search, repeat=repeat)
+    return {
+        "recall": hits / truth.size,
+        "median_ms": timing["median_ms"] / len(queries),
+        "ops_per_s": timing["ops_per_s"] * len(queries),
+        "index_mb": index_bytes(indexer) / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--spread", type=float, default=0.6)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((args.clusters, args.dims))
+    vectors = clustered(rng, args.vectors, args.dims, centers, args.spread)
+    queries = clustered(rng, args.queries, args.dims, centers, args.spread)
+    truth = np.argsort(-(normalized(queries) @ normalized(vectors).T), axis=1)[:, :args.k]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        modes = {
+            "HNSW": Indexer(args.dims, "HNSW", "cosine", n_list=256, m=16),
+            "IVF_PQ": Indexer(args.dims, "IVF_PQ", "cosine", n_list=256, m=16),
+        }
+        for index_type in ("BINARY", "BINARY_HNSW"):
+            for rescore_factor, suffix in ((args.rescore_factor, ""), (1, "/no_rescore")):
+                modes[index_type + suffix] = BinaryIndexer(
+                    args.dims, index_type, "cosine",
+                    vectors_path=os.path.join(workdir, f"{index_type}{rescore_factor}.f32"),
+                    rescore_factor=rescore_factor,
+                )
+
+        results = {}
+        for name, indexer in modes.items():
+            indexer.train(vectors.copy())
+            indexer.add(vectors.copy())
+            results[f"index/{name}"] = evaluate(indexer, queries, truth, args.k, args.repeat)
+
+    print(f"{'index':<30} {'recall@' + str(args.k):>10} {'median_ms':>10} {'index_mb':>10}")
+    for name, metrics in results.items():
+        print(f"{name:<30} {metrics['recall']:>10.3f} {metrics['median_ms']:>10.3f} "
+              f"{metrics['index_mb']:>10.2f}")
+    return finish(args, results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+Offline stand-ins for the models used by the benchmarks.
+
+Nothing here downloads weights or calls a remote service, so every
+benchmark runs on a CPU-only box without network access.
+"""
+
+import asyncio
+import random
+import re
+import time
+import zlib
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """
+    Bag-of-words feature hashing, L2-normalised.
+
+    Texts sharing vocabulary get similar vectors, which is enough for
+    relative comparisons of chunking and retrieval settings.
+    """
+
+    def __init__(self, dims=256):
+        self.dims = dims
+        self.model_name = f"hashing-{dims}"
+
+    def embed_documents(self, texts):
+        vectors = np.zeros((len(texts), self.dims), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in _WORD_RE.findall(text.lower()):
+                vectors[row, zlib.crc32(word.encode("utf-8")) % self.dims] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.maximum(norms, 1e-12)).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class WhitespaceTokenizer:
+    """tiktoken-shaped tokenizer for when the BPE files cannot be downloaded."""
+
+    def encode(self, text):
+        return text.split()
+
+    def encode_batch(self, texts, num_threads=1):
+        return [self.encode(text) for text in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def load_tokenizer(encoding="cl100k_base"):
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(encoding)
+    except Exception:
+        return WhitespaceTokenizer()
+
+
+class FakeLLMServerError(RuntimeError):
+    """Injected failure, shaped like an SDK error for an HTTP 503."""
+
+    status_code = 503
+
+
+class FakeLLM:
+    """
+    LLM with injected latency: `latency` seconds plus uniform `jitter`, and
+    with probability `tail_prob` an extra `tail_latency` to mimic stragglers.
+    Calls fail with a retryable server error with probability `fail_rate`.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.01, tail_prob=0.0, tail_latency=0.5,
+                 fail_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.tail_prob = tail_prob
+        self.tail_latency = tail_latency
+        self.fail_rate = fail_rate
+        self._rng = random.Random(seed)
+
+    def _delay(self):
+        delay = self.latency + self._rng.uniform(0, self.jitter)
+        if self._rng.random() < self.tail_prob:
+            delay += self.tail_latency
+        return delay
+
+    def _answer(self, prompt):
+        if self._rng.random() < self.fail_rate:
+            raise FakeLLMServerError("injected LLM failure")
+        return f"answer ({len(prompt)} prompt chars)"
+
+    def invoke(self, prompt):
+        time.sleep(self._delay())
+        return self._answer(prompt)
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self._delay())
+        return self._answer(prompt)
+
+
+class FakeRedis:
+    """In-memory stand-in for `redis.Redis(decode_responses=True)`."""
+
+    def __init__(self):
+        self._data = {}
+
+    def get(self, key):
+        value = self._data.get(key)
+        if value is None:
+            return None
+        payload, expires = value
+        if expires is not None and expires < time.monotonic():
+            del self._data[key]
+            return None
+        return payload
+
+    def set(self, key, value, ex=None):
+        self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def ping(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class OverlapReranker:
+    """`Reranker.rerank` shape, scoring documents by words shared with the query."""
+
+    def __init__(self, top_n=5):
+        self.top_n = top_n
+
+    def rerank(self, query, documents):
+        words = set(_WORD_RE.findall(query.lower()))
+        scored = sorted(
+            documents,
+            key=lambda doc: len(words & set(_WORD_RE.findall(doc.page_content.lower()))),
+            reverse=True,
+        )
+        return scored[:self.top_n]
+
+
+def make_cross_encoder(dims=64, vocab=4096, seed=0):
+    """
+    Randomly initialised torch cross-encoder and tokenizer with the call
+    signatures `engine.reranker.Reranker` expects. Needs torch.
+    """
+    import torch
+
+    torch.manual_seed(seed)
+
+    class Output:
+        def __init__(self, logits):
+            self.logits = logits
+
+    class TinyCrossEncoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.embed = torch.nn.EmbeddingBag(vocab, dims, mode="mean")
+            self.head = torch.nn.Sequential(
+                torch.nn.Linear(dims, dims), torch.nn.ReLU(), torch.nn.Linear(dims, 1)
+            )
+
+        def forward(self, input_ids, offsets):
+            return Output(self.head(self.embed(input_ids, offsets)))
+
+    class Batch(dict):
+        def to(self, device):
+            return Batch({key: value.to(device) for key, value in self.items()})
+
+    def tokenizer(pairs, padding=True, truncation=True, return_tensors="pt", max_length=256):
+        ids, offsets = [], []
+        for query, text in pairs:
+            offsets.append(len(ids))
+            words = _WORD_RE.findall(f"{query} {text}".lower())[:max_length]
+            ids.extend(zlib.crc32(word.encode("utf-8")) % vocab for word in words)
+        return Batch(input_ids=torch.tensor(ids), offsets=torch.tensor(offsets))
+
+    return TinyCrossEncoder().eval(), tokenizer
+
+
+def _pdf_escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages):
+    """Minimal text PDF (Helvetica, one text object per page) built without a PDF library."""
+    n = len(pages)
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(n))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {n} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        lines = " ".join(f"({_pdf_escape(line)}) Tj T*" for line in text.split("\n"))
+        stream = f"BT /F1 10 Tf 12 TL 40 760 Td {lines} ET".encode("latin-1", "replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def _xml_escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def make_docx(sections):
+    """
+    Minimal .docx: `sections` is a list of (heading, [paragraph, ...]);
+    headings use the Heading1 style, and a page break follows each section.
+    """
+    import io
+    import zipfile
+
+    w = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    body = []
+    for heading, paragraphs in sections:
+        body.append(
+            f'<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr>'
+            f"<w:r><w:t>{_xml_escape(heading)}</w:t></w:r></w:p>"
+        )
+        for paragraph in paragraphs:
+            body.append(f'<w:p><w:r><w:t xml:space="preserve">{_xml_escape(paragraph)}</w:t></w:r></w:p>')
+        body.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+    document = (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<w:document xmlns:w="{w}"><w:body>{"".join(body)}<w:sectPr/></w:body></w:document>'
+    )
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>'
+    )
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", content_types)
+        archive.writestr("word/document.xml", document)
+    return out.getvalue()
+
+
+def make_html(sections):
+    """HTML page with an <h2> per section, <p> paragraphs and some script/nav noise."""
+    parts = ["<!DOCTYPE html><html><head><title>Report</title>",
+             "<style>p { margin: 0 }</style></head><body><nav>Home | About</nav>"]
+    for heading, paragraphs in sections:
+        parts.append(f"<h2>{_xml_escape(heading)}</h2>")
+        parts.extend(f"<p>{_xml_escape(paragraph)}</p>\n" for paragraph in paragraphs)
+        parts.append("<script>track('view');</script>")
+    parts.append("</body></html>")
+    return "".join(parts).encode("utf-8")
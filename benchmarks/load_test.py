@@ -0,0 +1,265 @@
+"""
+Async load generator for the HTTP API.
+
+Builds the real FastAPI routers (`/api/upload`, `/api/jobs/{id}`,
+`/api/chat`) around a real RAGPipeline, with only the models swapped for
+offline stand-ins: hashing embedder, word-overlap reranker, fake LLM with
+injected latency and an in-memory Redis. Requests go through
+httpx.ASGITransport, so no server or network is involved.
+
+Phases:
+  upload  POST generated PDFs, then poll their jobs until ingestion finishes
+  chat    drive /api/chat with a fixed pool of queries (repeats hit the
+          response cache) at the given concurrency; with --admission,
+          requests shed with 429/503 are counted apart from errors
+
+Reports QPS, p50/p95/p99 per phase, ingestion pages/s, mean latency per
+pipeline stage (from common.metrics) and peak memory.
+
+    python benchmarks/load_test.py --docs 20 --requests 500 --concurrency 32
+    python benchmarks/load_test.py --save-baseline benchmarks/baselines/load.json
+    python benchmarks/load_test.py --baseline benchmarks/baselines/load.json
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+SRC = os.path.join(os.path.dirname(__file__), "..", "src")
+sys.path.insert(0, SRC)
+sys.path.insert(0, os.path.join(SRC, "server"))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from cache import Cache_client  # noqa: E402
+from common.admission import AdmissionController  # noqa: E402
+from common.metrics import STAGE_LATENCY  # noqa: E402
+from data_pipeline.docs_store import DocsStore  # noqa: E402
+from data_pipeline.generation import CorpusGeneration  # noqa: E402
+from data_pipeline.indexer import Indexer  # noqa: E402
+from data_pipeline.loader import DocumentLoader  # noqa: E402
+from data_pipeline.preprocessor import ChunkDocument, CleanDocument, EmbedDocument  # noqa: E402
+from engine.generator import Generator  # noqa: E402
+from engine.llm_client import AsyncLLMClient  # noqa: E402
+from engine.pipeline import RAGPipeline  # noqa: E402
+from engine.retriver import Retriever  # noqa: E402
+from engine.scheduler import StageScheduler  # noqa: E402
+from fakes import FakeLLM, FakeRedis, HashingEmbedder, OverlapReranker, load_tokenizer, make_pdf  # noqa: E402
+from jobs import JobQueue  # noqa: E402
+from observability import router as observability_router  # noqa: E402
+from report import MemoryTracker, add_baseline_args, finish, latency_summary  # noqa: E402
+from ui import router as ui_router  # noqa: E402
+
+TOPICS = {
+    "finance": "revenue profit margin quarter earnings dividend equity cash debt audit",
+    "medicine": "patient dosage clinical trial symptom diagnosis therapy vaccine cardiac",
+    "legal": "contract clause liability plaintiff statute court appeal breach tenant",
+    "software": "server latency cache deploy kernel thread compiler database index query",
+    "travel": "flight hotel passport luggage itinerary airport visa beach museum tour",
+}
+FILLER = "the a of and to in for with on by from that this report section".split()
+
+
+def sentence(rng, topic, n=12):
+    words = TOPICS[topic].split() + FILLER
+    return " ".join(rng.choice(words) for _ in range(n)).capitalize() + "."
+
+
+def make_corpus(rng, n_docs, pages):
+    files = []
+    for d in range(n_docs):
+        topic = rng.choice(list(TOPICS))
+        body = [
+            "\n".join(sentence(rng, topic) for _ in range(8)) + f"\nPage {p + 1}"
+            for p in range(pages)
+        ]
+        files.append((f"doc_{d:04d}.pdf", make_pdf(body)))
+    return files
+
+
+def build_app(workdir, args):
+    embedder = EmbedDocument(HashingEmbedder(args.dims), batch_size=64)
+    indexer = Indexer(args.dims, "IVF", "cosine", n_list=64, m=16)
+    docs_store = DocsStore(os.path.join(workdir, "docs.db"))
+    retriever = Retriever(embedder, indexer, top_k=20, docs_store=docs_store, score_threshold=None)
+    llm = FakeLLM(args.llm_latency, args.llm_latency / 2, tail_prob=args.tail_prob,
+                  tail_latency=args.llm_latency * 10, seed=args.seed)
+    generator = Generator(
+        llm,
+        llm_client=AsyncLLMClient(llm, max_concurrency=args.llm_concurrency),
+        tokenizer=load_tokenizer(),
+    )
+    admission = None
+    if args.admission:
+        admission = AdmissionController(
+            {"embed": 16, "rerank": 8, "generate": args.llm_concurrency},
+            max_waiting=args.max_waiting,
+        )
+    pipeline = RAGPipeline(
+        loader=DocumentLoader({"temp_dir": workdir}),
+        cleaner=CleanDocument({}),
+        chunker=ChunkDocument({"mode": "recursive", "chunk_size": 600, "chunk_overlap": 60}),
+        embedder=embedder,
+        indexer=indexer,
+        retriver=retriever,
+        reranker=OverlapReranker(top_n=5),
+        scorenormalizer=None,
+        generator=generator,
+        docs_store=docs_store,
+        scheduler=StageScheduler(admission=admission),
+        generation=CorpusGeneration(os.path.join(workdir, "generation.db")),
+    )
+
+    app = FastAPI()
+    app.include_router(ui_router, prefix="/api")
+    app.include_router(observability_router)
+    app.state.cache = Cache_client(FakeRedis())
+    app.state.rag_pipeline = pipeline
+    app.state.jobs = JobQueue(
+        pipeline,
+        db_path=os.path.join(workdir, "jobs.db"),
+        upload_dir=os.path.join(workdir, "uploads"),
+        concurrency=args.ingest_workers,
+        max_queued=max(100, args.docs),
+        progress_interval=0.2,
+    )
+    return app
+
+
+async def upload_phase(client, files, concurrency):
+    gate = asyncio.Semaphore(concurrency)
+    latencies, job_ids, errors = [], [], 0
+
+    async def one(filename, data):
+        nonlocal errors
+        async with gate:
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/upload", files={"file": (filename, data, "application/pdf")}
+            )
+            latencies.append(time.perf_counter() - start)
+            if response.status_code == 202:
+                job_ids.append(response.json()["job_id"])
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(name, data) for name, data in files))
+    submitted = time.perf_counter() - start
+
+    pending, pages, failed = set(job_ids), 0, 0
+    while pending:
+        await asyncio.sleep(0.05)
+        for job_id in list(pending):
+            job = (await client.get(f"/api/jobs/{job_id}")).json()
+            if job["status"] in ("succeeded", "failed"):
+                pending.discard(job_id)
+                pages += job["pages"]
+                failed += job["status"] == "failed"
+    ingest_s = time.perf_counter() - start
+
+    summary = latency_summary(latencies, submitted)
+    summary.update({
+        "errors": errors,
+        "failed_jobs": failed,
+        "ingest_s": ingest_s,
+        "pages_per_s": pages / ingest_s if ingest_s else 0.0,
+    })
+    return summary
+
+
+async def chat_phase(client, queries, n_requests, concurrency, rng):
+    gate = asyncio.Semaphore(concurrency)
+    latencies, errors, shed = [], 0, 0
+
+    async def one(query):
+        nonlocal errors, shed
+        async with gate:
+            start = time.perf_counter()
+            response = await client.post("/api/chat", json={"query": query})
+            elapsed = time.perf_counter() - start
+            if response.status_code == 200:
+                latencies.append(elapsed)
+            elif response.status_code in (429, 503):
+                shed += 1
+            else:
+                errors += 1
+
+    stream = [rng.choice(queries) for _ in range(n_requests)]
+    start = time.perf_counter()
+    await asyncio.gather(*(one(query) for query in stream))
+    # latency and QPS count successful answers only (goodput)
+    summary = latency_summary(latencies, time.perf_counter() - start)
+    summary["errors"] = errors
+    summary["shed"] = shed
+    return summary
+
+
+async def run(args, workdir):
+    rng = random.Random(args.seed)
+    files = make_corpus(rng, args.docs, args.pages)
+    queries = [sentence(rng, rng.choice(list(TOPICS)), 6) for _ in range(args.unique_queries)]
+
+    app = build_app(workdir, args)
+    jobs = app.state.jobs
+    await jobs.start()
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            results["upload"] = await upload_phase(client, files, args.concurrency)
+            results["chat"] = await chat_phase(
+                client, queries, args.requests, args.concurrency, rng
+            )
+    finally:
+        await jobs.stop()
+        app.state.rag_pipeline.scheduler.shutdown()
+
+    for stage, summary in STAGE_LATENCY.summary().items():
+        results[f"stage/{stage}"] = {"mean_ms": summary["mean_seconds"] * 1000}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--unique-queries", type=int, default=100)
+    parser.add_argument("--dims", type=int, default=256)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--llm-concurrency", type=int, default=16)
+    parser.add_argument("--tail-prob", type=float, default=0.02)
+    parser.add_argument("--ingest-workers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--admission", action="store_true",
+                        help="put per-stage admission limits on the pipeline")
+    parser.add_argument("--max-waiting", type=int, default=64)
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also report peak Python heap (slows the run)")
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir, MemoryTracker(args.trace_memory) as memory:
+        results = asyncio.run(run(args, workdir))
+    results["memory"] = memory.summary()
+
+    for name, metrics in results.items():
+        line = "  ".join(
+            f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in metrics.items()
+        )
+        print(f"{name:<22} {line}")
+    return finish(args, results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Shared timing, memory and baseline helpers for the benchmark scripts.
+
+Results are flat dicts of `{name: {metric: value}}`. A baseline is the same
+dict saved as JSON together with the machine it was measured on; comparing
+only makes sense against a baseline from the same box.
+"""
+
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+# metrics where a larger value is better; every other metric is a cost
+HIGHER_IS_BETTER = {"qps", "ops_per_s", "pages_per_s", "recall"}
+
+
+def bench(fn, repeat=5, number=1, warmup=1):
+    """Median seconds per call of `fn` over `repeat` rounds of `number` calls."""
+    for _ in range(warmup):
+        fn()
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - start) / number)
+    median = float(np.median(rounds))
+    return {"median_ms": median * 1000, "ops_per_s": 1.0 / median if median else 0.0}
+
+
+def latency_summary(latencies, elapsed):
+    latencies = np.asarray(latencies) * 1000
+    if latencies.size == 0:
+        return {"requests": 0, "qps": 0.0}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "requests": int(latencies.size),
+        "qps": latencies.size / elapsed if elapsed else 0.0,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(latencies.max()),
+    }
+
+
+class MemoryTracker:
+    """
+    Peak RSS of the process over a `with` block, plus the peak Python heap
+    when `trace=True` (tracemalloc slows allocation-heavy code noticeably).
+    """
+
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.peak_heap = None
+
+    def __enter__(self):
+        if self.trace:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.trace:
+            _, self.peak_heap = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        return False
+
+    def summary(self):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        rss_mb = rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+        summary = {"peak_rss_mb": rss_mb}
+        if self.peak_heap is not None:
+            summary["peak_heap_mb"] = self.peak_heap / 1024 / 1024
+        return summary
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_baseline(path, results):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2, sort_keys=True)
+    print(f"baseline written to {path}")
+
+
+def compare(results, path, tolerance=0.10):
+    """
+    Prints every metric next to its baseline value and returns the metrics
+    that got worse by more than `tolerance` (relative).
+    """
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    if saved.get("environment") != environment():
+        print("warning: baseline was recorded on a different environment")
+    baseline = saved["results"]
+
+    regressions = []
+    print(f"\n{'benchmark':<34} {'metric':<14} {'baseline':>11} {'current':>11} {'change':>8}")
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(name, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or not before:
+                continue
+            change = (value - before) / before
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = " !" if worse > tolerance else ""
+            print(f"{name:<34} {metric:<14} {before:>11.3f} {value:>11.3f} {change:>+7.1%}{flag}")
+            if worse > tolerance:
+                regressions.append((name, metric, before, value))
+    return regressions
+
+
+def add_baseline_args(parser):
+    parser.add_argument("--save-baseline", metavar="PATH", help="write results as the new baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="compare results with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="relative slowdown reported as a regression (default 0.10)")
+
+
+def finish(args, results):
+    """Handles --save-baseline/--baseline; returns the process exit code."""
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed beyond {args.tolerance:.0%}")
+            return 1
+    return 0
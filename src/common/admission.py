@@ -0,0 +1,168 @@
+# admission.py
+"""
+Admission control for pipeline stages.
+
+Each limited stage (embed, rerank, generate) admits at most `limit`
+concurrent calls and lets at most `max_waiting` more wait for a slot.
+Anything beyond that is rejected at once with OverloadedError instead of
+queueing until it times out, so accepted requests keep their latency.
+
+Requests may carry a deadline (`request_deadline()`); a stage rejects a
+call up front when the expected wait plus service time would overrun it,
+and gives up waiting when the deadline passes.
+
+`AdmissionController.saturated` flips on when any stage's wait queue is
+`high_watermark` full and off again once it drains to `low_watermark`, for
+readiness probes to take the instance out of rotation.
+"""
+
+import asyncio
+import math
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from common.metrics import QUEUE_DEPTH, counter
+
+ADMISSION_REJECTED = counter(
+    "rag_admission_rejected_total",
+    "Stage calls rejected by admission control",
+    ["stage", "reason"],
+)
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class OverloadedError(RuntimeError):
+    def __init__(self, stage: str, reason: str, retry_after: float):
+        super().__init__(f"{stage} overloaded ({reason})")
+        self.stage = stage
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@contextmanager
+def request_deadline(seconds: float):
+    """Gives every stage call made inside the block `seconds` to finish."""
+    deadline = asyncio.get_running_loop().time() + seconds
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+class StageLimiter:
+    def __init__(self, name: str, limit: int, max_waiting: int, ewma_alpha: float = 0.2):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.ewma_alpha = ewma_alpha
+        self.in_flight = 0
+        self.waiting = 0
+        self.service_time: Optional[float] = None
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def expected_wait(self) -> float:
+        """Seconds a call arriving now would wait for a slot."""
+        if self.in_flight < self.limit and not self.waiting:
+            return 0.0
+        return math.ceil((self.waiting + 1) / self.limit) * (self.service_time or 0.0)
+
+    @asynccontextmanager
+    async def slot(self):
+        loop = asyncio.get_running_loop()
+        deadline = _deadline.get()
+        if self.in_flight >= self.limit or self.waiting:
+            if self.waiting >= self.max_waiting:
+                self._reject("queue_full")
+            expected = self.expected_wait() + (self.service_time or 0.0)
+            if deadline is not None and loop.time() + expected > deadline:
+                self._reject("deadline")
+
+        self.waiting += 1
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._reject("deadline")
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        start = loop.time()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            self._observe(loop.time() - start)
+
+    def _observe(self, seconds: float):
+        if self.service_time is None:
+            self.service_time = seconds
+        else:
+            self.service_time += self.ewma_alpha * (seconds - self.service_time)
+
+    def _reject(self, reason: str):
+        ADMISSION_REJECTED.inc(stage=self.name, reason=reason)
+        retry_after = max(1.0, self.expected_wait())
+        raise OverloadedError(self.name, reason, retry_after)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "service_time": self.service_time or 0.0,
+        }
+
+
+class AdmissionController:
+    """
+    Per-stage limiters keyed by StageScheduler stage name. Stages without a
+    limit pass straight through.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, int],
+        max_waiting: int = 64,
+        high_watermark: float = 0.8,
+        low_watermark: float = 0.5,
+    ):
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.limiters = {
+            stage: StageLimiter(stage, limit, max_waiting) for stage, limit in limits.items()
+        }
+        self._saturated = False
+        for stage, limiter in self.limiters.items():
+            QUEUE_DEPTH.set_function(lambda limiter=limiter: limiter.waiting, queue=stage)
+
+    def slot(self, stage: str):
+        limiter = self.limiters.get(stage)
+        if limiter is None:
+            return _unlimited()
+        return limiter.slot()
+
+    @property
+    def saturated(self) -> bool:
+        fill = max(
+            (limiter.waiting / max(1, limiter.max_waiting) for limiter in self.limiters.values()),
+            default=0.0,
+        )
+        if self._saturated:
+            self._saturated = fill > self.low_watermark
+        else:
+            self._saturated = fill >= self.high_watermark
+        return self._saturated
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {stage: limiter.stats() for stage, limiter in self.limiters.items()}
+
+
+@asynccontextmanager
+async def _unlimited():
+    yield
@@ -0,0 +1,59 @@
+# locks.py
+"""
+Reader/writer lock for the in-memory vector indexes.
+
+FAISS indexes can be searched from many threads at once, but a search that
+overlaps `add` or `train` reads buffers while they are reallocated and can
+crash the process. Searches and vector reconstruction take the lock shared,
+anything that mutates the index takes it exclusively.
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Many readers or one writer.
+
+    Writer-preferring: once a writer is waiting, new readers queue behind it,
+    so a steady stream of searches cannot starve ingestion. Not reentrant;
+    a thread must not take `read()` again while it holds it.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
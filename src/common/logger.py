@@ -0,0 +1,53 @@
+# logger.py
+"""
+Process-wide logging setup.
+
+`get_logger(__name__)` returns a standard library logger. The first call
+installs a single stderr handler on the root logger; fields passed through
+`extra={...}` are appended to the line as JSON so they stay greppable.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+
+_configured = False
+_lock = threading.Lock()
+
+# attributes every LogRecord has; anything else came from `extra`
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class _ExtraFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = {
+            key: value
+            for key, value in record.__dict__.items()
+            if key not in _RESERVED
+        }
+        if extra:
+            line = f"{line} {json.dumps(extra, default=str)}"
+        return line
+
+
+def _configure():
+    global _configured
+    with _lock:
+        if _configured:
+            return
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(
+            _ExtraFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        )
+        root = logging.getLogger()
+        root.addHandler(handler)
+        root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+        _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    _configure()
+    return logging.getLogger(name)
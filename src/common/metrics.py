@@ -0,0 +1,315 @@
+# metrics.py
+"""
+In-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are plain Python objects guarded by a lock
+each, so recording a sample costs a dict lookup, a bisect and an add.
+`render()` produces the text served at `/metrics`.
+
+Usage:
+    with STAGE_LATENCY.time(stage="rerank"):
+        ...
+
+    @timed("generate")
+    async def agenerate(...):
+        ...
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict[str, str]) -> Tuple[str, ...]:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, values, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        f'{name}="{value.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in pairs
+    )
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels):
+        """Read the value from `fn` at scrape time instead of storing it."""
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def value(self, **labels) -> float:
+        key = _label_key(self.labelnames, labels)
+        fn = self._functions.get(key)
+        return float(fn()) if fn else self._values.get(key, 0.0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = float(fn())
+            except Exception:
+                continue
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Iterable[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[key] = series
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(self.labelnames, labels))
+        return sum(series[0]) if series else 0
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Count and mean per label set, keyed by the joined label values."""
+        with self._lock:
+            items = [(key, sum(counts), total[0]) for key, (counts, total) in self._series.items()]
+        return {
+            ",".join(key) or self.name: {
+                "count": n,
+                "mean_seconds": total / n if n else 0.0,
+            }
+            for key, n, total in items
+        }
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._series.items()]
+        lines = self._header()
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', le))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets=buckets))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# -------------------------------------------------
+# Service metrics
+# -------------------------------------------------
+STAGE_LATENCY = histogram(
+    "rag_stage_latency_seconds",
+    "Latency of RAG pipeline stages",
+    ["stage"],
+)
+CACHE_LATENCY = histogram(
+    "rag_cache_latency_seconds",
+    "Latency of response/embedding cache operations",
+    ["op"],
+)
+CACHE_REQUESTS = counter(
+    "rag_cache_requests_total",
+    "Cache lookups by result",
+    ["result"],
+)
+INGESTED_PAGES = counter(
+    "rag_ingested_pages_total",
+    "Pages read during ingestion",
+)
+INGESTED_CHUNKS = counter(
+    "rag_ingested_chunks_total",
+    "Chunks produced during ingestion",
+)
+INDEX_SIZE = gauge(
+    "rag_index_vectors",
+    "Vectors in the FAISS index",
+)
+QUEUE_DEPTH = gauge(
+    "rag_queue_depth",
+    "Items waiting in a work queue",
+    ["queue"],
+)
+TENANT_INDEX_LOAD = histogram(
+    "rag_tenant_index_load_seconds",
+    "Time to load a cold tenant's index",
+)
+TENANT_RESIDENT_BYTES = gauge(
+    "rag_tenant_resident_bytes",
+    "Estimated bytes of tenant indexes held in memory",
+)
+TENANT_RESIDENT_COUNT = gauge(
+    "rag_tenant_resident_indexes",
+    "Tenant indexes held in memory",
+)
+TENANT_EVICTIONS = counter(
+    "rag_tenant_evictions_total",
+    "Tenant indexes evicted to stay within the memory budget",
+)
+
+
+def timed(stage: str):
+    """
+    Decorator recording the wall time of a sync or async callable into
+    STAGE_LATENCY under `stage`.
+    """
+
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with STAGE_LATENCY.time(stage=stage):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with STAGE_LATENCY.time(stage=stage):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,273 @@
+# tracing.py
+"""
+Per-request tracing with tail-based sampling.
+
+A trace is opened at the request boundary with `Tracer.trace()`; code below
+it opens child spans with `span()` / `@traced()` and annotates the current
+span with `set_attribute()`. Spans follow the request through `await`,
+`asyncio.gather` and StageScheduler threads via contextvars.
+
+Sampling happens when the root span ends: traces slower than
+`slow_threshold`, traces that raised, and `sample_rate` of the rest are
+handed to the exporter as OTLP/JSON (`resourceSpans`), one trace per line.
+
+Without an active trace, `span()` and `set_attribute()` are no-ops, so
+instrumented code costs a contextvar lookup when tracing is off.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    __slots__ = (
+        "name", "trace", "span_id", "parent_id", "kind",
+        "start_ns", "end_ns", "attributes", "error",
+    )
+
+    def __init__(self, name: str, trace: "_Trace", parent_id: Optional[str], kind: int):
+        self.name = name
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self):
+        self.end_ns = time.time_ns()
+
+    @property
+    def duration(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e9
+
+
+class _Trace:
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Span] = []
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+# -------------------------------------------------
+# Exporters
+# -------------------------------------------------
+class FileExporter:
+    """
+    Appends each sampled trace to `path` as one line of OTLP/JSON.
+    Meant for local testing; point a collector's file receiver at it.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, payload: Dict):
+        line = json.dumps(payload, separators=(",", ":"))
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _otlp_value(value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span: Span) -> Dict:
+    data = {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns or span.start_ns),
+        "attributes": [
+            {"key": key, "value": _otlp_value(value)}
+            for key, value in span.attributes.items()
+        ],
+        "status": {"code": STATUS_ERROR if span.error else STATUS_OK},
+    }
+    if span.parent_id:
+        data["parentSpanId"] = span.parent_id
+    if span.error:
+        data["status"]["message"] = span.error
+    return data
+
+
+# -------------------------------------------------
+# Tracer
+# -------------------------------------------------
+class Tracer:
+    def __init__(
+        self,
+        exporter=None,
+        slow_threshold: float = 1.0,
+        sample_rate: float = 0.01,
+        service_name: str = "rag-api",
+    ):
+        self.exporter = exporter
+        self.slow_threshold = slow_threshold
+        self.sample_rate = sample_rate
+        self.service_name = service_name
+        self._kept = 0
+        self._dropped = 0
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        """Opens a root span; the finished trace is sampled on exit."""
+        if self.exporter is None:
+            yield None
+            return
+        trace = _Trace()
+        root = _start(name, trace, None, SPAN_KIND_SERVER, attributes)
+        token = _current.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.error = repr(e)
+            raise
+        finally:
+            _current.reset(token)
+            root.end()
+            self._finish(trace, root)
+
+    def stats(self) -> Dict[str, int]:
+        return {"kept": self._kept, "dropped": self._dropped}
+
+    def _finish(self, trace: _Trace, root: Span):
+        if not self._keep(trace, root):
+            self._dropped += 1
+            return
+        self._kept += 1
+        try:
+            self.exporter.export(self._payload(trace))
+        except Exception:
+            # tracing must never fail the request it describes
+            pass
+
+    def _keep(self, trace: _Trace, root: Span) -> bool:
+        if root.duration >= self.slow_threshold:
+            return True
+        if any(span.error for span in trace.spans):
+            return True
+        return random.random() < self.sample_rate
+
+    def _payload(self, trace: _Trace) -> Dict:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": _otlp_value(self.service_name)},
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [_otlp_span(span) for span in trace.spans],
+                }],
+            }]
+        }
+
+
+_tracer = Tracer()
+
+
+def configure(tracer: Tracer):
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+# -------------------------------------------------
+# Instrumentation helpers
+# -------------------------------------------------
+def _start(name, trace, parent_id, kind, attributes) -> Span:
+    span = Span(name, trace, parent_id, kind)
+    span.attributes.update(attributes)
+    trace.spans.append(span)
+    return span
+
+
+def is_recording() -> bool:
+    return _current.get() is not None
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def set_attribute(key: str, value: Any):
+    span = _current.get()
+    if span is not None:
+        span.attributes[key] = value
+
+
+@contextmanager
+def span(name: str, **attributes):
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = _start(name, parent.trace, parent.span_id, SPAN_KIND_INTERNAL, attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = repr(e)
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+
+
+def traced(name: str):
+    """Decorator wrapping a sync or async callable in a child span."""
+
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
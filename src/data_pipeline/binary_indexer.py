@@ -0,0 +1,183 @@
+import os
+import threading
+
+import faiss
+import numpy as np
+
+from .indexer import COMPACT_BATCH, id_bound
+
+BINARY_INDEX_TYPES=('BINARY','BINARY_HNSW')
+
+
+class FloatStore:
+    """
+    Append-only file of float32 rows, read back through np.memmap so only
+    the pages of the rows asked for are touched.
+    """
+    def __init__(self,path,dims):
+        self.path=path
+        self.dims=dims
+        self.row_bytes=dims*4
+        os.makedirs(os.path.dirname(path) or '.',exist_ok=True)
+        open(path,'ab').close()
+        self._map=None
+
+    def __len__(self):
+        return os.path.getsize(self.path)//self.row_bytes
+
+    def append(self,vectors):
+        with open(self.path,'ab') as f:
+            f.write(np.ascontiguousarray(vectors,dtype=np.float32).tobytes())
+        self._map=None
+
+    def refresh(self):
+        # the file may have grown since it was mapped
+        self._map=None
+
+    def rows(self,ids):
+        if self._map is None:
+            self._map=np.memmap(self.path,dtype=np.float32,mode='r',shape=(len(self),self.dims)) if len(self) else np.empty((0,self.dims),dtype=np.float32)
+        return np.asarray(self._map[ids])
+
+
+class BinaryIndexer:
+    """
+    Drop-in for Indexer that searches sign-quantized vectors and rescores.
+
+    Every vector is stored twice: as `dims` bits in a FAISS binary index
+    (IndexBinaryFlat, or IndexBinaryHNSW for BINARY_HNSW), which is all the
+    first stage keeps in RAM -- 32x less than float32 -- and as float32 rows
+    in a FloatStore at `vectors_path`. A search takes the
+    `top_k*rescore_factor` nearest codes by Hamming distance and reorders
+    them by their exact float scores read from the store.
+
+    Scores follow Indexer: inner product for cosine, squared L2 otherwise.
+    `dims` must be a multiple of 8.
+
+    A vector's id is its row in the store. `compact()` drops codes from the
+    index but never rows, so `ntotal` is the store's length and `size` the
+    number of codes searched.
+    """
+    def __init__(self,dims,index_type,metrics,vectors_path,rescore_factor=10,m=32):
+        if dims%8:
+            raise ValueError(f"Binary indexes need dims divisible by 8, got {dims}")
+        if index_type not in BINARY_INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {index_type}")
+        self.dims=dims
+        self.index_type=index_type
+        self.metrics=metrics
+        self.rescore_factor=rescore_factor
+        self.m=m
+        self.store=FloatStore(vectors_path,dims)
+        self.index=self._create_index()
+        self._save_lock=threading.Lock()
+        # a store whose index file was lost is indexed again from its rows
+        self._add_stored(self.index)
+        self._bound=len(self.store)
+    def _create_index(self):
+        if self.index_type=='BINARY_HNSW':
+            index=faiss.IndexBinaryHNSW(self.dims,self.m)
+            index.hnsw.efConstruction=200
+            index.hnsw.efSearch=128
+            return index
+        return faiss.IndexBinaryFlat(self.dims)
+    def _prepare(self,vectors):
+        vectors=np.ascontiguousarray(vectors,dtype=np.float32)
+        if self.metrics=='cosine':
+            vectors=vectors.copy()
+            faiss.normalize_L2(vectors)
+        return vectors
+    @staticmethod
+    def quantize(vectors):
+        return np.packbits(vectors>0,axis=1)
+    def _add_stored(self,index):
+        # the float rows are the source of truth: codes are rebuilt for rows
+        # the index is missing rather than the rows being dropped, since
+        # chunks may already point at them
+        stored=len(self.store)
+        bound=id_bound(index)
+        if stored>bound:
+            self._add_codes(index,self.store.rows(np.arange(bound,stored)),bound)
+    @classmethod
+    def _add_codes(cls,index,vectors,start):
+        if isinstance(index,faiss.IndexBinaryIDMap2):
+            index.add_with_ids(cls.quantize(vectors),np.arange(start,start+len(vectors),dtype='int64'))
+        else:
+            index.add(cls.quantize(vectors))
+    def train(self,vectors):
+        pass
+    def add(self,vectors):
+        vectors=self._prepare(vectors)
+        if len(self.store)!=self.ntotal:
+            # row ids would no longer match vector ids; load() reconciles the two
+            raise RuntimeError(f"{self.store.path} has {len(self.store)} vectors, index has {self.ntotal}")
+        start=self.ntotal
+        self.store.append(vectors)
+        self._add_codes(self.index,vectors,start)
+        self._bound=start+len(vectors)
+
+    @property
+    def is_trained(self):
+        return True
+
+    @property
+    def ntotal(self):
+        return self._bound
+
+    @property
+    def size(self):
+        return self.index.ntotal
+
+    def search(self,query_vectors,top_k):
+        query_vectors=self._prepare(query_vectors)
+        n_candidates=min(max(top_k*self.rescore_factor,top_k),max(self.ntotal,1))
+        _,candidates=self.index.search(self.quantize(query_vectors),n_candidates)
+        distances=np.full((len(query_vectors),top_k),-np.inf if self.metrics=='cosine' else np.inf,dtype=np.float32)
+        indices=np.full((len(query_vectors),top_k),-1,dtype=np.int64)
+        for i,ids in enumerate(candidates):
+            ids=ids[ids!=-1]
+            if not len(ids):
+                continue
+            vectors=self.store.rows(ids)
+            if self.metrics=='cosine':
+                scores=vectors@query_vectors[i]
+                order=np.argsort(-scores)[:top_k]
+            else:
+                scores=((vectors-query_vectors[i])**2).sum(axis=1)
+                order=np.argsort(scores)[:top_k]
+            distances[i,:len(order)]=scores[order]
+            indices[i,:len(order)]=ids[order]
+        return distances,indices
+    def reconstruct(self,ids):
+        return self.store.rows(np.asarray(ids,dtype='int64'))
+    def compact(self,keep):
+        """Same as Indexer.compact(); the float rows all stay."""
+        ids=np.asarray(keep,dtype='int64')
+        if self._bound:
+            ids=np.union1d(ids,[self._bound-1])
+        index=faiss.IndexBinaryIDMap2(self._create_index())
+        for start in range(0,len(ids),COMPACT_BATCH):
+            batch=ids[start:start+COMPACT_BATCH]
+            index.add_with_ids(self.quantize(self.store.rows(batch)),batch)
+        self.index=index
+        return True
+    def save(self,path):
+        # same write-then-rename as Indexer.save
+        with self._save_lock:
+            tmp=path+'.tmp'
+            faiss.write_index_binary(self.index,tmp)
+            os.replace(tmp,path)
+
+    def load(self,path,mmap=False):
+        index=faiss.read_index_binary(path,faiss.IO_FLAG_MMAP if mmap else 0)
+        stored=len(self.store)
+        bound=id_bound(index)
+        if stored<bound:
+            raise RuntimeError(f"{self.store.path} has {stored} vectors, index has {bound}")
+        self.store.refresh()
+        if stored>bound and mmap:
+            # rows appended after the index was last saved; an mmap'd index can't grow
+            index=faiss.read_index_binary(path)
+        self._add_stored(index)
+        self.index=index
+        self._bound=stored
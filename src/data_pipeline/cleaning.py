@@ -0,0 +1,197 @@
+import re
+import math
+import unicodedata
+from collections import Counter
+
+_SCRIPT_RE=re.compile(r"<script.*?>.*?</script>",re.DOTALL)
+_STYLE_RE=re.compile(r"<style.*?>.*?</style>",re.DOTALL)
+_TAG_RE=re.compile(r"<[^>]+>")
+# a single leading \w finds the same hyphen breaks as (\w+) without backtracking through every word
+_HYPHEN_RE=re.compile(r"(\w)-\s*\n\s*(\w+)")
+_PAGE_NUMBER_RE=re.compile(r"Page\s+\d+(\s+of\s+\d+)?",re.IGNORECASE)
+_BLANK_LINES_RE=re.compile(r"\n{3,}")
+_SPACES_RE=re.compile(r"[ \t]{2,}")
+_SEGMENT_BREAK_RE=re.compile(r"\n{2,}")
+_DIGITS_RE=re.compile(r"\d+")
+# a whole line that is only a page number, e.g. "12", "page 3", "page 3 of 9", "3 / 9"
+_PAGE_MARKER_RE=re.compile(r"^(page\s*)?\d+(\s*(of|/)\s*\d+)?$")
+# the start of a page number _PAGE_NUMBER_RE may continue on a later line
+_PAGE_HEAD_RE=re.compile(r"page(\s+\d+)?$",re.IGNORECASE)
+
+
+def normalize_unicode(text):
+    if text.isascii():
+        return text
+    return unicodedata.normalize("NFKC",text)
+
+def remove_null_chars(text):
+    if '\x00' in text:
+        text=text.replace('\x00',"")
+    if '\x0c' in text:
+        text=text.replace('\x0c',"")
+    return text
+
+def remove_html_tags(text):
+    if '<' not in text:
+        return text
+    if '<script' in text:
+        text=_SCRIPT_RE.sub("",text)
+    if '<style' in text:
+        text=_STYLE_RE.sub("",text)
+    return _TAG_RE.sub("",text)
+
+def join_hyphenated_words(text):
+    if '-' not in text:
+        return text
+    return _HYPHEN_RE.sub(r"\1\2",text)
+
+def remove_page_numbers(text):
+    return _PAGE_NUMBER_RE.sub("",text)
+
+def standardize_whitespace(text):
+    if '\n\n\n' in text:
+        text=_BLANK_LINES_RE.sub("\n\n",text)
+    text=_SPACES_RE.sub(" ",text)
+    return text.strip()
+
+def strip_headers_footers(text):
+    lines=text.splitlines()
+    if len(lines)<=4:
+        return text
+    boilerplate={lines[0].strip(),lines[-1].strip()}
+    return "\n".join([line for line in lines if line.strip() not in boilerplate])
+
+def _line_key(line):
+    line=" ".join(line.lower().split())
+    # page numbers vary from page to page, so "Page 3 of 9" and "Page 4 of 9"
+    # share a key; digits in any other line ("Article 3.") are content
+    if _PAGE_MARKER_RE.match(line):
+        return hash(_DIGITS_RE.sub("#",line))
+    return hash(line)
+
+def _edge_lines(lines,edge_lines):
+    """
+    (position, line index) of the top and bottom `edge_lines` content lines:
+    ('top',k) is the k-th from the top, ('bottom',k) the k-th from the bottom.
+    At most half of a page's lines, short of its middle one, count as edges,
+    so a short page always keeps some body.
+    """
+    content=[i for i,line in enumerate(lines) if line.strip()]
+    n=min(edge_lines,(len(content)-1)//2)
+    return [(('top',k),content[k]) for k in range(n)]+[(('bottom',k),content[-1-k]) for k in range(n)]
+
+def detect_page_boilerplate(pages,edge_lines=2,min_ratio=0.5,min_pages=3):
+    """
+    Returns the (position, key) pairs of lines that repeat at the same edge
+    position -- the k-th line from the top or bottom, k < `edge_lines` -- of
+    at least `min_ratio` of the pages, in one pass over the pages.
+    """
+    if len(pages)<min_pages:
+        return set()
+    counts=Counter()
+    for page in pages:
+        lines=page.splitlines()
+        counts.update({(position,_line_key(lines[i])) for position,i in _edge_lines(lines,edge_lines)})
+    threshold=max(2,math.ceil(min_ratio*len(pages)))
+    return {key for key,n in counts.items() if n>=threshold}
+
+def strip_page_boilerplate(page,keys,edge_lines=2):
+    if not keys:
+        return page
+    lines=page.splitlines()
+    drop={i for position,i in _edge_lines(lines,edge_lines) if (position,_line_key(lines[i])) in keys}
+    if not drop:
+        return page
+    return "\n".join([line for i,line in enumerate(lines) if i not in drop])
+
+def remove_page_boilerplate(pages,edge_lines=2,min_ratio=0.5):
+    keys=detect_page_boilerplate(pages,edge_lines,min_ratio)
+    if not keys:
+        return list(pages)
+    return [strip_page_boilerplate(page,keys,edge_lines) for page in pages]
+
+def clean_segment(text):
+    text=normalize_unicode(text)
+    text=remove_null_chars(text)
+    text=remove_html_tags(text)
+    text=join_hyphenated_words(text)
+    text=remove_page_numbers(text)
+    return standardize_whitespace(text)
+
+def clean_text(text,pages=None):
+    """
+    Full cleaning pass over one document.
+    
+    Patterns are compiled once at import, passes that cannot apply are
+    skipped by cheap substring checks, and ASCII text skips normalization.
+    Output is identical to running every rule in sequence.
+    
+    When the per-page texts are given, running headers and footers are
+    detected across pages and stripped from them, and `text` is rebuilt
+    from the stripped pages instead of using first/last-line matching.
+    """
+    if pages is not None:
+        text="\n".join(remove_page_boilerplate(pages))
+        return clean_segment(text)
+    text=clean_segment(text)
+    text=strip_headers_footers(text)
+    return text.strip()
+
+def _splits_page_number(text,end,cut):
+    # "Page\n\n4" and "Page 4\n\nof 9" are one page number to
+    # remove_page_numbers, and a line holding only a page number belongs to
+    # the page it ends
+    if _PAGE_HEAD_RE.search(text,max(0,end-32),end):
+        return True
+    line_end=text.find('\n',cut)
+    line=text[cut:] if line_end==-1 else text[cut:line_end]
+    return _PAGE_MARKER_RE.match(" ".join(line.lower().split())) is not None
+
+def _segment_cut(text,start=0):
+    # last blank line at or after `start` that no hyphen join, open tag or
+    # page number can span
+    for match in reversed(list(_SEGMENT_BREAK_RE.finditer(text,start))):
+        end=match.start()
+        while end and text[end-1].isspace():
+            end-=1
+        if text[end-1:end]=='-' or text.rfind('<',0,end)>text.rfind('>',0,end):
+            continue
+        if _splits_page_number(text,end,match.end()):
+            continue
+        return match.end()
+    return None
+
+def clean_text_stream(pieces,segment_size=1024*1024):
+    """
+    Cleans arbitrarily large text fed in pieces, yielding cleaned segments.
+    
+    Segments are cut at blank lines once `segment_size` characters are
+    buffered, and every rule except header/footer stripping (which needs the
+    whole document) is applied per segment. Joining the segments with "\n\n"
+    matches whole-text cleaning up to whitespace at the cuts.
+    
+    Text already searched for a cut is not searched again, so input with no
+    usable blank line is scanned once rather than once per piece.
+    """
+    buffer=""
+    scanned=0
+    for piece in pieces:
+        buffer+=piece
+        if len(buffer)<segment_size:
+            continue
+        # back up over newlines so a break split across pieces is seen whole
+        start=scanned
+        while start and buffer[start-1]=='\n':
+            start-=1
+        cut=_segment_cut(buffer,start)
+        scanned=len(buffer)
+        if cut is None:
+            continue
+        segment=clean_segment(buffer[:cut])
+        buffer=buffer[cut:]
+        scanned=len(buffer)
+        if segment:
+            yield segment
+    segment=clean_segment(buffer)
+    if segment:
+        yield segment
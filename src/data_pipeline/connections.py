@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import threading
+
+_open_lock=threading.Lock()
+# connections inherited through fork() belong to the parent: the child keeps
+# them referenced so they are never used or closed, not even by the GC
+_inherited=[]
+
+
+def _after_fork():
+    global _open_lock
+    # the parent may have held it at fork time
+    _open_lock=threading.Lock()
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+class ProcessLocalConnection:
+    """
+    A sqlite3 connection and the lock serializing its use, opened on first
+    use in each process.
+
+    SQLite connections must not cross fork(): with gunicorn's preload the
+    master builds the stores, and a worker using the inherited connection
+    shares its file handles and WAL locks with every other worker. A process
+    other than the one that opened the connection gets its own instead.
+    `setup(conn)` runs in a transaction on every connection opened, so it
+    holds the pragmas and the idempotent schema.
+    """
+    def __init__(self,path,setup=None):
+        self.path=path
+        self.setup=setup
+        self._conn=None
+        self._lock=None
+        self._pid=None
+
+    def _open(self):
+        pid=os.getpid()
+        if self._pid==pid:
+            return
+        with _open_lock:
+            if self._pid==pid:
+                return
+            if self._conn is not None:
+                _inherited.append(self._conn)
+            conn=sqlite3.connect(self.path,check_same_thread=False)
+            if self.setup is not None:
+                with conn:
+                    self.setup(conn)
+            # _pid last: other threads use the connection as soon as it matches
+            self._conn,self._lock,self._pid=conn,threading.Lock(),pid
+
+    @property
+    def conn(self):
+        self._open()
+        return self._conn
+
+    @property
+    def lock(self):
+        self._open()
+        return self._lock
+
+    def close(self):
+        if self._pid!=os.getpid():
+            return
+        with self._lock:
+            self._conn.close()
+        self._conn=None
+        self._pid=None
@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+
+from .connections import ProcessLocalConnection
+
+
+class DocsStore:
+    """
+    Chunk texts and metadata keyed by their vector id in the index.
+
+    Also serves as the ingest manifest, keyed by content rather than by file
+    name: `documents` holds every ingested document by its content-hash id,
+    and `document_chunks` lists the chunk hashes each one is made of. A
+    chunk row is shared by every document containing the same chunk, and is
+    dropped only when no document references it any more.
+
+    The manifest can outlive the vectors it describes (the index was not
+    saved before a crash, or its file is gone), so lookups take the index's
+    `ntotal` and only count chunks whose vector id is below it.
+
+    Chunks cut inside a parent section link to it through `parent_id`; the
+    section text is stored once in `parents` and fetched only on demand.
+
+    Dropping chunks leaves their vectors in the index as tombstones until it
+    is compacted; `tombstones()` counts them so searches can fetch that many
+    extra candidates.
+    """
+    def __init__(self,path):
+        os.makedirs(os.path.dirname(path) or '.',exist_ok=True)
+        self.db=ProcessLocalConnection(path,self._setup)
+        # create the schema now rather than on first use
+        self.db.conn
+        # held by an ingest from its first dedup check to its commit: two
+        # ingests at once would each miss the other's chunks
+        self.ingest_lock=threading.Lock()
+
+    @property
+    def conn(self):
+        return self.db.conn
+
+    @property
+    def lock(self):
+        return self.db.lock
+
+    def _setup(self,conn):
+        # other processes read it while the ingesting one writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks(
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                parent_id TEXT
+            )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS chunks_hash ON chunks(chunk_hash)")
+        conn.execute("CREATE INDEX IF NOT EXISTS chunks_parent ON chunks(parent_id)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS parents(
+                id TEXT PRIMARY KEY,
+                text TEXT NOT NULL
+            )""")
+        self._migrate_documents(conn)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents(
+                doc_id TEXT PRIMARY KEY,
+                source TEXT NOT NULL
+            )""")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS document_chunks(
+                doc_id TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                PRIMARY KEY(doc_id,chunk_hash)
+            ) WITHOUT ROWID""")
+        conn.execute("CREATE INDEX IF NOT EXISTS document_chunks_hash ON document_chunks(chunk_hash)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS counters(
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )""")
+
+    def _migrate_documents(self,conn):
+        # stores written before the manifest was keyed by doc id had one
+        # `documents` row per file name, and each chunk belonged to one file
+        columns={row[1]:row[5] for row in conn.execute("PRAGMA table_info(documents)")}
+        if not columns.get('source'):
+            return
+        conn.execute("ALTER TABLE documents RENAME TO documents_by_source")
+        conn.execute("CREATE TABLE documents(doc_id TEXT PRIMARY KEY,source TEXT NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO documents SELECT doc_id,source FROM documents_by_source")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS document_chunks(
+                doc_id TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                PRIMARY KEY(doc_id,chunk_hash)
+            ) WITHOUT ROWID""")
+        conn.execute("INSERT OR IGNORE INTO document_chunks SELECT doc_id,chunk_hash FROM chunks")
+        conn.execute("DROP TABLE documents_by_source")
+        conn.execute("DROP INDEX IF EXISTS chunks_source")
+
+    def get_document_by_id(self,idx):
+        with self.lock:
+            row=self.conn.execute("SELECT doc_id,text,metadata FROM chunks WHERE id=?",(int(idx),)).fetchone()
+        if row is None:
+            return None
+        metadata=json.loads(row[2])
+        metadata['doc_id']=row[0]
+        return {"text":row[1],"metadata":metadata}
+
+    def add_chunks(self,ids,records):
+        rows=[]
+        parents={}
+        for idx,rec in zip(ids,records):
+            metadata=dict(rec['metadata'])
+            parent_text=metadata.pop('parent_text',None)
+            if parent_text is not None:
+                parents[metadata['parent_id']]=parent_text
+            rows.append((
+                int(idx),
+                metadata.get('filename') or metadata.get('source',''),
+                metadata.get('doc_id',''),
+                metadata['chunk_hash'],
+                rec['text'],
+                json.dumps(metadata,ensure_ascii=False),
+                metadata.get('parent_id'),
+            ))
+        with self.lock,self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO parents VALUES (?,?)",parents.items())
+            self.conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?,?,?,?,?,?,?)",rows)
+
+    def get_parents(self,parent_ids):
+        parent_ids=list(parent_ids)
+        if not parent_ids:
+            return {}
+        marks=','.join('?'*len(parent_ids))
+        with self.lock:
+            rows=self.conn.execute(f"SELECT id,text FROM parents WHERE id IN ({marks})",parent_ids).fetchall()
+        return dict(rows)
+
+    def has_document(self,doc_id,ntotal):
+        """True if `doc_id` was ingested and all of its chunks have vectors below `ntotal`."""
+        with self.lock:
+            row=self.conn.execute("""
+                SELECT 1 FROM documents d WHERE d.doc_id=? AND NOT EXISTS (
+                    SELECT 1 FROM document_chunks m WHERE m.doc_id=d.doc_id AND NOT EXISTS (
+                        SELECT 1 FROM chunks c WHERE c.chunk_hash=m.chunk_hash AND c.id<?))""",
+                (doc_id,int(ntotal))).fetchone()
+        return row is not None
+
+    def find_chunk(self,chunk_hash,ntotal):
+        """Vector id of an indexed chunk with this hash, or None."""
+        with self.lock:
+            row=self.conn.execute("SELECT id FROM chunks WHERE chunk_hash=? AND id<? LIMIT 1",(chunk_hash,int(ntotal))).fetchone()
+        return row[0] if row else None
+
+    def document_chunks(self,doc_id):
+        with self.lock:
+            rows=self.conn.execute("SELECT chunk_hash FROM document_chunks WHERE doc_id=?",(doc_id,)).fetchall()
+        return {row[0] for row in rows}
+
+    def commit_document(self,doc_id,source,chunk_hashes,replaces=None):
+        """
+        Records `doc_id` (last uploaded as `source`) as made of `chunk_hashes`.
+
+        With `replaces`, that document is dropped, and so are its chunks that
+        no other document references. Returns the hashes of the chunks
+        dropped; their vectors stay in the index as tombstones.
+        """
+        with self.lock,self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO documents VALUES (?,?)",(doc_id,source))
+            self.conn.executemany("INSERT OR IGNORE INTO document_chunks VALUES (?,?)",[(doc_id,h) for h in chunk_hashes])
+            if replaces is None or replaces==doc_id:
+                return []
+            candidates=[row[0] for row in self.conn.execute("SELECT chunk_hash FROM document_chunks WHERE doc_id=?",(replaces,))]
+            self.conn.execute("DELETE FROM document_chunks WHERE doc_id=?",(replaces,))
+            self.conn.execute("DELETE FROM documents WHERE doc_id=?",(replaces,))
+            removed=[h for h in candidates if self.conn.execute("SELECT 1 FROM document_chunks WHERE chunk_hash=? LIMIT 1",(h,)).fetchone() is None]
+            cursor=self.conn.executemany("DELETE FROM chunks WHERE chunk_hash=?",[(h,) for h in removed])
+            if removed:
+                self._add_tombstones(max(cursor.rowcount,0))
+                self.conn.execute("DELETE FROM parents WHERE id NOT IN (SELECT parent_id FROM chunks WHERE parent_id IS NOT NULL)")
+        return removed
+
+    def _add_tombstones(self,n):
+        self.conn.execute("INSERT INTO counters VALUES ('tombstones',?) ON CONFLICT(name) DO UPDATE SET value=value+excluded.value",(n,))
+
+    def tombstones(self):
+        """Vectors in the index whose chunks were dropped since it was last compacted."""
+        with self.lock:
+            row=self.conn.execute("SELECT value FROM counters WHERE name='tombstones'").fetchone()
+        return row[0] if row else 0
+
+    def clear_tombstones(self,n):
+        """Takes `n` tombstones compacted away off the count."""
+        with self.lock,self.conn:
+            self.conn.execute("UPDATE counters SET value=MAX(value-?,0) WHERE name='tombstones'",(int(n),))
+
+    def live_ids(self,ntotal):
+        """Sorted vector ids below `ntotal` that still have a chunk."""
+        with self.lock:
+            rows=self.conn.execute("SELECT id FROM chunks WHERE id<? ORDER BY id",(int(ntotal),)).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,68 @@
+import hashlib
+import os
+
+import numpy as np
+
+from .connections import ProcessLocalConnection
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Disk-backed embedding cache keyed by (model id, text hash).
+
+    Vectors are stored as raw float32 blobs and never expire, so re-chunking
+    or rebuilding the index only calls the model for text it has not seen.
+    """
+    # sqlite caps the number of bound parameters per statement
+    LOOKUP_BATCH=500
+
+    def __init__(self,path):
+        os.makedirs(os.path.dirname(path) or '.',exist_ok=True)
+        self.db=ProcessLocalConnection(path,self._setup)
+        # create the schema now rather than on first use
+        self.db.conn
+
+    @property
+    def conn(self):
+        return self.db.conn
+
+    @property
+    def lock(self):
+        return self.db.lock
+
+    def _setup(self,conn):
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings(
+                model_id TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY(model_id,text_hash)
+            ) WITHOUT ROWID""")
+
+    def get_many(self,model_id,hashes):
+        found={}
+        unique=list(dict.fromkeys(hashes))
+        with self.lock:
+            for i in range(0,len(unique),self.LOOKUP_BATCH):
+                batch=unique[i:i+self.LOOKUP_BATCH]
+                marks=','.join('?'*len(batch))
+                rows=self.conn.execute(
+                    f"SELECT text_hash,vector FROM embeddings WHERE model_id=? AND text_hash IN ({marks})",
+                    (model_id,*batch),
+                ).fetchall()
+                for key,blob in rows:
+                    found[key]=np.frombuffer(blob,dtype=np.float32)
+        return found
+
+    def put_many(self,model_id,items):
+        rows=[(model_id,key,np.asarray(vector,dtype=np.float32).tobytes()) for key,vector in items]
+        with self.lock,self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?,?,?)",rows)
+
+    def close(self):
+        self.db.close()
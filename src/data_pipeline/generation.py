@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import threading
+
+
+class CorpusGeneration:
+    """
+    Counter stored next to an index that goes up every time the indexed
+    corpus changes. Caches put it in their keys, so one bump retires every
+    entry computed from the old corpus without scanning for them.
+
+    Kept in a one-row SQLite file so the increment is atomic across worker
+    processes; each call opens its own short-lived connection.
+    """
+    def __init__(self,path):
+        self.path=path
+        os.makedirs(os.path.dirname(path) or '.',exist_ok=True)
+        conn=self._connect()
+        try:
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS generation(id INTEGER PRIMARY KEY CHECK (id=0),value INTEGER NOT NULL)")
+                conn.execute("INSERT OR IGNORE INTO generation VALUES (0,0)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path,timeout=30)
+
+    def current(self):
+        conn=self._connect()
+        try:
+            return conn.execute("SELECT value FROM generation WHERE id=0").fetchone()[0]
+        finally:
+            conn.close()
+
+    def bump(self):
+        conn=self._connect()
+        try:
+            with conn:
+                conn.execute("UPDATE generation SET value=value+1 WHERE id=0")
+                return conn.execute("SELECT value FROM generation WHERE id=0").fetchone()[0]
+        finally:
+            conn.close()
+
+
+class IndexReloader:
+    """
+    Keeps an in-memory index in step with the file it is saved to, across
+    processes sharing it through a CorpusGeneration.
+
+    One process writes the index (see JobQueue) and calls bump() once its
+    save is on disk; the others call refresh(), which reloads the file when
+    the generation moved past `loaded`, the one their copy was read at. The
+    generation is read before the file, so a bump landing in between costs
+    one more reload rather than labelling older vectors with the newer
+    generation. Loads swap the index under `index_lock` held exclusively.
+
+    Readers load with mmap, sharing pages with every other process. Some
+    mmap'd indexes are read-only (IVF lists), so the writer asks for a
+    `writable` copy before adding to it.
+    """
+    def __init__(self,indexer,index_path,generation,index_lock,mmap=True):
+        self.indexer=indexer
+        self.index_path=index_path
+        self.generation=generation
+        self.index_lock=index_lock
+        self.mmap=mmap
+        self.loaded=None
+        self.writable=not mmap
+        self._lock=threading.Lock()
+
+    def _current(self,writable):
+        current=self.generation.current()
+        return current,current==self.loaded and (self.writable or not writable)
+
+    def refresh(self,writable=False):
+        """Reloads the index if another process changed it. Returns True if it did."""
+        if self._current(writable)[1]:
+            return False
+        with self._lock:
+            # read again: the bump may have been this process's own
+            current,fresh=self._current(writable)
+            if fresh:
+                return False
+            mmap=self.mmap and not writable
+            if self.index_path is not None and os.path.exists(self.index_path):
+                with self.index_lock.write():
+                    self.indexer.load(self.index_path,mmap=mmap)
+            self.loaded=current
+            self.writable=not mmap
+        return True
+
+    def bump(self):
+        """For the writer, after saving: its copy is already the newest."""
+        with self._lock:
+            self.loaded=self.generation.bump()
+        return self.loaded
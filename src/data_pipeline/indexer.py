@@ -1,17 +1,55 @@
+import os
+import threading
+
 import faiss
+import numpy as np
+
+# bits per PQ code; each sub-quantizer trains 2**PQ_NBITS centroids
+PQ_NBITS=8
+# vectors reconstructed at a time while compacting
+COMPACT_BATCH=65536
+
+
+def id_bound(index):
+    """One past the highest vector id in `index`."""
+    if isinstance(index,(faiss.IndexIDMap2,faiss.IndexBinaryIDMap2)):
+        # compacted: ids have gaps
+        return int(faiss.vector_to_array(index.id_map).max())+1 if index.ntotal else 0
+    return index.ntotal
+
+
 class Indexer:
-    def __init__(self,dims,index_type,metrics,n_list,m):
+    """
+    FAISS index of one type: IVF (exact, flat), HNSW or IVF_PQ.
+
+    IVF_PQ must be trained before it can hold vectors, on at least
+    `min_train_points`. Until `train_size` vectors (and never fewer than
+    that minimum) have been added, they go to a flat `buffer` index of the
+    same metric, which searches, saves and loads in place of the IVF_PQ
+    index. The add that fills the buffer trains on its vectors and moves
+    them over, keeping their ids.
+
+    Vector ids are never reused. `compact()` drops vectors but keeps the ids
+    of the rest, so `ntotal` is the id the next vector gets, and `size` the
+    number of vectors actually held.
+    """
+    def __init__(self,dims,index_type,metrics,n_list,m,train_size=10000):
         self.dims=dims
         self.index_type=index_type
         self.metrics=metrics
         self.n_list=n_list
         self.m=m
+        self.train_size=train_size
         self.index=self._create_index()
+        self.buffer=None if self.index.is_trained else self._create_buffer()
+        self._bound=0
+        self._save_lock=threading.Lock()
+    def _metric(self):
+        return faiss.METRIC_INNER_PRODUCT if self.metrics=='cosine' else faiss.METRIC_L2
+    def _create_buffer(self):
+        return faiss.IndexFlat(self.dims,self._metric())
     def _create_index(self):
-        if self.metrics=='cosine':
-            basic__metrics=faiss.METRIC_INNER_PRODUCT
-        else:
-            basic__metrics=faiss.METRIC_L2
+        basic__metrics=self._metric()
         if self.index_type=='IVF':
             index=faiss.IndexFlatIP(self.dims) if self.metrics=='cosine' else faiss.IndexFlatL2(self.dims)
         elif self.index_type=='HNSW':
@@ -20,35 +58,132 @@ class Indexer:
             index.hnsw.efSearch=50
         elif self.index_type=='IVF_PQ':
             quantizer=faiss.IndexFlat(self.dims,basic__metrics)
-            index=faiss.IndexIVFPQ(quantizer,self.dims,self.n_list,self.m,8,basic__metrics)
+            index=faiss.IndexIVFPQ(quantizer,self.dims,self.n_list,self.m,PQ_NBITS,basic__metrics)
             index.nprobe=10
         else:
             raise ValueError(f"Unsupported index type: {self.index_type}")
         return index
+    @property
+    def min_train_points(self):
+        # k-means needs at least one point per centroid: n_list coarse
+        # centroids, 2**PQ_NBITS per PQ sub-quantizer
+        if self.index_type=='IVF_PQ':
+            return max(self.n_list,2**PQ_NBITS)
+        return 0
+
     def train(self,vectors):
         if self.index.is_trained:
             return
-        if vectors.shape[0]<self.index.ntotal:
-            raise ValueError("Not enough vectors to train the index")
+        if vectors.shape[0]<self.min_train_points:
+            raise ValueError(f"Training {self.index_type} needs at least {self.min_train_points} vectors, got {vectors.shape[0]}")
         self.index.train(vectors)
+        self._make_direct_map()
+        if self.buffer is not None and self.buffer.ntotal:
+            self.index.add(self.buffer.reconstruct_n(0,self.buffer.ntotal))
+        self.buffer=None
+
+    def _make_direct_map(self):
+        # IVF lists are not addressable by id until the direct map exists.
+        # Built here, on the writer, rather than on first reconstruct(), which
+        # runs under the shared read lock; add() keeps it current and save()
+        # writes it out with the index
+        if self.index_type=='IVF_PQ':
+            ivf=faiss.extract_index_ivf(self.index)
+            if ivf.direct_map.type==faiss.DirectMap.NoMap:
+                ivf.make_direct_map()
     
     def add  (self,vectors):
-        if self.metric == "cosine":
+        if self.metrics == "cosine":
             faiss.normalize_L2(vectors)
 
-        if not self.index.is_trained:
-            raise RuntimeError("Index must be trained before adding vectors")
+        if self.buffer is None:
+            if isinstance(self.index,faiss.IndexIDMap2):
+                self.index.add_with_ids(vectors,np.arange(self._bound,self._bound+len(vectors),dtype='int64'))
+            else:
+                self.index.add(vectors)
+            self._bound+=len(vectors)
+            return
+        self._bound+=len(vectors)
+        self.buffer.add(vectors)
+        if self.buffer.ntotal>=max(self.train_size,self.min_train_points):
+            self.train(self.buffer.reconstruct_n(0,self.buffer.ntotal))
+
+    @property
+    def is_trained(self):
+        return self.index.is_trained
+
+    @property
+    def ntotal(self):
+        return self._bound
 
-        self.index.add(vectors)
+    @property
+    def size(self):
+        return self._active.ntotal
+
+    @property
+    def _active(self):
+        # the index searched and saved: the buffer until IVF_PQ is trained
+        return self.index if self.buffer is None else self.buffer
         
     def search(self,query_vectors,top_k):
-        if self.metric == "cosine":
+        if self.metrics == "cosine":
             faiss.normalize_L2(query_vectors)
 
-        distances, indices = self.index.search(query_vectors, top_k)
+        distances, indices = self._active.search(query_vectors, top_k)
         return distances, indices
+    def reconstruct(self,ids):
+        """
+        Stored vectors for `ids` (normalized if the metric is cosine).
+        IVF_PQ gives back the PQ approximation.
+        """
+        ids=np.asarray(ids,dtype='int64')
+        return self._active.reconstruct_batch(ids)
+    def compact(self,keep):
+        """
+        Rebuilds the index with only the vectors whose ids are in `keep`,
+        under the same ids, so nothing pointing at them needs renumbering.
+        The highest id is kept too, live or not, so `ntotal` never goes back.
+        IVF_PQ keeps its training. Returns False, changing nothing, while
+        IVF_PQ vectors are still in the buffer.
+        """
+        if self.buffer is not None:
+            return False
+        ids=np.asarray(keep,dtype='int64')
+        if self._bound:
+            ids=np.union1d(ids,[self._bound-1])
+        inner=faiss.downcast_index(self.index.index) if isinstance(self.index,faiss.IndexIDMap2) else self.index
+        if self.index_type=='IVF_PQ':
+            inner=faiss.clone_index(inner)
+            inner.reset()
+        else:
+            inner=self._create_index()
+        index=faiss.IndexIDMap2(inner)
+        for start in range(0,len(ids),COMPACT_BATCH):
+            batch=ids[start:start+COMPACT_BATCH]
+            index.add_with_ids(self.reconstruct(batch),batch)
+        self.index=index
+        self._make_direct_map()
+        return True
+
     def save(self, path: str):
-        faiss.write_index(self.index, path)
+        # write-then-rename: a crash mid-write leaves the previous file intact,
+        # and readers that mmap'd it keep a valid copy
+        with self._save_lock:
+            tmp = path + ".tmp"
+            faiss.write_index(self._active, tmp)
+            os.replace(tmp, path)
 
-    def load(self, path: str):
-        self.index = faiss.read_index(path)
\ No newline at end of file
+    def load(self, path: str, mmap: bool = False):
+        # mmap: pages are read on demand and shared with other processes
+        index = faiss.read_index(path, faiss.IO_FLAG_MMAP if mmap else 0)
+        if self.index_type=='IVF_PQ' and isinstance(index,faiss.IndexFlat):
+            # saved before it had enough vectors to train: that is the buffer
+            self.index=self._create_index()
+            self.buffer=index
+            self._bound=index.ntotal
+            return
+        self.index = index
+        self.buffer=None
+        self._bound=id_bound(index)
+        # files saved before the direct map was kept at train time lack it
+        self._make_direct_map()
\ No newline at end of file
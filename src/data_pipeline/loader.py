@@ -1,10 +1,26 @@
 import os
 import io
 import json
+import hashlib
+import shutil
+import logging
+import multiprocessing
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
 from typing import BinaryIO,Union
+from xml.etree import ElementTree
 
 
-from pypdf import PdfReader
+from langchain.schema import Document
+from .cleaning import remove_page_boilerplate
+
+logger=logging.getLogger(__name__)
 
 def _minimal_clean_text(text):
     if text is None:
@@ -13,19 +29,63 @@ def _minimal_clean_text(text):
 def _now_iso():
     from datetime import datetime
     return datetime.utcnow().isoformat() + 'Z'
-def _get_doc_id(source):
-    import uuid
-    return f"{source}_{uuid.uuid4().hex}"
+def _get_doc_id(source,digest=None):
+    if digest is None:
+        import uuid
+        return f"{source}_{uuid.uuid4().hex}"
+    return f"{source}_{digest[:32]}"
+def _hash_stream(file_stream,block_size=1024*1024):
+    digest=hashlib.sha256()
+    file_stream.seek(0)
+    while True:
+        block=file_stream.read(block_size)
+        if not block:
+            break
+        digest.update(block)
+    file_stream.seek(0)
+    return digest.hexdigest()
 def _safe_title(title):
     import re
     safe_title=re.sub(r'[^a-zA-Z0-9_\- ]','',title)
     return safe_title[:100] if len(safe_title)>100 else safe_title
+def _rewind(file_stream):
+    try:
+        file_stream.seek(0)
+        return file_stream
+    except Exception:
+        return io.BytesIO(file_stream.read())
+def _open_pdf(source):
+    # pypdf is only needed for ingestion; chat-only workers never import it
+    from pypdf import PdfReader
+    return PdfReader(source)
+
+def _extract_pages(reader,start,end):
+    pages=[]
+    for i in range(start,end):
+        try:
+            pages.append((i,reader.pages[i].extract_text(),None))
+        except Exception as e:
+            pages.append((i,None,str(e)))
+    return pages
+def _extract_page_range(path,start,end):
+    # runs in a worker process; every worker opens its own reader on the shared file
+    return _extract_pages(_open_pdf(path),start,end)
+def _pool_context():
+    # ingestion runs in threads next to torch/faiss/redis threads; a forked
+    # child could inherit one of their locks held and hang, so workers are
+    # started from a clean forkserver (spawn where that doesn't exist)
+    methods=multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
 
 class DocumentLoader:
     def __init__(self,configs=None):
         self.configs=configs or {}
         self.file_size=int(self.configs.get('max_file_size',50*1024*1024))
         self.temp_dir=self.configs.get('temp_dir','/tmp')
+        self.extract_workers=int(self.configs.get('extract_workers',1))
+        self.pages_per_task=int(self.configs.get('pages_per_task',16))
+        self._pool=None
+        self._pool_lock=threading.Lock()
         os.makedirs(self.temp_dir, exist_ok=True)
         
     def load_from_text_input(self,text_input,title=None): 
@@ -34,7 +94,7 @@ class DocumentLoader:
             if not full_text.strip():
                 return False,None
             doc={
-                "doc_id":_get_doc_id("user_text"),
+                "doc_id":_get_doc_id("user_text",hashlib.sha256(full_text.encode('utf-8')).hexdigest()),
                 "title":_safe_title("title") if title else f"user_text_{_now_iso()}",
                 'source':"user_text",
                 "raw_text":full_text,
@@ -51,29 +111,19 @@ class DocumentLoader:
     
     def load_from_pdf(self,file_stream,filename):
         try:
-            try:
-                file_stream.seek(0)
-            except Exception:
-                file_stream=io.BytesIO(file_stream.read())
+            file_stream=_rewind(file_stream)
                 
-            reader=PdfReader(file_stream)
+            reader=_open_pdf(file_stream)
             num_pages=len(reader.pages)
-            texts=[]
-            for i in range(num_pages):
-                try:
-                    page=reader.pages[i]
-                    page_text=page.extract_text()
-                    texts.append(page_text)
-                except Exception as e:
-                    logger.warning("Failed to extract text from page %d of PDF %s: %s", i, filename, e)
-                    continue
+            texts=[page_text for _,page_text in self._iter_pdf_texts(file_stream,reader,filename)]
+            texts=remove_page_boilerplate(texts)
             full_raw_text="\n".join(texts)
             full_text=_minimal_clean_text(full_raw_text)
             if not full_text.strip():
                 logger.warning("No text extracted from pdf %s",filename)
                 return False,None
             doc={
-                "doc_id":_get_doc_id("user_doc"),
+                "doc_id":self.doc_id_for(file_stream),
                 "title":_safe_title(filename),
                 "source":"pdf",
                 "raw_text":full_text,
@@ -90,12 +140,115 @@ class DocumentLoader:
             logger.exception("Failed to load PDF %s: %s", filename, e)
             return False, None
     
+    def doc_id_for(self,file_stream):
+        """
+        Content-addressed document id: identical bytes always get the same id.
+        """
+        return _get_doc_id("user_doc",_hash_stream(file_stream))
+    
+    def iter_pdf_pages(self,file_stream,filename,doc_id=None):
+        file_stream=_rewind(file_stream)
+        doc_id=doc_id or self.doc_id_for(file_stream)
+        reader=_open_pdf(file_stream)
+        title=_safe_title(filename)
+        for i,page_text in self._iter_pdf_texts(file_stream,reader,filename):
+            if not page_text or not page_text.strip():
+                continue
+            yield Document(
+                page_content=page_text,
+                metadata={
+                    "doc_id":doc_id,
+                    "title":title,
+                    "source":"pdf",
+                    "filename":filename,
+                    "page":i+1,
+                })
+    
+    def _iter_pdf_texts(self,file_stream,reader,filename):
+        """
+        Yields (page_index, text) in page order, skipping pages that fail.
+        
+        With `extract_workers` > 1 the page ranges are extracted in a process
+        pool; pages are yielded as soon as their range is done, so callers can
+        start on the first pages while later ones are still being extracted.
+        """
+        num_pages=len(reader.pages)
+        if self.extract_workers<=1 or num_pages<=self.pages_per_task:
+            results=(page for i in range(num_pages) for page in _extract_pages(reader,i,i+1))
+            yield from self._log_failed_pages(results,filename)
+            return
+        file_stream.seek(0)
+        with tempfile.NamedTemporaryFile(dir=self.temp_dir,suffix='.pdf') as tmp:
+            shutil.copyfileobj(file_stream,tmp)
+            tmp.flush()
+            ranges=[(start,min(start+self.pages_per_task,num_pages)) for start in range(0,num_pages,self.pages_per_task)]
+            yield from self._log_failed_pages(self._extract_parallel(tmp.name,ranges,filename),filename)
+    
+    def _extract_parallel(self,path,ranges,filename):
+        pending=deque()
+        ranges=iter(ranges)
+        # keep a bounded window of ranges in flight so finished pages don't pile up
+        for start,end in ranges:
+            pending.append((start,end,*self._submit(path,start,end)))
+            if len(pending)>=2*self.extract_workers:
+                break
+        while pending:
+            start,end,pool,future=pending.popleft()
+            try:
+                yield from future.result()
+            except Exception as e:
+                if isinstance(e,BrokenProcessPool):
+                    self._discard_pool(pool)
+                yield from ((i,None,f"worker failed: {e}") for i in range(start,end))
+            for start,end in ranges:
+                pending.append((start,end,*self._submit(path,start,end)))
+                break
+    
+    def _log_failed_pages(self,results,filename):
+        for i,page_text,error in results:
+            if error is not None:
+                logger.warning("Failed to extract text from page %d of PDF %s: %s", i, filename, error)
+                continue
+            yield i,page_text
+    
+    def _submit(self,path,start,end):
+        pool=self._get_pool()
+        return pool,pool.submit(_extract_page_range,path,start,end)
+    
+    def _get_pool(self):
+        # one pool shared by every ingest job running on this loader
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool=ProcessPoolExecutor(max_workers=self.extract_workers,mp_context=_pool_context())
+            return self._pool
+    
+    def _discard_pool(self,pool):
+        # a worker died; the next submit starts a fresh pool
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool=None
+        pool.shutdown(wait=False,cancel_futures=True)
+    
+    def close(self):
+        with self._pool_lock:
+            pool,self._pool=self._pool,None
+        if pool is not None:
+            pool.shutdown()
+    
     def load_from_file(self,file_stream,filename):
         if filename.lower().endswith('.pdf'):
             return self.load_from_pdf(file_stream,filename)
         else:
             raise ValueError("Only PDF files are supported.")
     
+    def iter_file_pages(self,file_stream,filename,doc_id=None):
+        if filename.lower().endswith('.pdf'):
+            # keeps the parallel page extraction
+            return self.iter_pdf_pages(file_stream,filename,doc_id)
+        file_stream=_rewind(file_stream)
+        doc_id=doc_id or self.doc_id_for(file_stream)
+        return LoaderDocument(self.configs).load_documents(file_stream,filename,doc_id)
+    
     def save_documents(self,documents,output_path):
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         temp_path=output_path + ".tmp"
@@ -107,44 +260,214 @@ class DocumentLoader:
         
 ##########################################################################################
 
+# marks a hard section boundary (page break, heading) in a stream of text pieces
+_BREAK=object()
+
+_W='{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_DOCX_MIME='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+_EXTENSION_MIMES={
+    '.pdf':'application/pdf',
+    '.docx':_DOCX_MIME,
+    '.html':'text/html',
+    '.htm':'text/html',
+    '.xhtml':'application/xhtml+xml',
+    '.txt':'text/plain',
+    '.md':'text/markdown',
+}
+
+@contextmanager
+def _open_binary(file):
+    if isinstance(file,str):
+        with open(file,'rb') as f:
+            yield f
+    elif isinstance(file,(bytes,bytearray)):
+        yield io.BytesIO(file)
+    else:
+        yield _rewind(file)
+
+def _read_head(file,size=2048):
+    with _open_binary(file) as stream:
+        head=stream.read(size)
+        stream.seek(0)
+    return head
+
+def _sniff_mime(head,extension):
+    # stand-in for libmagic when python-magic is not installed
+    if head.startswith(b'%PDF'):
+        return 'application/pdf'
+    if head.startswith(b'PK\x03\x04'):
+        return _DOCX_MIME if extension=='.docx' or b'word/' in head else 'application/zip'
+    for signature,mime in ((b'\x89PNG','image/png'),(b'\xff\xd8\xff','image/jpeg'),(b'GIF8','image/gif')):
+        if head.startswith(signature):
+            return mime
+    lowered=head.lstrip().lower()
+    if lowered.startswith((b'<!doctype html',b'<html')):
+        return 'text/html'
+    if extension in _EXTENSION_MIMES:
+        return _EXTENSION_MIMES[extension]
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # a multi-byte character cut at the end of the sample is still text
+        if e.start<len(head)-3:
+            return 'application/octet-stream'
+    return 'text/plain'
+
+def _detect_mime(head,extension):
+    try:
+        import magic
+    except ImportError:
+        return _sniff_mime(head,extension)
+    mime=magic.from_buffer(head,mime=True)
+    if mime=='application/zip' and extension=='.docx':
+        # libmagic cannot always see past the zip container in 2 KB
+        return _DOCX_MIME
+    return mime
+
+def _read_text(stream,size):
+    """Decoded text of a binary stream in chunks of `size` characters."""
+    reader=io.TextIOWrapper(stream,encoding='utf-8-sig',errors='replace',newline=None)
+    try:
+        while chunk:=reader.read(size):
+            yield chunk
+    finally:
+        # hand the stream back open; it belongs to the caller
+        reader.detach()
+
+def _sections(pieces,max_chars):
+    """
+    Joins a stream of text pieces into sections of at most `max_chars`.
+    Sections end at every _BREAK, and long runs are cut at the last
+    paragraph break, else line break, else space before the limit.
+    """
+    buffer=''
+    for piece in pieces:
+        if piece is _BREAK:
+            if buffer.strip():
+                yield buffer.strip()
+            buffer=''
+            continue
+        buffer+=piece
+        while len(buffer)>max_chars:
+            cut=buffer.rfind('\n\n',0,max_chars)
+            if cut<=0:
+                cut=buffer.rfind('\n',0,max_chars)
+            if cut<=0:
+                cut=buffer.rfind(' ',0,max_chars)
+            if cut<=0:
+                cut=max_chars
+            section=buffer[:cut].strip()
+            if section:
+                yield section
+            buffer=buffer[cut:]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+class _HTMLText(HTMLParser):
+    """
+    Incremental HTML-to-text: feed() it chunks and drain() the text pieces
+    produced so far. Headings start a new section.
+    """
+    SKIP={'script','style','noscript','template','svg'}
+    HEADINGS={'h1','h2','h3'}
+    BLOCKS={'p','div','li','ul','ol','table','tr','td','th','section','article','header','footer',
+            'nav','main','aside','title','blockquote','pre','br','hr','h4','h5','h6','dd','dt','figcaption'}
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._pieces=[]
+        self._skip=0
+        self._pre=0
+    
+    def handle_starttag(self,tag,attrs):
+        if tag in self.SKIP:
+            self._skip+=1
+        elif tag in self.HEADINGS:
+            self._pieces.append(_BREAK)
+        elif tag in self.BLOCKS:
+            self._pre+=tag=='pre'
+            self._pieces.append('\n')
+    
+    def handle_endtag(self,tag):
+        if tag in self.SKIP:
+            self._skip=max(0,self._skip-1)
+        elif tag in self.HEADINGS or tag=='p':
+            self._pieces.append('\n\n')
+        elif tag in self.BLOCKS:
+            if tag=='pre':
+                self._pre=max(0,self._pre-1)
+            self._pieces.append('\n')
+    
+    def handle_data(self,data):
+        if self._skip:
+            return
+        if self._pre:
+            self._pieces.append(data)
+            return
+        if data.isspace() and (not self._pieces or self._pieces[-1] is _BREAK or self._pieces[-1].endswith('\n')):
+            # indentation between block tags
+            return
+        # collapse source whitespace but keep word boundaries at the edges
+        text=' '.join(data.split())
+        if data[:1].isspace():
+            text=' '+text
+        if data[-1:].isspace() and text.strip():
+            text+=' '
+        self._pieces.append(text)
+    
+    def drain(self):
+        pieces,self._pieces=self._pieces,[]
+        return pieces
+
+
 class LoaderDocument:
-    def __init__(self,configs):
-        self.configs=configs
+    """
+    Format-sniffing loader for PDF, DOCX, HTML and plain text.
+    
+    Every format is parsed incrementally -- PDF page by page, DOCX through
+    iterparse over word/document.xml, HTML through a streaming tokenizer and
+    text in `read_size` chunks -- and comes out of load_documents() as a
+    lazy iterator of Documents of at most `section_chars` characters, so a
+    large file flows into cleaning and chunking without ever being held in
+    memory whole.
+    
+    Uses python-magic for type detection when installed, else file
+    signatures and the extension.
+    """
+    def __init__(self,configs=None):
+        self.configs=configs or {}
+        self.read_size=int(self.configs.get('read_size',64*1024))
+        self.section_chars=int(self.configs.get('section_chars',4000))
         
-    def load_documents(self,file:Union[str,bytes,BinaryIO]):
+    def load_documents(self,file:Union[str,bytes,BinaryIO],filename=None,doc_id=None):
         
-        file_info=self.detect_file_type(file)
+        file_info=self.detect_file_type(file,filename)
         
         loader_fn=self.router_loader(file_info)
         
-        doc=loader_fn(file)
+        pieces=loader_fn(file)
         
-        doc=self.mormalise_doocument(doc,file_info)
+        docs=self.mormalise_doocument(pieces,file_info,file,filename,doc_id)
         
-        return doc
-    def detect_file_type(self,file):
-        if isinstance(file,str):
-            extension=os.path.splitext(file)[1].lower()
-            mime=magic.from_file(file,mime=True)
-        elif isinstance(file,bytes):
-            mime=magic.from_buffer(file,mime=True)
-            extension=None
-        else:
-            mime=magic.from_buffer(file.read(2048),mime=True)
-            extension=None
-            file.seek(0)
+        return docs
+    def detect_file_type(self,file,filename=None):
+        if filename is None and isinstance(file,str):
+            filename=file
+        extension=os.path.splitext(filename)[1].lower() if filename else None
+        mime=_detect_mime(_read_head(file),extension)
             
         if mime=='application/pdf':
-            return {'type':'pdf'}
-        elif mime=='application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-            return {'type':'docx'}
-        elif mime.startswith('text/'):
-            return {"type":"text"}
+            return {'type':'pdf','mime':mime}
+        elif mime==_DOCX_MIME:
+            return {'type':'docx','mime':mime}
         elif mime in ('text/html','application/xhtml+xml'):
-            return {'type':'html'}
+            return {'type':'html','mime':mime}
+        elif mime.startswith('text/'):
+            return {'type':'text','mime':mime}
         elif mime.startswith('image/'):
-            return {'type':'image'}
-        return {'type':'unknown'}
+            return {'type':'image','mime':mime}
+        return {'type':'unknown','mime':mime}
     
     def router_loader(self,file_info):
         file_type=file_info['type']
@@ -159,21 +482,91 @@ class LoaderDocument:
         elif file_type=='image':
             return self.load_image
         else:
-            raise ValueError("Unsupported file type")
+            raise ValueError(f"Unsupported file type: {file_info['mime']}")
     def load_pdf(self,file):
-        return 
-    def load_dcox(self,file):
-        return
+        with _open_binary(file) as stream:
+            reader=_open_pdf(stream)
+            for i in range(len(reader.pages)):
+                yield _BREAK
+                try:
+                    yield reader.pages[i].extract_text() or ''
+                except Exception as e:
+                    logger.warning("Failed to extract text from page %d: %s",i,e)
+    def load_docx(self,file):
+        with _open_binary(file) as stream,zipfile.ZipFile(stream) as archive,archive.open('word/document.xml') as xml:
+            # ancestors of the current element; finished paragraphs and tables
+            # are detached from them so the tree never grows past one of each
+            stack=[]
+            parts=[]
+            heading=False
+            for event,elem in ElementTree.iterparse(xml,events=('start','end')):
+                tag=elem.tag
+                if event=='start':
+                    stack.append(elem)
+                    if tag==_W+'p':
+                        parts=[]
+                        heading=False
+                    continue
+                stack.pop()
+                if tag==_W+'t':
+                    parts.append(elem.text or '')
+                elif tag==_W+'tab':
+                    parts.append('\t')
+                elif tag in (_W+'br',_W+'cr'):
+                    if elem.get(_W+'type')=='page':
+                        yield ''.join(parts)
+                        yield _BREAK
+                        parts=[]
+                    else:
+                        parts.append('\n')
+                elif tag==_W+'pStyle':
+                    heading=(elem.get(_W+'val') or '').lower().startswith(('heading','title'))
+                elif tag in (_W+'p',_W+'tbl'):
+                    if tag==_W+'p':
+                        if heading:
+                            yield _BREAK
+                        yield ''.join(parts)+'\n\n'
+                        parts=[]
+                    if stack:
+                        stack[-1].remove(elem)
     def load_text(self,file):
-        if isinstance(file,str):
-            with open(file,'w',encoding='utf-8') as f:
-                text=f.read()
-            
-        return
+        with _open_binary(file) as stream:
+            for chunk in _read_text(stream,self.read_size):
+                # form feeds are page breaks
+                first,*pages=chunk.split('\f')
+                yield first
+                for page in pages:
+                    yield _BREAK
+                    yield page
     def load_html(self,file):
-        return
+        parser=_HTMLText()
+        with _open_binary(file) as stream:
+            for chunk in _read_text(stream,self.read_size):
+                parser.feed(chunk)
+                yield from parser.drain()
+        parser.close()
+        yield from parser.drain()
     def load_image(self,file):
-        return
+        raise ValueError("Image files need OCR, which this loader does not do")
     
-    def mormalise_doocument(self,doc,file_info):
-        return doc
\ No newline at end of file
+    def mormalise_doocument(self,pieces,file_info,file,filename=None,doc_id=None):
+        """
+        Shared page iterator: cuts the loader's text pieces into sections and
+        wraps each in a Document with the same metadata as
+        DocumentLoader.iter_pdf_pages, except that sections are numbered under
+        `section`: they are not pages, so they share no running headers.
+        """
+        if doc_id is None:
+            with _open_binary(file) as stream:
+                doc_id=_get_doc_id("user_doc",_hash_stream(stream))
+        title=_safe_title(filename) if filename else file_info['type']
+        for section,text in enumerate(_sections(pieces,self.section_chars),start=1):
+            yield Document(
+                page_content=text,
+                metadata={
+                    "doc_id":doc_id,
+                    "title":title,
+                    "source":file_info['type'],
+                    "filename":filename,
+                    "section":section,
+                })
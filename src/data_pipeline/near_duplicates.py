@@ -0,0 +1,220 @@
+import itertools
+import os
+from contextlib import contextmanager
+
+import numpy as np
+
+from .connections import ProcessLocalConnection
+
+_MASK32=np.uint64(0xFFFFFFFF)
+
+
+class MinHasher:
+    """
+    MinHash signatures over byte 8-grams of whitespace-normalized, lowercased
+    text, computed entirely in NumPy.
+
+    Each 8-gram is read as one uint64 (so shingling needs no hashing of its
+    own), and the `num_perm` permutations are multiply-shift hashes
+    ((a*x + b) mod 2**64) >> 32 evaluated as one (num_perm, n_shingles)
+    array operation.
+    """
+    SHINGLE=8
+
+    def __init__(self,num_perm=128,seed=1):
+        rng=np.random.default_rng(seed)
+        self.num_perm=num_perm
+        # odd multipliers keep the multiply a bijection mod 2**64
+        self.a=(rng.integers(0,2**63,num_perm,dtype=np.uint64)*np.uint64(2)+np.uint64(1))[:,None]
+        self.b=rng.integers(0,2**63,num_perm,dtype=np.uint64)[:,None]
+        self._shifts=np.arange(self.SHINGLE,dtype=np.uint64)*np.uint64(8)
+
+    def shingles(self,text):
+        data=np.frombuffer(' '.join(text.lower().split()).encode('utf-8'),dtype=np.uint8)
+        if len(data)<self.SHINGLE:
+            data=np.pad(data,(0,self.SHINGLE-len(data)))
+        windows=np.lib.stride_tricks.sliding_window_view(data,self.SHINGLE).astype(np.uint64)
+        return np.unique((windows<<self._shifts).sum(axis=1,dtype=np.uint64))
+
+    def signature(self,text):
+        shingles=self.shingles(text)[None,:]
+        with np.errstate(over='ignore'):
+            hashed=(self.a*shingles+self.b)>>np.uint64(32)
+        return (hashed.min(axis=1)&_MASK32).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """
+    Persistent MinHash LSH index of the chunks in a corpus, keyed by chunk
+    hash, in a SQLite file next to the index.
+
+    Signatures are split into `bands` bands; chunks sharing any band bucket
+    are candidates, and a candidate counts as a near-duplicate when the
+    share of equal signature positions (the Jaccard estimate) reaches
+    `threshold`. With 128 permutations and 16 bands of 8 rows, pairs above
+    ~0.8 similarity are almost always found and pairs below ~0.5 rarely
+    become candidates.
+
+    `duplicates` records, per document, which skipped chunk points at which
+    indexed one. The docs store lists the original among the document's
+    chunks, so it stays indexed while anything points at it.
+
+    Signatures are committed before the FAISS index is saved, so after a
+    crash some keys may name chunks the saved index lacks; callers pass
+    query() an `accept` check against the index, as the docs store's
+    lookups do with `ntotal`.
+    """
+    def __init__(self,path,num_perm=128,bands=16,threshold=0.85,seed=1,max_candidates=64):
+        if num_perm%bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.path=path
+        self.num_perm=num_perm
+        self.bands=bands
+        self.rows=num_perm//bands
+        self.threshold=threshold
+        self.seed=seed
+        self.max_candidates=max_candidates
+        self.hasher=MinHasher(num_perm,seed)
+        self._band_coeffs=(np.random.default_rng(seed+1).integers(0,2**63,self.rows,dtype=np.uint64)*np.uint64(2)+np.uint64(1))
+        if path!=':memory:':
+            os.makedirs(os.path.dirname(path) or '.',exist_ok=True)
+        self.db=ProcessLocalConnection(path,self._setup)
+        # create the schema now rather than on first use
+        self.db.conn
+        self._temp_tables=itertools.count()
+
+    @property
+    def conn(self):
+        return self.db.conn
+
+    @property
+    def lock(self):
+        return self.db.lock
+
+    def _setup(self,conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS signatures(
+                key TEXT PRIMARY KEY,
+                signature BLOB NOT NULL
+            )""")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets(
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                key TEXT NOT NULL
+            )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets(band,bucket)")
+        conn.execute("CREATE INDEX IF NOT EXISTS buckets_key ON buckets(key)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS duplicates(
+                key TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                duplicate_of TEXT NOT NULL,
+                PRIMARY KEY(doc_id,key)
+            )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS duplicates_doc ON duplicates(doc_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS duplicates_target ON duplicates(duplicate_of)")
+
+    def scratch(self):
+        """Empty in-memory index with the same parameters, for one ingest run."""
+        return NearDuplicateIndex(':memory:',self.num_perm,self.bands,self.threshold,self.seed,self.max_candidates)
+
+    def signature(self,text):
+        return self.hasher.signature(text)
+
+    def _buckets(self,signature):
+        bands=signature.reshape(self.bands,self.rows).astype(np.uint64)
+        with np.errstate(over='ignore'):
+            buckets=(bands*self._band_coeffs).sum(axis=1,dtype=np.uint64)
+        # SQLite integers are signed 64-bit
+        return [(band,int(bucket)) for band,bucket in enumerate(buckets.view(np.int64))]
+
+    @contextmanager
+    def excluding(self,keys):
+        """
+        Loads `keys` into a temporary table once and yields it for
+        query(exclude=...), which then leaves them out in SQL, ahead of the
+        `max_candidates` limit. Yields None for no keys.
+        """
+        if not keys:
+            yield None
+            return
+        table=f"temp.excluded_{next(self._temp_tables)}"
+        with self.lock,self.conn:
+            self.conn.execute(f"CREATE TABLE {table}(key TEXT PRIMARY KEY)")
+            self.conn.executemany(f"INSERT OR IGNORE INTO {table} VALUES (?)",((key,) for key in keys))
+        try:
+            yield table
+        finally:
+            with self.lock,self.conn:
+                self.conn.execute(f"DROP TABLE {table}")
+
+    def query(self,signature,exclude=None,accept=None):
+        """
+        Key of the most similar indexed chunk at or above `threshold`, else
+        None. `exclude` is a table from excluding(); candidates for which
+        `accept(key)` is false are passed over.
+        """
+        buckets=self._buckets(signature)
+        where=" OR ".join(["(band=? AND bucket=?)"]*len(buckets))
+        if exclude is not None:
+            where=f"({where}) AND key NOT IN (SELECT key FROM {exclude})"
+        params=[value for pair in buckets for value in pair]
+        with self.lock:
+            keys=[row[0] for row in self.conn.execute(f"SELECT DISTINCT key FROM buckets WHERE {where} LIMIT ?",(*params,self.max_candidates))]
+            if not keys:
+                return None
+            marks=','.join('?'*len(keys))
+            rows=self.conn.execute(f"SELECT key,signature FROM signatures WHERE key IN ({marks})",keys).fetchall()
+        if not rows:
+            return None
+        candidates=np.stack([np.frombuffer(blob,dtype=np.uint32) for _,blob in rows])
+        similarity=(candidates==signature).mean(axis=1)
+        for best in np.argsort(-similarity,kind='stable'):
+            if similarity[best]<self.threshold:
+                break
+            if accept is None or accept(rows[best][0]):
+                return rows[best][0]
+        return None
+
+    def add(self,key,signature):
+        self.add_many([(key,signature)])
+
+    def add_many(self,items):
+        signatures=[]
+        buckets=[]
+        for key,signature in items:
+            signatures.append((key,np.asarray(signature,dtype=np.uint32).tobytes()))
+            buckets.extend((band,bucket,key) for band,bucket in self._buckets(signature))
+        with self.lock,self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO signatures VALUES (?,?)",signatures)
+            self.conn.executemany("INSERT INTO buckets VALUES (?,?,?)",buckets)
+
+    def items(self):
+        with self.lock:
+            rows=self.conn.execute("SELECT key,signature FROM signatures").fetchall()
+        return [(key,np.frombuffer(blob,dtype=np.uint32)) for key,blob in rows]
+
+    def commit(self,doc_id,added,duplicates,removed,replaces=None):
+        """
+        Records one ingest of `doc_id`: the signatures of the chunks it
+        indexed (`added`, (key, signature) pairs), its near-duplicate
+        pointers and the keys of chunks the docs store dropped. The pointers
+        of the document it `replaces` go away with it.
+        """
+        self.add_many(added)
+        with self.lock,self.conn:
+            if replaces is not None and replaces!=doc_id:
+                self.conn.execute("DELETE FROM duplicates WHERE doc_id=?",(replaces,))
+            self.conn.executemany("INSERT OR REPLACE INTO duplicates VALUES (?,?,?)",[(key,doc_id,original) for key,original in duplicates])
+            for key in removed:
+                self.conn.execute("DELETE FROM buckets WHERE key=?",(key,))
+                self.conn.execute("DELETE FROM signatures WHERE key=?",(key,))
+
+    def duplicate_of(self,key):
+        with self.lock:
+            row=self.conn.execute("SELECT duplicate_of FROM duplicates WHERE key=?",(key,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self.db.close()
@@ -1,43 +1,61 @@
-from .cleaning import clean_text
+from .cleaning import clean_text,clean_text_stream,clean_segment,detect_page_boilerplate,strip_page_boilerplate
 import os
+import re
 import json
-import tiktoken
-from langchain import Document
+import hashlib
+from itertools import islice
+from typing import List
+import numpy as np
+from langchain.schema import Document
+from .embedding_store import text_hash
 class DocumentPreprocessor:
     def __init__(self,chunk_size=500,chunk_overlap=50,min_chars=50):
         self.chunk_size=chunk_size
         self.chunk_overlap=chunk_overlap
         self.min_chars=min_chars
+        import tiktoken
         self.tokenizer=tiktoken.get_encoding("cl100k_base")
         
-    def clean_text(self,text,pages):
+    def clean_text(self,text,pages=None):
         return clean_text(text,pages)
             
                 
         
     def chunk_text(self,text,doc_id,title):
-        tokens=self.tokenizer.encode(text)
-        chunks=[]
+        return list(self.iter_chunks(text,doc_id,title))
+    
+    def iter_chunks(self,text,doc_id,title,tokens=None):
+        """
+        Yields overlapping token windows of `text` as chunk dicts.
+        
+        The text is encoded once (or `tokens` is reused) and each window is
+        sliced out of `text` through the token -> character offsets, so no
+        window is ever decoded on its own.
+        """
+        if tokens is None:
+            tokens=self.tokenizer.encode(text)
+        _,offsets=self.tokenizer.decode_with_offsets(tokens)
+        num_tokens=len(tokens)
         start=0
         chunk_id=0
         
-        while start<len(tokens):
-            end=start+self.chunk_size
-            chunk_tokens=tokens[start:end]
+        while start<num_tokens:
+            end=min(start+self.chunk_size,num_tokens)
+            char_start=offsets[start]
+            char_end=offsets[end] if end<num_tokens else len(text)
             
-            chunk_text=self.tokenizer.decode(chunk_tokens).strip()
+            chunk_text=text[char_start:char_end].strip()
             
             if len(chunk_text)>=self.min_chars:
-                chunk={
-                    "chunk_id":f"{doc_id}_chunk_{chunk_id_:04d}",
+                yield {
+                    "chunk_id":f"{doc_id}_chunk_{chunk_id:04d}",
                     "doc_id":doc_id,
                     "title":title,
                     "text":chunk_text,
-                    "token_count":len(chunk_tokens),
+                    "token_count":end-start,
                     "char_count":len(chunk_text),
                     "offset_tokens":(start,end),
-                    
-                    
+                    "offset_chars":(char_start,char_end),
                 }
             chunk_id+=1
             start+=self.chunk_size - self.chunk_overlap    
@@ -50,6 +68,21 @@ class DocumentPreprocessor:
         clean_text=self.clean_text(raw_text)
         chunks=self.chunk_text(clean_text,doc_id,title)
         return chunks
+    
+    def process_documents(self,docs,batch_size=64,num_threads=8):
+        """
+        Cleans and chunks many documents, encoding each batch of `batch_size`
+        documents at once with tiktoken's threaded encode_batch.
+        """
+        docs=iter(docs)
+        while True:
+            batch=list(islice(docs,batch_size))
+            if not batch:
+                return
+            texts=[self.clean_text(doc['raw_text']) for doc in batch]
+            token_lists=self.tokenizer.encode_batch(texts,num_threads=num_threads)
+            for doc,text,tokens in zip(batch,texts,token_lists):
+                yield from self.iter_chunks(text,doc['doc_id'],doc['title'],tokens)
     def save_chunks(self,chunks,ouput_path):
         os.makedirs(os.path.dirname(ouput_path),exist_ok=True)
         temp_file=ouput_path +".tmp"
@@ -61,87 +94,122 @@ class DocumentPreprocessor:
 ########################################################################################
 class CleanDocument:
     def __init__(self,configs):
-        self.configs=configs
+        self.configs=configs or {}
+        self.segment_size=int(self.configs.get('segment_size',1024*1024))
+        self.boilerplate_window=int(self.configs.get('boilerplate_window',16))
+        self.boilerplate_edge_lines=int(self.configs.get('boilerplate_edge_lines',2))
     def clean(self,docs):
-        cleaned_docs=[]
-        
-        for doc in docs:
-            text=doc.page_content()
-            
-            text=self._normalize_unicode(text)
-            text=self._remove_null_chars(text)
-            text=self._remove_html_tags(text)
-            text=self._hyphenate_words(text)
-            text=self._remove_page_numbers(text)
-            text=self._standardize_whitespace(text)
-            text=self._strip_headers_footers(text)
-            
-            cleaned_docs.append(
-                Document(
-                    page_content=text.strip(),
-                    metadata=doc.metadata
-                )
-            )
-        return cleaned_docs
+        return list(self.clean_stream(docs))
     
-    def _normalize_unicode(self,text):
-        return unicode.normalize("NFKC",text)
-    def _remove_null_chars(self,text):
-        return text.replace('\x00',"").replace("\x0c","")
-    def _remove_html_tags(self,text):
-        text = re.sub(r"<script.*?>.*?</script>", "", text, flags=re.DOTALL)
-        text = re.sub(r"<style.*?>.*?</style>", "", text, flags=re.DOTALL)
-        text = re.sub(r"<[^>]+>", "", text)
-        return text
-    def _hyphenate_words(self,text):
-        return re.sub(r"(\w+)-\s*\n\s*(\w+)", r"\1\2", text)
-    def _remove_page_numbers(self,text):
-        text = re.sub(r"Page\s+\d+(\s+of\s+\d+)?", "", text, flags=re.IGNORECASE)
-        return text
-    def _standardize_whitespace(self,text):
-        text = re.sub(r"\n{3,}", "\n\n", text)
-
-        # Replace multiple spaces with one
-        text = re.sub(r"[ \t]{2,}", " ", text)
-
-        return text.strip()
-    def _strip_headers_footers(self,text):
-        lines=text.splitlines()
-        if len(lines)<=4:
-            return text
-        header=lines[0]
-        footer=lines[-1]
-        cleaned_lines=[]
-        for line in lines:
-            if line.strip()==header.strip():
+    def clean_stream(self,docs):
+        # PDF pages (docs with a 'page' number) get running headers/footers
+        # learned from the first boilerplate_window pages. Sections of
+        # DOCX/HTML/text files have none: their first line is a heading, not
+        # a header, so nothing is stripped from them. Other docs are cleaned whole
+        window=[]
+        keys=None
+        for doc in docs:
+            if 'section' in doc.metadata:
+                yield self._clean_doc(doc,clean_segment(doc.page_content).strip())
+                continue
+            if 'page' not in doc.metadata:
+                yield self._clean_doc(doc,self._clean_text(doc.page_content))
                 continue
-            if line.strip()==footer.strip():
+            if keys is None:
+                window.append(doc)
+                if len(window)<self.boilerplate_window:
+                    continue
+                keys=self._learn_boilerplate(window)
+                yield from (self._clean_page(page,keys) for page in window)
+                window=[]
                 continue
-            cleaned_lines.append(line)
-        return "\n".join(cleaned_lines)
+            yield self._clean_page(doc,keys)
+        if window:
+            keys=self._learn_boilerplate(window)
+            yield from (self._clean_page(page,keys) for page in window)
+    
+    def _learn_boilerplate(self,pages):
+        return detect_page_boilerplate([page.page_content for page in pages],self.boilerplate_edge_lines)
+    
+    def _clean_page(self,doc,keys):
+        text=strip_page_boilerplate(doc.page_content,keys,self.boilerplate_edge_lines)
+        return self._clean_doc(doc,clean_segment(text))
+    
+    def _clean_doc(self,doc,text):
+        return Document(
+            page_content=text,
+            metadata=doc.metadata
+        )
+    
+    def clean_text_stream(self,pieces):
+        return clean_text_stream(pieces,self.segment_size)
+    
+    def _clean_text(self,text):
+        return clean_text(text)
 class ChunkDocument:
-    def __init__(self,configs):
-        self.configs=configs
+    def __init__(self,configs,embedding_model=None,tokenizer=None):
+        self.configs=configs or {}
+        self.mode=self.configs.get('mode','recursive')
+        self.chunk_size=int(self.configs.get('chunk_size',1000))
+        self.chunk_overlap=int(self.configs.get('chunk_overlap',100))
+        # when set, chunks are cut inside parent sections of about this many characters
+        self.parent_chunk_size=int(self.configs.get('parent_chunk_size',0))
+        # semantic mode
+        self.embedding_model=embedding_model
+        self.max_tokens=int(self.configs.get('max_tokens',512))
+        self.min_tokens=int(self.configs.get('min_tokens',64))
+        self.breakpoint_percentile=float(self.configs.get('breakpoint_percentile',10))
+        self.embed_batch_size=int(self.configs.get('embed_batch_size',64))
+        # loaded from configs['encoding'] on first use when not given
+        self.tokenizer=tokenizer
+        if self.mode=='semantic' and embedding_model is None:
+            raise ValueError("Semantic chunking needs an embedding model")
     def chunk(self,docs):
-        chunk_docs=[]
+        return list(self.chunk_stream(docs))
+    def chunk_stream(self,docs):
+        # chunk ids keep counting across the pages of a document
+        next_ids={}
         for doc in docs:
-            text=doc.page_content()
             metadata=doc.metadata
-            
-            if self.mode=='simple':
-                chunk=self._simple_chunk(text)
+            doc_key=metadata.get('doc_id')
+            if self.parent_chunk_size:
+                sections=self._parent_sections(doc.page_content)
             else:
-                chunk=self._recursive_chunk(text)
-        for idx,chunk in enumerate(chunks):
-            chunk_metadata=metadata.copy()
-            chunk_metadata['chunk_id']=idx
-            chunk_docs.append(
-                Document(
-                    page_content=chunk,
-                    metadata=chunk_metadata
-                )
-            )
-        return chunk_docs
+                sections=[(None,doc.page_content)]
+            for parent,text in sections:
+                for chunk in self._split(text):
+                    idx=next_ids.get(doc_key,0)
+                    next_ids[doc_key]=idx+1
+                    chunk_metadata=metadata.copy()
+                    chunk_metadata['chunk_id']=idx
+                    if parent is not None:
+                        # parent_text is moved into the docs store when the chunk is indexed
+                        chunk_metadata['parent_id']=parent
+                        chunk_metadata['parent_text']=text
+                    yield Document(
+                        page_content=chunk,
+                        metadata=chunk_metadata
+                    )
+    def _split(self,text):
+        if self.mode=='simple':
+            return self._simple_chunk(text)
+        elif self.mode=='semantic':
+            return self._semantic_chunk(text)
+        return self._recursive_chunk(text)
+    def _parent_sections(self,text):
+        sections=[]
+        buffer=""
+        for para in self._split_by_paragraph(text):
+            if buffer and len(buffer)+len(para)>self.parent_chunk_size:
+                sections.append(buffer.strip())
+                buffer=""
+            while len(para)>self.parent_chunk_size:
+                sections.append(para[:self.parent_chunk_size])
+                para=para[self.parent_chunk_size:]
+            buffer+=para+"\n\n"
+        if buffer.strip():
+            sections.append(buffer.strip())
+        return [(hashlib.sha256(section.encode('utf-8')).hexdigest()[:32],section) for section in sections]
     def _simple_chunk(self,text):
         start=0
         chunks=[]
@@ -153,7 +221,7 @@ class ChunkDocument:
             start+=self.chunk_size -self.chunk_overlap
         return chunks
     def _recursive_chunk(self,text):
-        paragraphs=self._split_into_paragraphs(text)
+        paragraphs=self._split_by_paragraph(text)
         chunks=[]
         buffer="" 
         for para in paragraphs:
@@ -170,11 +238,68 @@ class ChunkDocument:
         final_chunks=[]
         for chunk in chunks:
             if len(chunk)> self.chunk_size:
-                final_chunks.extend(self._split_into_sentences(chunk))
+                final_chunks.extend(self._sentence_splitter(chunk))
             else:
                 final_chunks.append(chunk)
-        overlapping=self._add_overlaps(final_chunks)
+        overlapping=self._add_overlap(final_chunks)
         return overlapping
+    def _semantic_chunk(self,text):
+        """
+        Groups consecutive sentences, cutting where the similarity between
+        neighbouring sentences falls into the lowest `breakpoint_percentile`
+        of the document, and always before `max_tokens` would be exceeded.
+        """
+        sentences=[s.strip() for s in re.split(r'(?<=[.!?])\s+',text) if s.strip()]
+        if not sentences:
+            return []
+        token_counts=[len(t) for t in self._get_tokenizer().encode_batch(sentences)]
+        if len(sentences)==1:
+            return self._fit_to_max_tokens(sentences[0],token_counts[0])
+        vectors=self._embed_sentences(sentences)
+        similarities=np.einsum('ij,ij->i',vectors[:-1],vectors[1:])
+        threshold=np.percentile(similarities,self.breakpoint_percentile)
+        # no dip, no topic change: text whose neighbours are all as similar
+        # as each other would otherwise be cut after every sentence
+        breakpoints=(similarities<=threshold)&(similarities<similarities.max())
+        
+        chunks=[]
+        buffer=[]
+        buffer_tokens=0
+        for i,sentence in enumerate(sentences):
+            if buffer and buffer_tokens+token_counts[i]>self.max_tokens:
+                chunks.extend(self._fit_to_max_tokens(" ".join(buffer),buffer_tokens))
+                buffer,buffer_tokens=[],0
+            buffer.append(sentence)
+            buffer_tokens+=token_counts[i]
+            if i<len(similarities) and breakpoints[i] and buffer_tokens>=self.min_tokens:
+                chunks.extend(self._fit_to_max_tokens(" ".join(buffer),buffer_tokens))
+                buffer,buffer_tokens=[],0
+        if buffer:
+            chunks.extend(self._fit_to_max_tokens(" ".join(buffer),buffer_tokens))
+        return chunks
+    
+    def _embed_sentences(self,sentences):
+        vectors=[]
+        for i in range(0,len(sentences),self.embed_batch_size):
+            vectors.extend(self.embedding_model.embed_documents(sentences[i:i+self.embed_batch_size]))
+        vectors=np.asarray(vectors,dtype=np.float32)
+        norms=np.linalg.norm(vectors,axis=1,keepdims=True)
+        return vectors/np.maximum(norms,1e-12)
+    
+    def _fit_to_max_tokens(self,chunk,num_tokens):
+        # only a single sentence longer than max_tokens can get here oversized
+        if num_tokens<=self.max_tokens:
+            return [chunk]
+        tokenizer=self._get_tokenizer()
+        tokens=tokenizer.encode(chunk)
+        return [tokenizer.decode(tokens[start:start+self.max_tokens]).strip() for start in range(0,len(tokens),self.max_tokens)]
+    
+    def _get_tokenizer(self):
+        if self.tokenizer is None:
+            import tiktoken
+            self.tokenizer=tiktoken.get_encoding(self.configs.get('encoding','cl100k_base'))
+        return self.tokenizer
+    
     def _split_by_paragraph(self, text: str) -> List[str]:
         return [p.strip() for p in text.split("\n\n") if p.strip()]
 
@@ -216,26 +341,67 @@ class ChunkDocument:
         return overlapped
     
 class EmbedDocument:
-    def __init__(self,embedding_model):
+    def __init__(self,embedding_model,batch_size=32,store=None,model_id=None):
         self.model=embedding_model
+        self.batch_size=batch_size
+        self.store=store
+        self.model_id=model_id or getattr(embedding_model,'model_name',None) or type(embedding_model).__name__
     def embed(self,docs):
         results=[]
-        texts=[doc.page_content() for doc in docs]
-        embedding=self._embed_texts(texts)
-        for idx,(doc,vector) in enumerate(zip(docs,embedding)):
-            results.append({
-                "id":idx,
-                "vector":vector,
-                "text":doc.page_content(),
-                "metadata":doc.metadata,
-            }
-            )
+        for records in self.embed_stream(docs):
+            results.extend(records)
         return results
+    def embed_query(self,text):
+        return self.model.embed_query(text)
+    def embed_stream(self,docs):
+        """
+        Embeds `docs` lazily, yielding one list of records per model batch.
+        """
+        docs=iter(docs)
+        idx=0
+        while True:
+            batch=list(islice(docs,self.batch_size))
+            if not batch:
+                return
+            texts=[doc.page_content for doc in batch]
+            embedding=self._embed_texts(texts)
+            records=[]
+            for doc,vector in zip(batch,embedding):
+                records.append({
+                    "id":idx,
+                    "vector":vector,
+                    "text":doc.page_content,
+                    "metadata":doc.metadata,
+                }
+                )
+                idx+=1
+            yield records
     def _embed_texts(self,text):
-        batch_size=32
+        if self.store is None:
+            vectors=[]
+            for batch_vectors in self._iter_embed_texts(text):
+                vectors.extend(batch_vectors)
+            return vectors
+        # only text the store has never seen for this model goes to the model
+        hashes=[text_hash(t) for t in text]
+        cached=self.store.get_many(self.model_id,hashes)
+        misses={}
+        for key,t in zip(hashes,text):
+            if key not in cached:
+                misses.setdefault(key,t)
+        if misses:
+            miss_keys=list(misses)
+            embedded=[]
+            for batch_vectors in self._iter_embed_texts(list(misses.values())):
+                embedded.extend(batch_vectors)
+            self.store.put_many(self.model_id,zip(miss_keys,embedded))
+            cached.update(zip(miss_keys,embedded))
         vectors=[]
-        for i in range(0,len(text),batch_size):
-            batch=text[i:i+batch_size]
-            vector=self.model.embed_documents(batch)
-            vectors.append(vector)
-        return vectors
\ No newline at end of file
+        for key in hashes:
+            vector=cached[key]
+            vectors.append(vector.tolist() if hasattr(vector,'tolist') else vector)
+        return vectors
+    def _iter_embed_texts(self,text):
+        for i in range(0,len(text),self.batch_size):
+            batch=text[i:i+self.batch_size]
+            yield self.model.embed_documents(batch)
\ No newline at end of file
@@ -0,0 +1,72 @@
+import queue
+import threading
+
+_DONE=object()
+
+
+class _Failed:
+    def __init__(self,exc):
+        self.exc=exc
+
+
+def _put(outbox,item,stop):
+    while not stop.is_set():
+        try:
+            outbox.put(item,timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _drain(inbox,stop):
+    while True:
+        try:
+            item=inbox.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                return
+            continue
+        if item is _DONE:
+            return
+        if isinstance(item,_Failed):
+            raise item.exc
+        yield item
+
+
+def _worker(stage,items,outbox,stop):
+    try:
+        for item in stage(items):
+            if not _put(outbox,item,stop):
+                return
+    except BaseException as e:
+        _put(outbox,_Failed(e),stop)
+        return
+    _put(outbox,_DONE,stop)
+
+
+def run_stages(source,stages,maxsize=8):
+    """
+    Streams `source` through generator stages, each running in its own thread.
+
+    Every stage is a callable taking an iterable and returning an iterable.
+    Stages are joined by queues of `maxsize` items, so a slow stage blocks
+    the ones upstream of it instead of letting work pile up in memory.
+    The first error raised by any stage is re-raised to the caller.
+    """
+    stop=threading.Event()
+    threads=[]
+    inbox=None
+    for stage in [lambda _:source]+list(stages):
+        outbox=queue.Queue(maxsize=maxsize)
+        items=None if inbox is None else _drain(inbox,stop)
+        thread=threading.Thread(target=_worker,args=(stage,items,outbox,stop),daemon=True)
+        thread.start()
+        threads.append(thread)
+        inbox=outbox
+    try:
+        yield from _drain(inbox,stop)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
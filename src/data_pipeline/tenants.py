@@ -0,0 +1,238 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from common.locks import ReadWriteLock
+from common.metrics import (
+    TENANT_EVICTIONS,
+    TENANT_INDEX_LOAD,
+    TENANT_RESIDENT_BYTES,
+    TENANT_RESIDENT_COUNT,
+)
+from .docs_store import DocsStore
+from .generation import CorpusGeneration, IndexReloader
+
+logger=logging.getLogger(__name__)
+
+# tenant ids become directory names
+_TENANT_ID=re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def check_tenant_id(tenant_id):
+    if not isinstance(tenant_id,str) or not _TENANT_ID.match(tenant_id):
+        raise ValueError(f"Invalid tenant id: {tenant_id!r}")
+    return tenant_id
+
+
+class TenantIndex:
+    """
+    One tenant's FAISS index and docs store, as held by TenantIndexManager.
+    `lock` is the index's ReadWriteLock: searches take it shared, adds
+    exclusively. `pins` counts the callers using it right now, and a pinned
+    tenant is never evicted. `reloader` reloads the index when another
+    process saved a newer one.
+    """
+    def __init__(self,tenant_id,indexer,docs_store,index_path,generation,near_duplicates=None,mmap=True):
+        self.tenant_id=tenant_id
+        self.indexer=indexer
+        self.docs_store=docs_store
+        self.near_duplicates=near_duplicates
+        self.index_path=index_path
+        self.lock=ReadWriteLock()
+        self.reloader=IndexReloader(indexer,index_path,generation,self.lock,mmap=mmap)
+        self.pins=0
+        self.nbytes=0
+
+    def refresh(self,writable=False):
+        if self.reloader.refresh(writable):
+            self.nbytes=os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+
+    def save(self):
+        # writing only reads the index, so searches may go on meanwhile
+        with self.lock.read():
+            self.indexer.save(self.index_path)
+            self.nbytes=os.path.getsize(self.index_path)
+
+    def close(self):
+        self.docs_store.close()
+        if self.near_duplicates is not None:
+            self.near_duplicates.close()
+
+
+class TenantIndexManager:
+    """
+    Per-tenant indexes under `root_dir/<tenant_id>/`, loaded on first use and
+    kept in an LRU capped at `memory_budget` bytes.
+
+    Index files are opened with mmap when `mmap` is set, so a cold load costs
+    a header read and pages come in as they are searched. Resident size is
+    estimated from the serialized index, which tracks its in-memory size.
+    When the budget is exceeded the least recently used unpinned tenants are
+    closed; pinned ones stay even if that means running over budget.
+
+    Concurrent requests for the same cold tenant wait on one load. A resident
+    tenant is reloaded on acquire if another process saved a newer index.
+    `make_indexer(tenant_dir)` builds an empty indexer; the directory is
+    for indexers that keep side files (BinaryIndexer's float store).
+    `make_near_duplicates(tenant_dir)`, if given, opens the tenant's
+    NearDuplicateIndex.
+    """
+    def __init__(self,root_dir,make_indexer,memory_budget,mmap=True,make_near_duplicates=None):
+        self.root_dir=root_dir
+        self.make_indexer=make_indexer
+        self.make_near_duplicates=make_near_duplicates
+        self.memory_budget=memory_budget
+        self.mmap=mmap
+        os.makedirs(root_dir,exist_ok=True)
+        self._resident=OrderedDict()
+        # tenant id -> [lock, callers using it], only while a load is wanted
+        self._load_locks={}
+        self._generations={}
+        self._lock=threading.Lock()
+        TENANT_RESIDENT_BYTES.set_function(lambda:self.resident_bytes)
+        TENANT_RESIDENT_COUNT.set_function(lambda:len(self._resident))
+
+    @property
+    def resident_bytes(self):
+        with self._lock:
+            return sum(tenant.nbytes for tenant in self._resident.values())
+
+    def acquire(self,tenant_id):
+        """Pins and returns the tenant's index, loading it if needed. Pair with release()."""
+        check_tenant_id(tenant_id)
+        with self._lock:
+            tenant=self._pin(tenant_id)
+            if tenant is None:
+                entry=self._load_locks.setdefault(tenant_id,[threading.Lock(),0])
+                entry[1]+=1
+        if tenant is not None:
+            try:
+                tenant.refresh()
+            except BaseException:
+                self.release(tenant)
+                raise
+            return tenant
+        try:
+            with entry[0]:
+                with self._lock:
+                    # someone else finished loading it while we waited
+                    tenant=self._pin(tenant_id)
+                    if tenant is not None:
+                        return tenant
+                start=time.perf_counter()
+                tenant=self._load(tenant_id)
+                elapsed=time.perf_counter()-start
+                TENANT_INDEX_LOAD.observe(elapsed)
+                logger.info("Loaded index for tenant %s (%d vectors) in %.3fs",tenant_id,tenant.indexer.size,elapsed)
+                with self._lock:
+                    tenant.pins+=1
+                    self._resident[tenant_id]=tenant
+                    evicted=self._evict()
+        finally:
+            with self._lock:
+                # the last caller out drops the lock, so it lives no longer
+                # than the load; one per tenant ever seen would never shrink
+                entry[1]-=1
+                if not entry[1]:
+                    del self._load_locks[tenant_id]
+        self._close(evicted)
+        return tenant
+
+    def release(self,tenant):
+        with self._lock:
+            tenant.pins-=1
+            evicted=self._evict()
+        self._close(evicted)
+
+    @contextmanager
+    def use(self,tenant_id):
+        tenant=self.acquire(tenant_id)
+        try:
+            yield tenant
+        finally:
+            self.release(tenant)
+
+    def generation(self,tenant_id):
+        """The tenant's CorpusGeneration; readable without loading its index."""
+        check_tenant_id(tenant_id)
+        with self._lock:
+            generation=self._generations.get(tenant_id)
+            if generation is None:
+                path=os.path.join(self.root_dir,tenant_id,'generation.db')
+                generation=self._generations[tenant_id]=CorpusGeneration(path)
+        return generation
+
+    def loaded_generation(self,tenant_id):
+        """
+        Generation the tenant's index is searched at in this process: the
+        resident copy's, refreshed first, or for a tenant not loaded yet the
+        current one, since loading it reads at least that.
+        """
+        check_tenant_id(tenant_id)
+        with self._lock:
+            tenant=self._pin(tenant_id)
+        if tenant is None:
+            return self.generation(tenant_id).current()
+        try:
+            tenant.refresh()
+            return tenant.reloader.loaded
+        finally:
+            self.release(tenant)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "resident":list(self._resident),
+                "resident_bytes":sum(tenant.nbytes for tenant in self._resident.values()),
+                "memory_budget":self.memory_budget,
+            }
+
+    def close(self):
+        with self._lock:
+            tenants=list(self._resident.values())
+            self._resident.clear()
+        for tenant in tenants:
+            tenant.close()
+
+    def _pin(self,tenant_id):
+        tenant=self._resident.get(tenant_id)
+        if tenant is not None:
+            self._resident.move_to_end(tenant_id)
+            tenant.pins+=1
+        return tenant
+
+    def _load(self,tenant_id):
+        tenant_dir=os.path.join(self.root_dir,tenant_id)
+        os.makedirs(tenant_dir,exist_ok=True)
+        index_path=os.path.join(tenant_dir,'index.faiss')
+        indexer=self.make_indexer(tenant_dir)
+        docs_store=DocsStore(os.path.join(tenant_dir,'docs.db'))
+        near_duplicates=self.make_near_duplicates(tenant_dir) if self.make_near_duplicates else None
+        tenant=TenantIndex(tenant_id,indexer,docs_store,index_path,self.generation(tenant_id),near_duplicates,mmap=self.mmap)
+        tenant.refresh()
+        return tenant
+
+    def _evict(self):
+        # caller holds self._lock
+        total=sum(tenant.nbytes for tenant in self._resident.values())
+        evicted=[]
+        for tenant_id in list(self._resident):
+            if total<=self.memory_budget:
+                break
+            tenant=self._resident[tenant_id]
+            if tenant.pins>0:
+                continue
+            del self._resident[tenant_id]
+            total-=tenant.nbytes
+            evicted.append(tenant)
+        return evicted
+
+    def _close(self,evicted):
+        for tenant in evicted:
+            TENANT_EVICTIONS.inc()
+            logger.info("Evicted index for tenant %s (%d bytes)",tenant.tenant_id,tenant.nbytes)
+            tenant.close()
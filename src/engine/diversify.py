@@ -0,0 +1,83 @@
+from typing import List, Optional
+
+import numpy as np
+
+
+def _normalize(vectors):
+    norms=np.linalg.norm(vectors,axis=-1,keepdims=True)
+    return vectors/np.maximum(norms,1e-12)
+
+
+def near_duplicate_mask(similarity,order,threshold):
+    """
+    True for candidates whose cosine similarity to a more relevant
+    candidate (earlier in `order`) is at least `threshold`.
+
+    One matrix pass instead of a greedy loop: a candidate is dropped even if
+    the near-twin it matched was itself dropped, which only matters for
+    chains of "almost duplicates" and keeps the check fully vectorized.
+    """
+    ranked=similarity[np.ix_(order,order)]>=threshold
+    dup_ranked=np.triu(ranked,k=1).any(axis=0)
+    mask=np.empty(len(order),dtype=bool)
+    mask[order]=dup_ranked
+    return mask
+
+
+def mmr(query_vector,vectors,k,lambda_=0.5,duplicate_threshold=None):
+    """
+    Maximal Marginal Relevance over candidate vectors.
+
+    Picks `k` indices into `vectors`, each maximising
+    lambda_ * sim(query, c) - (1 - lambda_) * max sim(c, already picked).
+    With `duplicate_threshold`, near-duplicates of a more relevant candidate
+    are removed before selection.
+    """
+    vectors=_normalize(np.asarray(vectors,dtype=np.float32))
+    query=_normalize(np.asarray(query_vector,dtype=np.float32).reshape(-1))
+    n=len(vectors)
+    if n==0:
+        return []
+    relevance=vectors@query
+    similarity=vectors@vectors.T
+
+    available=np.ones(n,dtype=bool)
+    if duplicate_threshold is not None:
+        available&=~near_duplicate_mask(similarity,np.argsort(-relevance),duplicate_threshold)
+    k=min(k,int(available.sum()))
+
+    selected=[]
+    max_similarity=np.full(n,-np.inf,dtype=np.float32)
+    score=np.empty(n,dtype=np.float32)
+    for _ in range(k):
+        if selected:
+            np.multiply(max_similarity,lambda_-1.0,out=score)
+            score+=lambda_*relevance
+        else:
+            np.copyto(score,relevance)
+        score[~available]=-np.inf
+        best=int(np.argmax(score))
+        selected.append(best)
+        available[best]=False
+        np.maximum(max_similarity,similarity[best],out=max_similarity)
+    return selected
+
+
+class Diversifier:
+    """
+    Post-retrieval candidate filter between search and the cross-encoder.
+
+    Collapses near-identical chunks (overlapping windows, repeated
+    boilerplate) and keeps the `k` most relevant yet mutually different
+    ones, so the reranker and the prompt don't pay for the same content
+    twice. `lambda_=1` is pure relevance, `lambda_=0` pure diversity.
+    """
+    def __init__(self,lambda_=0.5,duplicate_threshold=0.95,k:Optional[int]=None):
+        self.lambda_=lambda_
+        self.duplicate_threshold=duplicate_threshold
+        self.k=k
+
+    def select(self,query_vector,docs:List,vectors)->List:
+        k=self.k or len(docs)
+        order=mmr(query_vector,vectors,k,self.lambda_,self.duplicate_threshold)
+        return [docs[i] for i in order]
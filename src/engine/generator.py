@@ -1,7 +1,13 @@
 # generator.py
-from typing import List
+from typing import List, Optional
 from langchain.schema import Document
 
+from common import tracing
+from common.metrics import timed
+
+from .llm_client import AsyncLLMClient
+from .prompt import PromptBuilder
+
 
 class Generator:
     
@@ -10,60 +16,58 @@ class Generator:
         self,
         llm,
         max_context_tokens: int = 3000,
-        temperature: float = 0.0
+        temperature: float = 0.0,
+        prompt_builder: Optional[PromptBuilder] = None,
+        llm_client: Optional[AsyncLLMClient] = None,
+        tokenizer=None
     ):
         
         self.llm = llm
         self.max_context_tokens = max_context_tokens
         self.temperature = temperature
+        self.prompt_builder = prompt_builder or PromptBuilder(max_context_tokens, tokenizer=tokenizer)
+        self.llm_client = llm_client or AsyncLLMClient(llm)
 
 
+    @timed("generate")
     def generate(
         self,
         query: str,
         docs: List[Document]
     ) -> str:
         
-        context = self._build_context(docs)
-        prompt = self._build_prompt(query, context)
+        prompt = self.prompt_builder.build(query, docs)
+        self._trace_prompt(prompt.text)
 
-        response = self.llm.invoke(prompt)
+        response = self.llm.invoke(prompt.text)
 
         return response
 
 
-    def _build_context(self, docs: List[Document]) -> str:
-
-        context_blocks = []
-        total_length = 0
-
-        for i, doc in enumerate(docs):
-            block = f"[Document {i+1}]\n{doc.page_content.strip()}\n"
-            block_len = len(block)
-
-            if total_length + block_len > self.max_context_tokens:
-                break
-
-            context_blocks.append(block)
-            total_length += block_len
-
-        return "\n".join(context_blocks)
-
-
-    def _build_prompt(self, query: str, context: str) -> str:
+    @timed("generate")
+    async def agenerate(
+        self,
+        query: str,
+        docs: List[Document]
+    ) -> str:
         
-        return f"""
-You are a precise and factual AI assistant.
+        prompt = self.prompt_builder.build(query, docs)
+        self._trace_prompt(prompt.text)
+
+        return await self.llm_client.invoke(prompt.text)
 
-Answer the question ONLY using the context provided below.
-If the answer is not contained in the context, say:
-"I don't know based on the provided information."
 
-Context:
-{context}
+    def prompt_stats(self):
+        return self.prompt_builder.stats()
 
-Question:
-{query}
 
-Answer:
-""".strip()
+    def _trace_prompt(self, text: str):
+        if not tracing.is_recording():
+            return
+        tracing.set_attribute("prompt.chars", len(text))
+        count_tokens = getattr(self.llm, "get_num_tokens", None)
+        try:
+            tokens = count_tokens(text) if count_tokens else len(text.split())
+        except Exception:
+            tokens = len(text.split())
+        tracing.set_attribute("prompt.tokens", tokens)
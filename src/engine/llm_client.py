@@ -0,0 +1,210 @@
+# llm_client.py
+import asyncio
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+
+class LLMTimeoutError(TimeoutError):
+    pass
+
+
+class AsyncLLMClient:
+    """
+    Async execution layer around a LangChain-style LLM.
+
+    - at most `max_concurrency` calls in flight
+    - every `invoke` has a deadline of `timeout` seconds, retries included
+    - timeouts, connection errors, 429 and 5xx responses are retried with
+      exponential backoff and full jitter, waiting at least as long as a
+      Retry-After header asks; anything else (bad request, auth, ...) is
+      raised at once, and so is an error whose Retry-After ends past the
+      deadline
+    - with `hedge=True`, a second call is fired once the first has run longer
+      than the recent `hedge_quantile` latency, and the first result wins
+
+    Blocking `llm.invoke` is run on a dedicated pool of `max_concurrency`
+    threads when the LLM has no `ainvoke`, so the event loop never stalls on
+    generation and LLM calls cannot starve the default executor. A thread
+    cannot be interrupted, so an abandoned call (deadline, losing hedge)
+    keeps its slot until the thread actually returns.
+    """
+
+    def __init__(
+        self,
+        llm,
+        max_concurrency: int = 8,
+        timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        latency_window: int = 500,
+    ):
+        self.llm = llm
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="llm"
+        )
+        self._latencies = deque(maxlen=latency_window)
+        self._calls = 0
+        self._retries = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+
+    async def invoke(self, prompt: str, timeout: float = None) -> str:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise LLMTimeoutError("LLM deadline exceeded")
+            try:
+                return await asyncio.wait_for(self._call_hedged(prompt), remaining)
+            except Exception as exc:
+                # the LLM's own timeouts are retried, the overall deadline is not
+                if loop.time() >= deadline:
+                    raise LLMTimeoutError("LLM deadline exceeded") from None
+                if attempt >= self.max_retries or not is_transient(exc):
+                    raise
+                delay = random.uniform(0, self.backoff * 2 ** attempt)
+                wait = retry_after(exc)
+                if wait is not None:
+                    if loop.time() + wait >= deadline:
+                        raise
+                    delay = max(delay, wait)
+            attempt += 1
+            self._retries += 1
+            await asyncio.sleep(min(delay, max(0.0, deadline - loop.time())))
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "calls": self._calls,
+            "retries": self._retries,
+            "hedges": self._hedges,
+            "hedge_wins": self._hedge_wins,
+            "hedge_delay": self._hedge_delay(),
+        }
+
+    async def _call_hedged(self, prompt: str) -> str:
+        delay = self._hedge_delay() if self.hedge else None
+        if delay is None:
+            return await self._call_once(prompt)
+
+        started = asyncio.Event()
+        primary = asyncio.create_task(self._call_once(prompt, started))
+        pending = {primary}
+        try:
+            # the hedge timer starts once the primary holds a slot, so time
+            # queued behind `max_concurrency` cannot trigger hedges
+            waiter = asyncio.create_task(started.wait())
+            try:
+                await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            self._hedges += 1
+            pending.add(asyncio.create_task(self._call_once(prompt)))
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _call_once(self, prompt: str, started: asyncio.Event = None) -> str:
+        await self._semaphore.acquire()
+        if started is not None:
+            started.set()
+        self._calls += 1
+        start = time.perf_counter()
+        if hasattr(self.llm, "ainvoke"):
+            try:
+                response = await self.llm.ainvoke(prompt)
+            finally:
+                self._semaphore.release()
+        else:
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor, self.llm.invoke, prompt
+            )
+            future.add_done_callback(self._release)
+            # cancelling the caller must not mark the call done while the
+            # thread is still running, or its slot would be handed out again
+            response = await asyncio.shield(future)
+        self._latencies.append(time.perf_counter() - start)
+        return response
+
+    def _release(self, future):
+        self._semaphore.release()
+        if not future.cancelled():
+            # retrieved here so an abandoned call's error isn't logged as unhandled
+            future.exception()
+
+    def _hedge_delay(self):
+        if len(self._latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.hedge_quantile * len(ordered)))]
+
+
+# raised by the openai and httpx clients when no response came back; matched
+# by name so neither has to be installed
+CONNECTION_ERRORS = {"APIConnectionError", "TransportError"}
+
+
+def is_transient(exc: BaseException) -> bool:
+    """
+    Timeouts, dropped connections, rate limits (429) and 5xx responses are
+    worth retrying; other errors will fail again.
+    """
+    if isinstance(exc, (TimeoutError, ConnectionError)) or "Timeout" in type(exc).__name__:
+        return True
+    if any(cls.__name__ in CONNECTION_ERRORS for cls in type(exc).__mro__):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the error's Retry-After (or retry-after-ms) header asks to wait, if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or getattr(exc, "headers", None)
+    if not headers:
+        return None
+    headers = {key.lower(): value for key, value in headers.items()}
+    try:
+        if "retry-after-ms" in headers:
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
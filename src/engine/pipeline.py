@@ -1,5 +1,38 @@
+import asyncio
+import contextlib
+import copy
+import hashlib
+import logging
+import os
+
+import numpy as np
+from langchain.schema import Document
+
+from common import tracing
+from common.admission import AdmissionController
+from common.metrics import INDEX_SIZE, INGESTED_CHUNKS, INGESTED_PAGES, STAGE_LATENCY
+from data_pipeline.binary_indexer import BINARY_INDEX_TYPES, BinaryIndexer
+from data_pipeline.docs_store import DocsStore
+from data_pipeline.embedding_store import EmbeddingStore
+from data_pipeline.generation import CorpusGeneration, IndexReloader
+from data_pipeline.indexer import Indexer
+from data_pipeline.loader import DocumentLoader
+from data_pipeline.near_duplicates import NearDuplicateIndex
+from data_pipeline.preprocessor import ChunkDocument, CleanDocument, EmbedDocument
+from data_pipeline.streaming import run_stages
+from data_pipeline.tenants import TenantIndexManager
+from .diversify import Diversifier
+from .generator import Generator
+from .llm_client import AsyncLLMClient
+from .retriver import Retriever
+from .scheduler import StageScheduler
+from .score_normaliser import ScoreNormalizer
+
+logger=logging.getLogger(__name__)
+
+
 class RAGPipeline:
-    def __init__(self,loader,cleaner,chunker,embedder,indexer,retriver,reranker,scorenormalizer,generator):
+    def __init__(self,loader,cleaner,chunker,embedder,indexer,retriver,reranker,scorenormalizer,generator,docs_store=None,vector_store=None,scheduler=None,tenants=None,generation=None,near_duplicates=None,index_path=None,queue_size=8,compact_tombstones=1000):
         self.loader=loader
         self.cleaner=cleaner
         self.chunker=chunker
@@ -9,54 +42,491 @@ class RAGPipeline:
         self.reranker=reranker
         self.scorenormalizer=scorenormalizer
         self.generator=generator
+        self.docs_store=docs_store
+        self.vector_store=vector_store
+        self.scheduler=scheduler or StageScheduler()
+        self.tenants=tenants
+        self.generation=generation
+        self.near_duplicates=near_duplicates
+        # where the shared index is saved after each ingest; tenants save their own
+        self.index_path=index_path
+        # other processes follow the saves of the one that ingests (JobQueue's leader)
+        self.reloader=IndexReloader(indexer,index_path,generation,retriver.index_lock) if generation is not None else None
+        self.queue_size=queue_size
+        self.compact_tombstones=compact_tombstones
+        INDEX_SIZE.set_function(lambda:self.indexer.size)
         
-    async def run(self,query):
-        docs=self.retriver.retrieve(query)
+    @tracing.traced("rag.run")
+    async def run(self,query,query_vector=None,timings=None,tenant_id=None):
+        """
+        Answers `query`. Pass `query_vector` if the query was already embedded
+        (e.g. alongside the response-cache lookup); per-stage seconds are
+        written into `timings` when a dict is given.
+        
+        With a tenant manager attached, `tenant_id` selects the index searched.
+        Without one there is a single shared index and `tenant_id` is ignored.
+        """
+        timings=timings if timings is not None else {}
+        if tenant_id is None or self.tenants is None:
+            if self.reloader is not None:
+                await self.scheduler.run(timings,"load_index",self.reloader.refresh)
+            return await self._answer(query,query_vector,timings)
+        tenant=await self.scheduler.run(timings,"load_index",self.tenants.acquire,tenant_id)
+        try:
+            return await self.for_tenant(tenant)._answer(query,query_vector,timings)
+        finally:
+            self.tenants.release(tenant)
+    
+    def corpus_generation(self,tenant_id=None):
+        """
+        Generation of the corpus `tenant_id` would be answered from in this
+        process, or None when no counter is kept. Cache keys include it. The
+        index is reloaded first if another process saved a newer one, so an
+        answer is never keyed on a generation this process hasn't loaded.
+        """
+        if tenant_id is not None and self.tenants is not None:
+            return self.tenants.loaded_generation(tenant_id)
+        if self.reloader is not None:
+            self.reloader.refresh()
+            return self.reloader.loaded
+        if self.generation is None:
+            return None
+        return self.generation.current()
+    
+    def for_tenant(self,tenant):
+        """
+        Shallow copy of the pipeline bound to a TenantIndex; models, scheduler
+        and caches stay shared.
+        """
+        view=copy.copy(self)
+        view.indexer=tenant.indexer
+        view.docs_store=tenant.docs_store
+        view.retriver=self.retriver.bind(tenant.indexer,tenant.docs_store,tenant.lock)
+        view.near_duplicates=tenant.near_duplicates
+        view.index_path=tenant.index_path
+        view.reloader=tenant.reloader
+        # the Qdrant collection is shared and its points carry no tenant
+        view.vector_store=None
+        return view
+    
+    async def _answer(self,query,query_vector,timings):
+        if query_vector is None:
+            query_vector=await self.embed_query(query,timings)
+        
+        docs=await self._retrieve(query_vector,timings)
+        tracing.set_attribute("rag.candidates",len(docs))
+        # reads vectors back under the index lock, which may block on an add
+        docs=await self.scheduler.run(timings,"diversify",self.retriver.diversify,query_vector,docs)
         
         if not docs:
             logger.warning("No documents retrieved for the query.")
             return "I don't know based on the provided information."
         
-        reranked_docs=self.reranker.rerank(query,docs)
+        reranked_docs=await self.scheduler.run(timings,"rerank",self.reranker.rerank,query,docs)
+        
+        context_docs=await self.scheduler.run(timings,"fetch_parents",self.retriver.expand_to_parents,reranked_docs)
+        tracing.set_attribute("rag.context_docs",len(context_docs))
         
-        answer=self.generator.generate(query,reranked_docs)
+        answer=await self.scheduler.timed(timings,"generate",self.generator.agenerate,query,context_docs)
         
-        logging.info("Generated answer for the query.")
+        logger.info("Generated answer for the query.",extra={"timings":timings})
         return answer
+    
+    async def warm_up(self,queries,progress=None):
+        """
+        Sends `queries` through embed, search and rerank -- never the LLM -- so
+        kernels, thread pools and buffers are built before real traffic
+        arrives. `progress(done, total)` is called after each query.
+        """
+        completed=0
+        for i,query in enumerate(queries):
+            timings={}
+            try:
+                query_vector=await self.embed_query(query,timings)
+                docs=await self._retrieve(query_vector,timings)
+                # an empty index still gets the reranker warmed
+                docs=docs or [Document(page_content=query,metadata={})]
+                await self.scheduler.run(timings,"rerank",self.reranker.rerank,query,docs)
+                completed+=1
+            except Exception as e:
+                logger.warning("Warm-up query failed: %s",e)
+            if progress:
+                progress(i+1,len(queries))
+        return completed
+    
+    async def embed_query(self,query,timings=None):
+        timings=timings if timings is not None else {}
+        return await self.scheduler.run(timings,"embed",self.retriver.embed_query,query)
+    
+    async def _retrieve(self,query_vector,timings):
+        # FAISS and Qdrant are independent, so both searches run at once
+        searches=[self.scheduler.run(timings,"search",self.retriver.retrieve_by_vector,query_vector)]
+        if self.vector_store is not None:
+            searches.append(self.scheduler.run(
+                timings,"search_qdrant",self.vector_store.search_vectors,query_vector[0].tolist(),self.retriver.top_k))
+        results=await asyncio.gather(*searches)
+        docs=[]
+        seen=set()
+        for result in results:
+            for doc in result:
+                key=doc.metadata.get('chunk_hash') or doc.page_content
+                if key in seen:
+                    continue
+                seen.add(key)
+                docs.append(doc)
+        return docs
     async def ingest(self,file):
+        stats=await asyncio.to_thread(self.ingest_stream,file.file,file.filename)
         
-        raw_data=await self.loader.load(file)
+        logging.info(f"Successfully ingested document: {file.filename}")
+        return stats
+    
+    def ingest_stream(self,file_stream,filename,progress=None,tenant_id=None,replaces=None):
+        """
+        Ingests a file page by page: load -> clean -> chunk -> embed -> index.
         
-        cleaned_data=self.cleaner.clean(raw_data)
+        Each stage runs in its own thread and hands work to the next one
+        through a bounded queue, so memory stays flat however large the file is.
+        `progress`, if given, is called with the running counts as they change.
         
-        chunks=self.chunker.chunk(cleaned_data)
+        With a docs store attached, ingestion is content-addressed: a file
+        whose bytes are already indexed is skipped whatever its name, and
+        chunks already in the index are not embedded again. Uploads only add
+        documents; pass the doc id of an earlier version as `replaces` to
+        drop that version's chunks that the new one no longer contains.
         
-        vectors=self.embedder.embed([chunk.page_content for chunk in chunks])
+        With a tenant manager attached, the file goes into `tenant_id`'s index.
+        The index is saved to disk when ingestion ends, next to its docs store.
         
-        self.indexer.add(vectors)
+        The corpus generation is bumped once the index changed, after it has
+        been saved, so cached answers from the old corpus stop being used and
+        other processes serving the index reload it.
+        """
+        tenant_scoped=tenant_id is not None and self.tenants is not None
+        reloader=None if tenant_scoped else self.reloader
+        # a failed ingest may still have added some chunks
+        changed=True
+        try:
+            if tenant_scoped:
+                with self.tenants.use(tenant_id) as tenant:
+                    reloader=tenant.reloader
+                    tenant.refresh(writable=True)
+                    try:
+                        stats=self.for_tenant(tenant)._ingest_stream(file_stream,filename,progress,replaces)
+                    finally:
+                        # also on failure: the docs store already holds the chunks added so far
+                        tenant.save()
+            else:
+                if reloader is not None:
+                    # a worker that just took over ingestion may hold an older, read-only copy
+                    reloader.refresh(writable=True)
+                try:
+                    stats=self._ingest_stream(file_stream,filename,progress,replaces)
+                finally:
+                    self._save_index()
+            changed=bool(stats["vectors"] or stats["removed"])
+            return stats
+        finally:
+            if changed and reloader is not None:
+                reloader.bump()
+    
+    def _save_index(self):
+        if self.index_path is None:
+            return
+        # saving only reads the index; adds wait until it is written
+        with self.retriver.index_lock.read():
+            self.indexer.save(self.index_path)
+    
+    def _ingest_stream(self,file_stream,filename,progress=None,replaces=None):
+        # ingests into one store run one at a time (see DocsStore.ingest_lock);
+        # ingest workers still run jobs for different tenants side by side
+        docs_store=self.docs_store
+        with docs_store.ingest_lock if docs_store is not None else contextlib.nullcontext():
+            return self._ingest_document(file_stream,filename,progress,replaces)
+    
+    def _ingest_document(self,file_stream,filename,progress=None,replaces=None):
+        stats={"doc_id":None,"pages":0,"chunks":0,"vectors":0,"skipped":0,"removed":0,"near_duplicates":0}
+        doc_id=self.loader.doc_id_for(file_stream)
+        stats["doc_id"]=doc_id
+        docs_store=self.docs_store
+        if docs_store is not None and docs_store.has_document(doc_id,self.indexer.ntotal):
+            logger.info("Document %s is already indexed as %s, skipping ingestion",filename,doc_id)
+            if replaces is not None and replaces!=doc_id:
+                stats["removed"]=self._commit_document(doc_id,filename,(),replaces,(),[])
+            return stats
+        # chunks of the version being replaced may be about to disappear
+        replaced=docs_store.document_chunks(replaces) if docs_store is not None and replaces else set()
+        seen=set()
+        # hashes of the indexed chunks the document is made of
+        members=set()
+        pages=self.loader.iter_file_pages(file_stream,filename,doc_id)
         
-        logging.info(f"Successfully ingested document: {file.filename}")
+        def count(key,items,counter):
+            for item in items:
+                stats[key]+=1
+                counter.inc()
+                if progress:
+                    progress(dict(stats))
+                yield item
+        
+        def dedup(chunks):
+            for chunk in chunks:
+                chunk_hash=chunk_key(chunk)
+                if chunk_hash in seen:
+                    continue
+                seen.add(chunk_hash)
+                members.add(chunk_hash)
+                if docs_store is not None and docs_store.find_chunk(chunk_hash,self.indexer.ntotal) is not None:
+                    stats["skipped"]+=1
+                    continue
+                chunk.metadata['chunk_hash']=chunk_hash
+                yield chunk
+        
+        near_duplicates=self.near_duplicates
+        # chunks of this file that will be indexed, so later chunks can match them too
+        pending=near_duplicates.scratch() if near_duplicates is not None else None
+        pointers=[]
+        
+        def indexed(key):
+            # signatures outlive a crash before the index was saved
+            return docs_store is None or docs_store.find_chunk(key,self.indexer.ntotal) is not None
         
-def build_rag_pipeline(settings,cache):
-    loader=Loader()
-    cleaner=Cleaner()
-    chunker=Chunker()
-    embedder=Embedder(settings)
-    indexer=Indexer(settings)
-    retriever=Retriever(embedder,indexer)
-    reranker=Reranker(settings)
-    score_normalizer=ScoreNormalizer()
-    generator=Generator(settings)
-    
-    return RAGPipeline(
-        loader=loader,
-        cleaner=cleaner,
+        def near_dedup(chunks):
+            # a chunk whose near-duplicate is already indexed is recorded as a
+            # pointer to it instead of being embedded; the replaced version
+            # doesn't count, its chunks may be about to be removed
+            with near_duplicates.excluding(replaced) as excluded:
+                for chunk in chunks:
+                    chunk_hash=chunk.metadata['chunk_hash']
+                    with STAGE_LATENCY.time(stage="minhash"):
+                        signature=near_duplicates.signature(chunk.page_content)
+                        original=near_duplicates.query(signature,exclude=excluded,accept=indexed) or pending.query(signature)
+                    if original is not None:
+                        stats["near_duplicates"]+=1
+                        pointers.append((chunk_hash,original))
+                        members.discard(chunk_hash)
+                        members.add(original)
+                        continue
+                    pending.add(chunk_hash,signature)
+                    yield chunk
+        
+        stages=[
+            lambda docs:count("pages",docs,INGESTED_PAGES),
+            self.cleaner.clean_stream,
+            self.chunker.chunk_stream,
+            lambda chunks:self.embedder.embed_stream(count("chunks",chunks,INGESTED_CHUNKS)),
+            self._index_stream,
+        ]
+        if near_duplicates is None:
+            stages[3:3]=[dedup]
+        else:
+            stages[3:3]=[lambda chunks:near_dedup(dedup(chunks))]
+        try:
+            for added in run_stages(pages,stages,maxsize=self.queue_size):
+                stats["vectors"]+=added
+                if progress:
+                    progress(dict(stats))
+            signatures=pending.items() if pending is not None else ()
+        finally:
+            if pending is not None:
+                pending.close()
+        
+        if docs_store is not None:
+            stats["removed"]=self._commit_document(doc_id,filename,members,replaces,signatures,pointers)
+        return stats
+    
+    def _commit_document(self,doc_id,filename,members,replaces,signatures,pointers):
+        removed=self.docs_store.commit_document(doc_id,filename,members,replaces)
+        if self.near_duplicates is not None:
+            self.near_duplicates.commit(doc_id,signatures,pointers,removed,replaces)
+        if removed:
+            self._compact()
+        return len(removed)
+    
+    def _compact(self):
+        """
+        Rebuilds the index without the vectors of removed chunks once there
+        are `compact_tombstones` of them, and saves it. Ids don't change.
+        """
+        docs_store=self.docs_store
+        if not self.compact_tombstones or docs_store.tombstones()<self.compact_tombstones:
+            return
+        with self.retriver.index_lock.write():
+            before=self.indexer.size
+            if not self.indexer.compact(docs_store.live_ids(self.indexer.ntotal)):
+                return
+            dropped=before-self.indexer.size
+        # after the save: a crash before it leaves them in the file on disk
+        self._save_index()
+        docs_store.clear_tombstones(dropped)
+        logger.info("Compacted the index: dropped %d vectors, %d left",dropped,self.indexer.size)
+    
+    def _index_stream(self,batches):
+        # untrained indexes (IVF_PQ) keep vectors in a flat buffer and train
+        # themselves once it holds enough
+        for records in batches:
+            yield self._add_records(records)
+    
+    def _add_records(self,records):
+        vectors=np.asarray([rec['vector'] for rec in records],dtype='float32')
+        # searches run alongside ingest jobs; FAISS must not be read mid-add
+        with self.retriver.index_lock.write():
+            start=self.indexer.ntotal
+            self.indexer.add(vectors)
+            if self.docs_store is not None:
+                self.docs_store.add_chunks(range(start,start+len(records)),records)
+        return len(records)
+        
+def chunk_key(chunk):
+    """
+    Dedup key of a chunk: its text, and the parent section it was cut from.
+    
+    The same text under a different parent is a different chunk, otherwise it
+    would keep pointing at whichever section it was first indexed with.
+    """
+    key=chunk.page_content
+    parent_id=chunk.metadata.get('parent_id')
+    if parent_id is not None:
+        key=parent_id+"\0"+key
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def make_indexer(settings,index_dir):
+    if settings.index_type in BINARY_INDEX_TYPES:
+        return BinaryIndexer(
+            settings.embedding_dims,
+            settings.index_type,
+            settings.index_metric,
+            vectors_path=os.path.join(index_dir,'vectors.f32'),
+            rescore_factor=settings.binary_rescore_factor,
+        )
+    return Indexer(
+        settings.embedding_dims,
+        settings.index_type,
+        settings.index_metric,
+        n_list=settings.index_n_list,
+        m=settings.index_pq_m,
+        train_size=settings.index_train_size,
+    )
+
+def make_near_duplicates(settings,index_dir):
+    return NearDuplicateIndex(
+        os.path.join(index_dir,'lsh.db'),
+        threshold=settings.near_duplicate_threshold,
+    )
+
+def load_embedding_model(settings):
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=settings.embedding_model,model_kwargs={'device':settings.device})
+
+def load_reranker(settings):
+    from transformers import AutoModelForSequenceClassification,AutoTokenizer
+    from .reranker import Reranker
+    return Reranker(
+        AutoModelForSequenceClassification.from_pretrained(settings.reranker_model),
+        AutoTokenizer.from_pretrained(settings.reranker_model),
+        top_n=settings.rerank_top_n,
+        device=settings.device,
+    )
+
+def load_tokenizer(settings):
+    import tiktoken
+    # counts chunk and prompt tokens; close enough for the embedding and LLM models
+    return tiktoken.get_encoding("cl100k_base")
+
+def load_llm(settings):
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_openai import ChatOpenAI
+    # chat models answer with a message; the parser makes invoke/ainvoke return text
+    return ChatOpenAI(model=settings.llm_model,temperature=0,timeout=settings.llm_timeout)|StrOutputParser()
+
+def build_rag_pipeline(settings):
+    """
+    Builds the pipeline the API serves: models from `load_embedding_model`,
+    `load_reranker` and `load_llm`, the tokenizer from `load_tokenizer`, the
+    shared index and its docs store under `settings.index_dir`, and
+    optionally per-tenant indexes and near-duplicate detection.
+    """
+    os.makedirs(settings.index_dir,exist_ok=True)
+    embedding_model=load_embedding_model(settings)
+    embedding_store=None
+    if settings.embedding_cache:
+        embedding_store=EmbeddingStore(os.path.join(settings.index_dir,'embeddings.db'))
+    embedder=EmbedDocument(embedding_model,store=embedding_store)
+    tokenizer=load_tokenizer(settings)
+    index_path=os.path.join(settings.index_dir,'index.faiss')
+    indexer=make_indexer(settings,settings.index_dir)
+    docs_store=DocsStore(os.path.join(settings.index_dir,'docs.db'))
+    diversifier=Diversifier(
+        lambda_=settings.mmr_lambda,
+        duplicate_threshold=settings.duplicate_threshold,
+        k=settings.mmr_k,
+    )
+    retriever=Retriever(
+        embedder,
+        indexer,
+        top_k=settings.top_k,
+        docs_store=docs_store,
+        score_threshold=settings.score_threshold,
+        diversifier=diversifier,
+    )
+    tenants=None
+    if settings.tenant_index_dir:
+        tenants=TenantIndexManager(
+            settings.tenant_index_dir,
+            make_indexer=lambda tenant_dir:make_indexer(settings,tenant_dir),
+            memory_budget=settings.tenant_memory_budget_mb*1024*1024,
+            make_near_duplicates=(
+                (lambda tenant_dir:make_near_duplicates(settings,tenant_dir))
+                if settings.near_duplicate_threshold else None
+            ),
+        )
+    generation=CorpusGeneration(os.path.join(settings.index_dir,'generation.db'))
+    near_duplicates=None
+    if settings.near_duplicate_threshold:
+        near_duplicates=make_near_duplicates(settings,settings.index_dir)
+    chunker=ChunkDocument(
+        {
+            "mode":settings.chunk_mode,
+            "chunk_size":settings.chunk_size,
+            "chunk_overlap":settings.chunk_overlap,
+            "parent_chunk_size":settings.parent_chunk_size,
+        },
+        embedding_model=embedding_model,
+        tokenizer=tokenizer,
+    )
+    llm=load_llm(settings)
+    generator=Generator(
+        llm,
+        tokenizer=tokenizer,
+        llm_client=AsyncLLMClient(llm,max_concurrency=settings.llm_concurrency,timeout=settings.llm_timeout),
+    )
+    admission=AdmissionController(
+        {
+            "embed":settings.embed_concurrency,
+            "rerank":settings.rerank_concurrency,
+            "generate":settings.llm_concurrency,
+        },
+        max_waiting=settings.admission_max_waiting,
+    )
+    
+    pipeline=RAGPipeline(
+        loader=DocumentLoader({"extract_workers":settings.extract_workers}),
+        cleaner=CleanDocument({}),
         chunker=chunker,
         embedder=embedder,
         indexer=indexer,
-        retriever=retriever,
-        reranker=reranker,
-        score_normalizer=score_normalizer,
+        retriver=retriever,
+        reranker=load_reranker(settings),
+        scorenormalizer=ScoreNormalizer(),
         generator=generator,
-        cache=cache,
-    )
\ No newline at end of file
+        docs_store=docs_store,
+        scheduler=StageScheduler(admission=admission),
+        tenants=tenants,
+        generation=generation,
+        near_duplicates=near_duplicates,
+        index_path=index_path,
+        compact_tombstones=settings.index_compact_tombstones,
+    )
+    # loads the saved index, if any
+    pipeline.reloader.refresh()
+    return pipeline
@@ -0,0 +1,149 @@
+# prompt.py
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from langchain.schema import Document
+
+from common import tracing
+
+
+SYSTEM_PROMPT = """
+You are a precise and factual AI assistant.
+
+Answer the question ONLY using the context provided below.
+If the answer is not contained in the context, say:
+"I don't know based on the provided information."
+""".strip()
+
+
+@dataclass(frozen=True)
+class Prompt:
+    prefix: str
+    suffix: str
+
+    @property
+    def text(self) -> str:
+        return f"{self.prefix}\n\n{self.suffix}"
+
+
+class PromptBuilder:
+    """
+    Assembles prompts in a fixed layout so LLM backends can reuse their
+    prefix (KV) cache across calls.
+
+    Layout: system instructions, then the context documents in canonical
+    order (by doc id / parent id / chunk id, not by rerank score), then the
+    question. The same document set therefore always yields the same prefix,
+    whatever order retrieval returned it in.
+
+    Documents are added in relevance order while their blocks fit in
+    `max_context_tokens`, counted with `tokenizer` (tiktoken-shaped, the
+    same one the chunker uses; cl100k_base when not given).
+
+    Identical (query, document set) pairs are memoized, and the builder keeps
+    a window of recently emitted prefixes to report how often a prefix repeats.
+    """
+
+    def __init__(
+        self,
+        max_context_tokens: int = 3000,
+        memo_size: int = 1024,
+        prefix_window: int = 256,
+        tokenizer=None,
+    ):
+        self.max_context_tokens = max_context_tokens
+        self.memo_size = memo_size
+        self.prefix_window = prefix_window
+        self.tokenizer = tokenizer
+        self._memo: "OrderedDict[Tuple, Prompt]" = OrderedDict()
+        self._recent_prefixes: "OrderedDict[str, None]" = OrderedDict()
+        self._requests = 0
+        self._memo_hits = 0
+        self._prefix_hits = 0
+
+    def build(self, query: str, docs: List[Document]) -> Prompt:
+        self._requests += 1
+        selected = self._select(docs)
+        # the text hash guards against a chunk id being reused for new text
+        memo_key = (query, tuple((key, hash(doc.page_content)) for key, doc in selected))
+        prompt = self._memo.get(memo_key)
+        tracing.set_attribute("prompt.memo_hit", prompt is not None)
+        if prompt is not None:
+            self._memo.move_to_end(memo_key)
+            self._memo_hits += 1
+        else:
+            prompt = Prompt(
+                prefix=self._build_prefix(selected),
+                suffix=f"Question:\n{query}\n\nAnswer:",
+            )
+            self._memo[memo_key] = prompt
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+        tracing.set_attribute("prompt.prefix_hit", self._record_prefix(prompt.prefix))
+        tracing.set_attribute("prompt.context_docs", len(selected))
+        return prompt
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests": self._requests,
+            "memo_hits": self._memo_hits,
+            "prefix_hits": self._prefix_hits,
+            "prefix_hit_ratio": self._prefix_hits / self._requests if self._requests else 0.0,
+        }
+
+    def _select(self, docs: List[Document]) -> List[Tuple[Tuple, Document]]:
+        # relevance order decides what fits, canonical order decides the layout
+        selected = []
+        total_tokens = 0
+        for doc in docs:
+            block_tokens = self._count_tokens(
+                f"[Document {len(selected)+1}]\n{doc.page_content.strip()}\n"
+            )
+            if total_tokens + block_tokens > self.max_context_tokens:
+                break
+            selected.append((self._doc_key(doc), doc))
+            total_tokens += block_tokens
+        selected.sort(key=lambda item: item[0])
+        return selected
+
+    def _count_tokens(self, text: str) -> int:
+        if self.tokenizer is None:
+            import tiktoken
+
+            self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        # document text is data: "<|endoftext|>" in it is not a special token
+        encode = getattr(self.tokenizer, "encode_ordinary", self.tokenizer.encode)
+        return len(encode(text))
+
+    def _build_prefix(self, selected: List[Tuple[Tuple, Document]]) -> str:
+        blocks = [
+            f"[Document {i+1}]\n{doc.page_content.strip()}\n"
+            for i, (_, doc) in enumerate(selected)
+        ]
+        context = "\n".join(blocks)
+        return f"{SYSTEM_PROMPT}\n\nContext:\n{context}"
+
+    def _record_prefix(self, prefix: str) -> bool:
+        digest = hashlib.sha1(prefix.encode("utf-8")).hexdigest()
+        if digest in self._recent_prefixes:
+            self._recent_prefixes.move_to_end(digest)
+            self._prefix_hits += 1
+            return True
+        self._recent_prefixes[digest] = None
+        if len(self._recent_prefixes) > self.prefix_window:
+            self._recent_prefixes.popitem(last=False)
+        return False
+
+    @staticmethod
+    def _doc_key(doc: Document) -> Tuple:
+        metadata = doc.metadata or {}
+        if "chunk_id" not in metadata and "parent_id" not in metadata:
+            return ("", "", hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest())
+        return (
+            str(metadata.get("doc_id", "")),
+            str(metadata.get("parent_id", "")),
+            str(metadata.get("chunk_id", "")).zfill(8),
+        )
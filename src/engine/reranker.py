@@ -1,20 +1,25 @@
 import torch
+
+from common import tracing
+from common.metrics import timed
+
 class Reranker:
     def __init__(self,model,tokenizer,top_n,device='cpu'):
         self.model=model.to(device)
         self.tokenizer=tokenizer
         self.top_n=top_n
         self.device=device
+    @timed("rerank")
     def rerank(self,query,documents):
         pairs=[(query,doc.page_content) for doc in documents]
         
         scores=self._score_pairs(pairs)
         
-        scored_docs=zip(documents,scores)
-        
-        scored_docs.sort(key=lambda x:x[1],reverse=True)
+        scored_docs=sorted(zip(documents,scores),key=lambda x:x[1],reverse=True)
         
         reranked_docs=[doc for doc,_ in scored_docs[:self.top_n]]
+        tracing.set_attribute("rerank.input",len(documents))
+        tracing.set_attribute("rerank.output",len(reranked_docs))
         
         return reranked_docs
     
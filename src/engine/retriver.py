@@ -1,29 +1,61 @@
+import copy
+
+import numpy as np
+from langchain.schema import Document
+
+from common import tracing
+from common.locks import ReadWriteLock
+from common.metrics import timed
+
+
 class Retriever:
-    def __init__(self,embedder,indexer,top_k,docs_store,score_threshold):
+    def __init__(self,embedder,indexer,top_k,docs_store,score_threshold,diversifier=None,index_lock=None):
         self.embedder=embedder
         self.indexer=indexer
         self.top_k=top_k
         self.docs_store=docs_store
         self.score_threshold=score_threshold
+        self.diversifier=diversifier
+        # searches hold it shared; whoever adds to `indexer` must hold it exclusively
+        self.index_lock=index_lock or ReadWriteLock()
+        
+    def bind(self,indexer,docs_store,index_lock):
+        """Same retriever over another index, e.g. a tenant's."""
+        retriever=copy.copy(self)
+        retriever.indexer=indexer
+        retriever.docs_store=docs_store
+        retriever.index_lock=index_lock
+        return retriever
         
     def retrieve(self,query):
-        query_vector=self._embed_query(query)
+        query_vector=self.embed_query(query)
         
+        return self.retrieve_by_vector(query_vector)
+    
+    def retrieve_by_vector(self,query_vector):
         scores,indices=self._search(query_vector)
         
         docs=self._fetch_docs(indices,scores)
         
         return docs
     
-    def _embed_query(self,query):
-        embedding=self.embedder.embed([query])
-        return np.array(embedding).astype('float32')
+    @timed("embed")
+    def embed_query(self,query):
+        embedding=self.embedder.embed_query(query)
+        return np.array([embedding]).astype('float32')
+    @timed("search")
     def _search(self,query_vector):
-        scores,indices=self.indexer.search(query_vector,self.top_k)
+        # vectors of dropped chunks stay in the index until it is compacted
+        # and may take some of the top_k places; _fetch_docs skips them
+        extra=self.docs_store.tombstones() if self.docs_store is not None else 0
+        with self.index_lock.read():
+            scores,indices=self.indexer.search(query_vector,self.top_k+extra)
         return scores[0],indices[0]
+    @timed("fetch_docs")
+    @tracing.traced("fetch_docs")
     def _fetch_docs(self,indices,scores):
         docs=[]
-        for idx,score in zip(scores,indices):
+        for idx,score in zip(indices,scores):
             if idx==-1:
                 continue
             if self.score_threshold is not None:
@@ -32,7 +64,56 @@ class Retriever:
             doc=self.docs_store.get_document_by_id(idx)
             if not doc:
                 continue
+            doc['metadata']['vector_id']=int(idx)
             docs.append(
                 Document(page_content=doc['text'],metadata=doc['metadata'])
             )
-        return docs
\ No newline at end of file
+            if len(docs)==self.top_k:
+                break
+        tracing.set_attribute("retrieve.hits",int((indices!=-1).sum()))
+        tracing.set_attribute("retrieve.candidates",len(docs))
+        return docs
+    @timed("diversify")
+    def diversify(self,query_vector,docs):
+        """
+        Drops near-duplicate candidates and keeps a relevant but varied subset
+        (MMR) using the vectors already in the index. Docs that did not come
+        from the index (no vector_id) are kept after the selected ones.
+        """
+        if self.diversifier is None or len(docs)<2:
+            return docs
+        indexed=[doc for doc in docs if doc.metadata.get('vector_id') is not None]
+        others=[doc for doc in docs if doc.metadata.get('vector_id') is None]
+        if len(indexed)<2:
+            return docs
+        with self.index_lock.read():
+            vectors=self.indexer.reconstruct([doc.metadata['vector_id'] for doc in indexed])
+        selected=self.diversifier.select(np.asarray(query_vector).reshape(-1),indexed,vectors)
+        tracing.set_attribute("diversify.candidates",len(docs))
+        tracing.set_attribute("diversify.kept",len(selected)+len(others))
+        return selected+others
+    def expand_to_parents(self,docs):
+        """
+        Swaps matched child chunks for their parent sections, keeping rank
+        order and collapsing children of the same parent into one entry.
+        Meant for the final reranked docs only; docs without a parent pass through.
+        """
+        parent_ids=[doc.metadata.get('parent_id') for doc in docs]
+        wanted=[pid for pid in dict.fromkeys(parent_ids) if pid]
+        if not wanted:
+            return docs
+        parents=self.docs_store.get_parents(wanted)
+        expanded=[]
+        positions={}
+        for doc,pid in zip(docs,parent_ids):
+            if not pid or pid not in parents:
+                expanded.append(doc)
+                continue
+            if pid in positions:
+                expanded[positions[pid]].metadata['child_chunk_ids'].append(doc.metadata.get('chunk_id'))
+                continue
+            metadata=dict(doc.metadata)
+            metadata['child_chunk_ids']=[doc.metadata.get('chunk_id')]
+            positions[pid]=len(expanded)
+            expanded.append(Document(page_content=parents[pid],metadata=metadata))
+        return expanded
@@ -0,0 +1,66 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+from common import tracing
+
+
+class StageScheduler:
+    """
+    Runs blocking pipeline stages on a dedicated thread pool and records how
+    long each one took.
+
+    Threads rather than processes: the embedder, index and reranker hold
+    large models that cannot be shared across processes, and numpy, faiss and
+    torch release the GIL while they compute.
+
+    Each stage runs inside a trace span of the same name; the context is
+    copied into the worker thread so spans opened there nest under it.
+    
+    With an AdmissionController, a stage first takes a slot from its limiter
+    and raises OverloadedError instead of queueing when none is available.
+    """
+    def __init__(self,max_workers=8,admission=None):
+        self.executor=ThreadPoolExecutor(max_workers=max_workers,thread_name_prefix="stage")
+        self.admission=admission
+
+    async def run(self,timings,name,fn,*args):
+        loop=asyncio.get_running_loop()
+        start=time.perf_counter()
+        try:
+            async with self._slot(name):
+                with tracing.span(name):
+                    ctx=contextvars.copy_context()
+                    return await loop.run_in_executor(self.executor,partial(ctx.run,fn,*args))
+        finally:
+            timings[name]=time.perf_counter()-start
+
+    async def timed(self,timings,name,fn,*args):
+        """
+        Awaits `fn(*args)`, an async stage, on the event loop. The coroutine
+        is only created once the stage has a slot, so a rejected call leaves
+        none behind un-awaited.
+        """
+        start=time.perf_counter()
+        try:
+            async with self._slot(name):
+                with tracing.span(name):
+                    return await fn(*args)
+        finally:
+            timings[name]=time.perf_counter()-start
+    
+    def _slot(self,name):
+        if self.admission is None:
+            return _no_slot()
+        return self.admission.slot(name)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+@asynccontextmanager
+async def _no_slot():
+    yield
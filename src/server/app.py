@@ -1,19 +1,114 @@
+import asyncio
+import gc
+import os
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 
+from common import tracing
+from common.logger import get_logger
+from cache import close_cache, init_cache
+from health import router as health_router
+from jobs import JobQueue
+from observability import TracingMiddleware, router as observability_router
+from settings import load_settings
+from ui import router as ui_router
+from warmup import DEFAULT_WARMUP_QUERIES, WarmupState
+
+logger=get_logger(__name__)
+
+settings=load_settings()
+
+# set by gunicorn_conf.py when preload_app is on
+PRELOAD=os.environ.get("RAG_PRELOAD")=="1"
+_preloaded_pipeline=None
+
+def load_pipeline():
+    """
+    Builds the RAG pipeline. This is where torch, faiss and the models are
+    imported and loaded, so nothing heavy happens at module import.
+    """
+    from engine.pipeline import build_rag_pipeline
+    return build_rag_pipeline(settings)
+
+def preload():
+    """
+    Loads the pipeline once in the gunicorn master, before workers fork, so
+    they share model weights and the index copy-on-write. Its SQLite stores
+    open a fresh connection in each worker on first use.
+
+    gc.freeze() moves everything loaded so far into the permanent generation;
+    otherwise the first collection in each worker writes to those objects'
+    headers and copies the pages they live on.
+    """
+    global _preloaded_pipeline
+    _preloaded_pipeline=load_pipeline()
+    gc.collect()
+    gc.freeze()
+
+async def _start_services(app: FastAPI):
+    # runs after the server is accepting connections, so /health/ready can
+    # report progress while models load
+    warmup=app.state.warmup
+    try:
+        warmup.start("pipeline")
+        rag_pipeline=_preloaded_pipeline or await asyncio.to_thread(load_pipeline)
+        app.state.rag_pipeline=rag_pipeline
+        warmup.done("pipeline")
+
+        warmup.start("jobs")
+        jobs=JobQueue(
+            rag_pipeline,
+            db_path=settings.jobs_db_path,
+            upload_dir=settings.upload_dir,
+            concurrency=settings.ingest_workers,
+        )
+        await jobs.start()
+        app.state.jobs=jobs
+        warmup.done("jobs")
+
+        if settings.warmup_queries:
+            warmup.start("warmup_queries")
+            await rag_pipeline.warm_up(DEFAULT_WARMUP_QUERIES,progress=warmup.advance)
+            warmup.done("warmup_queries")
+        else:
+            warmup.skip("warmup_queries")
+        logger.info("Startup finished",extra=warmup.snapshot())
+    except Exception as e:
+        logger.exception("Startup failed")
+        warmup.fail(str(e))
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    
+
+    tracing.configure(tracing.Tracer(
+        exporter=tracing.FileExporter(settings.trace_file) if settings.trace_file else None,
+        slow_threshold=settings.trace_slow_seconds,
+        sample_rate=settings.trace_sample_rate,
+    ))
+
+    app.state.warmup=WarmupState(["cache","pipeline","jobs","warmup_queries"])
+    app.state.rag_pipeline=None
+    app.state.jobs=None
+
+    app.state.warmup.start("cache")
     cache_client=init_cache(settings)
-    app.state.cacheent=cache_client
-    
-    rag_pipeline=build_pipeline(settings,cache_client)
-    app.state.rag_pipeline=rag_pipeline
-    
+    app.state.cache=cache_client
+    app.state.warmup.done("cache")
+
+    startup=asyncio.create_task(_start_services(app))
+
     yield
-    
-    await cache_client.close()
-    
+
+    startup.cancel()
+    await asyncio.gather(startup,return_exceptions=True)
+    if app.state.jobs is not None:
+        await app.state.jobs.stop()
+    if app.state.rag_pipeline is not None:
+        app.state.rag_pipeline.scheduler.shutdown()
+        if app.state.rag_pipeline.tenants is not None:
+            app.state.rag_pipeline.tenants.close()
+    await close_cache(cache_client)
+
 def create_app() -> FastAPI:
     app=FastAPI(
         title="Production-Grade RAG API",
@@ -21,7 +116,7 @@ def create_app() -> FastAPI:
         description="An API for a production-grade Retrieval-Augmented Generation (RAG) system.",
         lifespan=lifespan
     )
-    
+
     app.include_router(
         health_router,
         prefix="/health",
@@ -32,8 +127,13 @@ def create_app() -> FastAPI:
         prefix="/api",
         tags=["UI"]
     )
-    
+    app.include_router(
+        observability_router,
+        tags=["Observability"]
+    )
+    app.add_middleware(TracingMiddleware)
+
     return app
 app=create_app()
-    
-    
\ No newline at end of file
+if PRELOAD:
+    preload()
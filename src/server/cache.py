@@ -1,19 +1,34 @@
+import hashlib
+import json
+from typing import Optional
+
+import redis
+from redis.exceptions import RedisError
+
+from common.metrics import CACHE_LATENCY, CACHE_REQUESTS
+
+
 class Cache_client:
     def __init__(self,client:redis.Redis):
         self.client=client
     def get(self,key):
         try:
-            value=self.client.get(key)
+            with CACHE_LATENCY.time(op="get"):
+                value=self.client.get(key)
             if value is None:
+                CACHE_REQUESTS.inc(result="miss")
                 return None
+            CACHE_REQUESTS.inc(result="hit")
             return json.loads(value)
         except (RedisError, json.JSONDecodeError) as e:
+            CACHE_REQUESTS.inc(result="error")
             return None
     def set(self,key,value,ttl):
         try:
             payload=json.dumps(value)
-            self.client.set(key,payload,ex=ttl)
-        except (RedisError,TextError) as e:
+            with CACHE_LATENCY.time(op="set"):
+                self.client.set(key,payload,ex=ttl)
+        except (RedisError,TypeError) as e:
             return None
         
     def delete(self,key):
@@ -30,7 +45,7 @@ class Cache_client:
 def init_cache(settings):
     try:
         redis_client=redis.Redis(
-            host=settings.reddis_host,
+            host=settings.redis_host,
             port=settings.redis_port,
             password=settings.redis_password,
             decode_responses=True,
@@ -44,7 +59,7 @@ def init_cache(settings):
     
 async def close_cache(cache:Cache_client):
     try:
-         cache._client.close()
+         cache.client.close()
     except Exception as e:
         pass
 def _hash_key(prefix: str, raw: str) -> str:
@@ -56,7 +71,7 @@ def _hash_key(prefix: str, raw: str) -> str:
 
 
 def get_cached_embedding(
-    cache: CacheClient,
+    cache: Cache_client,
     text: str,
 ) -> Optional[list]:
     """
@@ -67,7 +82,7 @@ def get_cached_embedding(
 
 
 def set_cached_embedding(
-    cache: CacheClient,
+    cache: Cache_client,
     text: str,
     embedding: list,
     ttl: int,
@@ -79,25 +94,40 @@ def set_cached_embedding(
     cache.set(key, embedding, ttl)
 
 
+def _response_prefix(tenant_id: Optional[str], generation: Optional[int]) -> str:
+    # answers come from a tenant's own documents, so tenants never share them;
+    # the corpus generation retires every answer once the corpus changes
+    parts = ["response"]
+    if tenant_id:
+        parts.append(tenant_id)
+    if generation is not None:
+        parts.append(f"g{generation}")
+    return ":".join(parts)
+
+
 def get_cached_response(
-    cache: CacheClient,
+    cache: Cache_client,
     prompt: str,
+    tenant_id: Optional[str] = None,
+    generation: Optional[int] = None,
 ) -> Optional[str]:
     """
     Retrieve cached LLM response.
     """
-    key = _hash_key("response", prompt)
+    key = _hash_key(_response_prefix(tenant_id, generation), prompt)
     return cache.get(key)
 
 
 def set_cached_response(
-    cache: CacheClient,
+    cache: Cache_client,
     prompt: str,
     response: str,
     ttl: int,
+    tenant_id: Optional[str] = None,
+    generation: Optional[int] = None,
 ):
     """
     Cache LLM response.
     """
-    key = _hash_key("response", prompt)
+    key = _hash_key(_response_prefix(tenant_id, generation), prompt)
     cache.set(key, response, ttl)
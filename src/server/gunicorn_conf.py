@@ -0,0 +1,50 @@
+# gunicorn_conf.py
+"""
+Gunicorn settings for the pre-fork deployment.
+
+    cd src/server && gunicorn -c gunicorn_conf.py app:app
+
+With preload on, the master imports `app`, which loads models and the index
+once (`app.preload`) before forking; workers then share those pages
+copy-on-write and only open their own cache connection, job queue and
+thread pools. The SQLite stores the pipeline holds reopen their connection
+on first use in each worker (data_pipeline.connections); SQLite
+connections must not cross fork(). Readiness (/health/ready) turns green per worker once its
+warm-up queries are done.
+
+Workers share the index files but each holds its own copy in memory, so
+only one of them writes: the JobQueue leader (a file lock next to the jobs
+DB) runs every ingestion job, whichever worker took the upload. After
+saving it bumps the corpus generation, and the other workers reload the
+index on their next query.
+
+Environment:
+- BIND              address to listen on (default 0.0.0.0:8000)
+- WEB_CONCURRENCY   number of workers (default: CPU count)
+- RAG_PRELOAD       "1" to load in the master (default), "0" to load per worker
+"""
+
+import multiprocessing
+import os
+import sys
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+os.environ.setdefault("RAG_PRELOAD", "1")
+preload_app = os.environ["RAG_PRELOAD"] == "1"
+
+# loading models can take a while; don't let the arbiter kill a slow boot
+timeout = int(os.environ.get("WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
+
+
+def post_fork(server, worker):
+    # torch's intra-op pool would otherwise start one thread per core in
+    # every worker
+    threads = os.environ.get("TORCH_THREADS_PER_WORKER")
+    if threads and "torch" in sys.modules:
+        import torch
+
+        torch.set_num_threads(int(threads))
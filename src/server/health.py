@@ -12,9 +12,10 @@ NO business logic lives here.
 
 from fastapi import APIRouter, Request, status
 from fastapi.responses import JSONResponse
-from typing import Dict
+from typing import Dict, Optional
 
-from core.logging import get_logger
+from common.logger import get_logger
+from common.metrics import STAGE_LATENCY
 
 logger = get_logger(__name__)
 
@@ -36,7 +37,32 @@ def _check_rag_pipeline(request: Request) -> bool:
     Lightweight sanity check that the RAG pipeline is initialized.
     NO heavy calls allowed here.
     """
-    return hasattr(request.app.state, "rag_pipeline")
+    return getattr(request.app.state, "rag_pipeline", None) is not None
+
+
+def _admission(request: Request):
+    rag_pipeline = getattr(request.app.state, "rag_pipeline", None)
+    scheduler = getattr(rag_pipeline, "scheduler", None)
+    return getattr(scheduler, "admission", None)
+
+
+def _tenants(request: Request):
+    rag_pipeline = getattr(request.app.state, "rag_pipeline", None)
+    return getattr(rag_pipeline, "tenants", None)
+
+
+def _check_not_saturated(request: Request) -> bool:
+    """
+    False while any stage's wait queue is near full, so the load balancer
+    stops sending new traffic until it drains.
+    """
+    admission = _admission(request)
+    return admission is None or not admission.saturated
+
+
+def _warmup_status(request: Request) -> Optional[Dict]:
+    warmup = getattr(request.app.state, "warmup", None)
+    return warmup.snapshot() if warmup else None
 
 
 # -------------------------------------------------
@@ -80,26 +106,33 @@ async def readiness(request: Request):
     Fails if critical dependencies are unavailable.
     """
 
+    warmup = _warmup_status(request)
     checks = {
         "cache": _check_cache(request),
         "rag_pipeline": _check_rag_pipeline(request),
+        "warmup": warmup is None or warmup["status"] == "ready",
+        "admission": _check_not_saturated(request),
     }
 
     all_ready = all(checks.values())
 
     if not all_ready:
-        logger.warning("Readiness check failed", extra={"checks": checks})
+        # expected while models load; only worth a warning once warm-up is over
+        if warmup is None or warmup["status"] != "warming":
+            logger.warning("Readiness check failed", extra={"checks": checks})
         return JSONResponse(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             content={
                 "status": "not_ready",
                 "checks": checks,
+                "warmup": warmup,
             },
         )
 
     return {
         "status": "ready",
         "checks": checks,
+        "warmup": warmup,
     }
 
 
@@ -139,4 +172,7 @@ async def dependencies(request: Request):
     return {
         "status": "ok" if all(results.values()) else "degraded",
         "dependencies": results,
+        "stage_latency": STAGE_LATENCY.summary(),
+        "admission": _admission(request).stats() if _admission(request) else None,
+        "tenants": _tenants(request).stats() if _tenants(request) else None,
     }
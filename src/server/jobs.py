@@ -0,0 +1,374 @@
+# jobs.py
+"""
+Background ingestion jobs.
+
+Responsibilities:
+- Persist ingestion jobs in a local SQLite file
+- Run them on a bounded worker pool in priority order
+- Track progress (pages, chunks, vectors indexed) for status polling
+- Claim each job atomically, under a lease, so no job runs twice at once
+- Run every job in one leader process, so only one process writes the index
+
+Ingestion runs on its own thread pool so uploads never compete with
+chat requests for the event loop or the default executor.
+"""
+
+import asyncio
+import fcntl
+import itertools
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from common.logger import get_logger
+from common.metrics import QUEUE_DEPTH
+
+logger = get_logger(__name__)
+
+
+class JobStore:
+    """
+    SQLite-backed job records. Safe to use from several threads.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    pages INTEGER NOT NULL DEFAULT 0,
+                    chunks INTEGER NOT NULL DEFAULT 0,
+                    vectors INTEGER NOT NULL DEFAULT 0,
+                    skipped INTEGER NOT NULL DEFAULT 0,
+                    removed INTEGER NOT NULL DEFAULT 0,
+                    near_duplicates INTEGER NOT NULL DEFAULT 0,
+                    tenant_id TEXT,
+                    replaces TEXT,
+                    doc_id TEXT,
+                    owner TEXT,
+                    lease_until REAL,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            # job files written before incremental ingestion lack these counters
+            columns = {
+                row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")
+            }
+            for column in ("skipped", "removed", "near_duplicates"):
+                if column not in columns:
+                    self._conn.execute(
+                        f"ALTER TABLE jobs ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"
+                    )
+            for column, kind in (
+                ("tenant_id", "TEXT"),
+                ("replaces", "TEXT"),
+                ("doc_id", "TEXT"),
+                ("owner", "TEXT"),
+                ("lease_until", "REAL"),
+            ):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def create(
+        self,
+        filename: str,
+        path: str,
+        priority: int,
+        tenant_id: Optional[str] = None,
+        replaces: Optional[str] = None,
+    ) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, filename, path, priority, tenant_id, replaces, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, filename, path, priority, tenant_id, replaces, now, now),
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def claim(self, job_id: str, owner: str, lease: float) -> bool:
+        """
+        Marks a queued job, or a running one whose lease has expired, as
+        running under `owner` until `lease` seconds from now. False if
+        another worker got it first or it is already finished.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, updated_at = ? "
+                "WHERE id = ? AND (status = 'queued' OR (status = 'running' AND lease_until < ?))",
+                (owner, now + lease, now, job_id, now),
+            )
+        return cursor.rowcount == 1
+
+    def renew(self, job_id: str, owner: str, lease: float) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? "
+                "WHERE id = ? AND owner = ? AND status = 'running'",
+                (time.time() + lease, job_id, owner),
+            )
+        return cursor.rowcount == 1
+
+    def update_claimed(self, job_id: str, owner: str, **fields) -> bool:
+        """`update` that only applies while `owner` still holds the job."""
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {columns} "
+                "WHERE id = ? AND owner = ? AND status = 'running'",
+                (*fields.values(), job_id, owner),
+            )
+        return cursor.rowcount == 1
+
+    def queued(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+            ).fetchone()[0]
+
+    def claimable(self):
+        """Queued jobs, and running jobs whose owner stopped renewing the lease."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?)) "
+                "ORDER BY created_at",
+                (time.time(),),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """
+    Priority queue of ingestion jobs drained by `concurrency` workers.
+
+    Lower `priority` values run first; ties run in submission order.
+
+    A worker claims a job in the store before running it and renews the
+    claim every `lease / 3` seconds while it runs. Jobs left queued by a
+    previous process, or running under a lease that has expired (its owner
+    died), are picked up again; jobs another process is still running are
+    left alone.
+
+    Of the processes sharing `db_path` (gunicorn workers on one host), only
+    the one holding an exclusive lock on `db_path + ".lock"` runs jobs, so
+    the index, its docs store and the tenant indexes have a single writer;
+    the others reload what it saves. Every process accepts uploads into the
+    store, and the leader picks them up every `poll_interval` seconds. When
+    the leader exits its lock is released and another process takes over.
+    """
+
+    def __init__(
+        self,
+        rag_pipeline,
+        db_path: str,
+        upload_dir: str,
+        concurrency: int = 2,
+        max_queued: int = 100,
+        progress_interval: float = 1.0,
+        lease: float = 60.0,
+        poll_interval: float = 1.0,
+    ):
+        self.rag_pipeline = rag_pipeline
+        self.store = JobStore(db_path)
+        self.upload_dir = upload_dir
+        os.makedirs(upload_dir, exist_ok=True)
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.progress_interval = progress_interval
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._lock_path = db_path + ".lock"
+        self._lock_file = None
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        self._workers = []
+        self._poller = None
+        # jobs in the local queue or running here, so a poll doesn't add them twice
+        self._enqueued = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="ingest"
+        )
+
+    async def start(self):
+        self._queue = asyncio.PriorityQueue()
+        self._poll()
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+        self._poller = asyncio.create_task(self._poll_forever())
+        QUEUE_DEPTH.set_function(lambda: self.depth, queue="ingest")
+
+    async def stop(self):
+        tasks = [*self._workers, *([self._poller] if self._poller else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.store.close()
+        if self._lock_file is not None:
+            # closing the file releases the lock for the next leader
+            self._lock_file.close()
+            self._lock_file = None
+
+    @property
+    def leader(self) -> bool:
+        return self._lock_file is not None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def _try_lead(self) -> bool:
+        lock_file = open(self._lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        logger.info("Leading ingestion", extra={"owner": self.owner})
+        return True
+
+    def _poll(self):
+        if not self.leader and not self._try_lead():
+            return
+        for job in self.store.claimable():
+            if job["id"] not in self._enqueued:
+                self._enqueue(job["id"], job["priority"])
+
+    async def _poll_forever(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                self._poll()
+            except Exception as e:
+                logger.error("Polling ingestion jobs failed", extra={"error": str(e)})
+
+    def submit(
+        self,
+        path: str,
+        filename: str,
+        priority: int = 0,
+        tenant_id: Optional[str] = None,
+        replaces: Optional[str] = None,
+    ) -> str:
+        # counted in the store: the leader's local queue holds every process's jobs
+        if self.store.queued() >= self.max_queued:
+            raise QueueFullError("Ingestion queue is full")
+        job_id = self.store.create(filename, path, priority, tenant_id, replaces)
+        if self.leader:
+            self._enqueue(job_id, priority)
+        logger.info(
+            "Queued ingestion job",
+            extra={"job_id": job_id, "upload": filename, "tenant_id": tenant_id},
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = self.store.get(job_id)
+        if job:
+            job.pop("path", None)
+        return job
+
+    def _enqueue(self, job_id: str, priority: int):
+        self._enqueued.add(job_id)
+        self._queue.put_nowait((priority, next(self._seq), job_id))
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job_id = await self._queue.get()
+            try:
+                running = loop.run_in_executor(self._executor, self._run_job, job_id)
+                while True:
+                    try:
+                        await asyncio.wait_for(asyncio.shield(running), self.lease / 3)
+                        break
+                    except asyncio.TimeoutError:
+                        self.store.renew(job_id, self.owner, self.lease)
+            finally:
+                self._enqueued.discard(job_id)
+                self._queue.task_done()
+
+    def _run_job(self, job_id: str):
+        if not self.store.claim(job_id, self.owner, self.lease):
+            # finished, or running in another worker
+            return
+        job = self.store.get(job_id)
+        last_write = 0.0
+
+        def progress(stats):
+            nonlocal last_write
+            now = time.monotonic()
+            if now - last_write >= self.progress_interval:
+                last_write = now
+                self.store.update_claimed(job_id, self.owner, **stats)
+
+        try:
+            with open(job["path"], "rb") as f:
+                stats = self.rag_pipeline.ingest_stream(
+                    f,
+                    job["filename"],
+                    progress=progress,
+                    tenant_id=job["tenant_id"],
+                    replaces=job["replaces"],
+                )
+            self.store.update_claimed(job_id, self.owner, status="succeeded", **stats)
+            logger.info("Ingestion job finished", extra={"job_id": job_id, **stats})
+        except Exception as e:
+            self.store.update_claimed(job_id, self.owner, status="failed", error=str(e))
+            logger.error(
+                "Ingestion job failed",
+                extra={"job_id": job_id, "error": str(e)},
+            )
+        finally:
+            try:
+                os.remove(job["path"])
+            except OSError:
+                pass
+
+
+class QueueFullError(RuntimeError):
+    pass
@@ -0,0 +1,70 @@
+# observability.py
+"""
+Operational endpoints for scrapers and dashboards.
+
+Responsibilities:
+- Expose process metrics in Prometheus text format
+- Open a root trace span per traced HTTP request
+
+NO business logic lives here.
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from common import tracing
+from common.metrics import render
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# -------------------------------------------------
+# Metrics
+# -------------------------------------------------
+@router.get(
+    "/metrics",
+    summary="Prometheus metrics",
+    response_class=PlainTextResponse,
+    include_in_schema=False,
+)
+async def metrics() -> PlainTextResponse:
+    """
+    Stage latency histograms, cache hit/miss counters, ingestion counters,
+    index size and queue depth.
+    """
+    return PlainTextResponse(render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# -------------------------------------------------
+# Tracing
+# -------------------------------------------------
+class TracingMiddleware:
+    """
+    ASGI middleware opening a root span for requests under `paths`.
+
+    Plain ASGI rather than BaseHTTPMiddleware, so the endpoint runs in the
+    same context and its spans attach to this trace.
+    """
+
+    def __init__(self, app, paths=("/api/chat",)):
+        self.app = app
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        with tracing.get_tracer().trace(
+            f"{scope['method']} {scope['path']}",
+            **{"http.method": scope["method"], "http.target": scope["path"]},
+        ) as root:
+
+            async def send_with_status(message):
+                if root is not None and message["type"] == "http.response.start":
+                    root.set_attribute("http.status_code", message["status"])
+                await send(message)
+
+            await self.app(scope, receive, send_with_status)
@@ -0,0 +1,129 @@
+# settings.py
+"""
+Service settings.
+
+Responsibilities:
+- Hold every knob the app and `build_rag_pipeline` read, with defaults
+- Override any of them from the environment
+
+Each field is read from an environment variable named after it with a
+`RAG_` prefix, e.g. `RAG_INDEX_DIR=/data/index` or `RAG_LLM_CONCURRENCY=32`.
+An empty value unsets an optional field.
+"""
+
+import dataclasses
+import os
+from typing import Optional, Union, get_args, get_origin, get_type_hints
+
+ENV_PREFIX = "RAG_"
+
+
+@dataclasses.dataclass(frozen=True)
+class Settings:
+    # -------------------------
+    # Storage
+    # -------------------------
+    index_dir: str = "data/index"
+    upload_dir: str = "data/uploads"
+    jobs_db_path: str = "data/jobs.db"
+    # one index per tenant under this directory; unset means a single index
+    tenant_index_dir: Optional[str] = None
+    tenant_memory_budget_mb: int = 1024
+
+    # -------------------------
+    # Models
+    # -------------------------
+    embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embedding_dims: int = 384
+    # reuse vectors of already-seen chunk text across re-ingests
+    embedding_cache: bool = True
+    reranker_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    rerank_top_n: int = 5
+    llm_model: str = "gpt-4o-mini"
+    llm_timeout: float = 30.0
+    device: str = "cpu"
+
+    # -------------------------
+    # Index
+    # -------------------------
+    index_type: str = "IVF"
+    index_metric: str = "cosine"
+    index_n_list: int = 100
+    index_pq_m: int = 16
+    # IVF_PQ serves from a flat index until this many vectors are in
+    index_train_size: int = 10000
+    # the index is rebuilt without the vectors of removed chunks once there
+    # are this many; until then searches fetch that many extra candidates
+    index_compact_tombstones: int = 1000
+    binary_rescore_factor: int = 10
+
+    # -------------------------
+    # Ingestion
+    # -------------------------
+    chunk_mode: str = "recursive"
+    chunk_size: int = 1000
+    chunk_overlap: int = 100
+    parent_chunk_size: int = 0
+    # 0 turns near-duplicate detection off
+    near_duplicate_threshold: float = 0.0
+    extract_workers: int = 1
+    # jobs into the same index still run one at a time, so that each one
+    # dedups against the others' chunks; different tenants' run side by side
+    ingest_workers: int = 2
+
+    # -------------------------
+    # Retrieval
+    # -------------------------
+    top_k: int = 20
+    score_threshold: Optional[float] = None
+    mmr_lambda: float = 0.5
+    duplicate_threshold: float = 0.95
+    mmr_k: Optional[int] = None
+
+    # -------------------------
+    # Admission control
+    # -------------------------
+    embed_concurrency: int = 16
+    rerank_concurrency: int = 8
+    llm_concurrency: int = 16
+    admission_max_waiting: int = 64
+    warmup_queries: bool = True
+
+    # -------------------------
+    # Cache
+    # -------------------------
+    redis_host: str = "localhost"
+    redis_port: int = 6379
+    redis_password: Optional[str] = None
+
+    # -------------------------
+    # Tracing
+    # -------------------------
+    trace_file: Optional[str] = None
+    trace_slow_seconds: float = 1.0
+    trace_sample_rate: float = 0.01
+
+
+def _parse(kind, raw: str):
+    if get_origin(kind) is Union:
+        if not raw:
+            return None
+        kind = next(arg for arg in get_args(kind) if arg is not type(None))
+    if kind is bool:
+        return raw.strip().lower() in ("1", "true", "yes", "on")
+    return kind(raw)
+
+
+def load_settings(environ=None) -> Settings:
+    """Defaults, overridden by any `RAG_<FIELD>` variables in `environ`."""
+    environ = os.environ if environ is None else environ
+    overrides = {}
+    for name, kind in get_type_hints(Settings).items():
+        raw = environ.get(ENV_PREFIX + name.upper())
+        if raw is None:
+            continue
+        try:
+            overrides[name] = _parse(kind, raw)
+        except ValueError as e:
+            raise ValueError(f"Invalid {ENV_PREFIX}{name.upper()}={raw!r}") from e
+    return Settings(**overrides)
@@ -6,26 +6,81 @@ Responsibilities:
 - Accept and validate client requests
 - Translate HTTP -> internal service calls
 - Apply caching at request boundaries
+- Hand uploads off to the background ingestion queue
 - Return UI-safe responses
 
 NO AI logic lives here.
 """
 
-from fastapi import APIRouter, Request, HTTPException, UploadFile, File, status
+import asyncio
+import math
+import os
+import tempfile
+
+from fastapi import APIRouter, Request, HTTPException, UploadFile, File, Form, status
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from typing import Optional
 
-from core.logging import get_logger
+from common import tracing
+from common.admission import OverloadedError, request_deadline
+from common.logger import get_logger
 from cache import (
     get_cached_response,
     set_cached_response,
 )
+from jobs import QueueFullError
 
 logger = get_logger(__name__)
 
 router = APIRouter()
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# tenant ids name directories on disk; keep in sync with data_pipeline.tenants
+TENANT_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+# content-hash document ids, as reported in a finished job's `doc_id`
+DOC_ID_PATTERN = r"^[A-Za-z0-9_-]{1,128}$"
+CHAT_DEADLINE_SECONDS = 30.0
+# keys carry the generation of the index this worker answers from, so a new
+# corpus retires old entries; the short TTL bounds the damage if a worker
+# ever answers from an index older than its key
+RESPONSE_CACHE_TTL = 15 * 60
+
+
+def _require(service):
+    # services are attached by a background startup task; until then, 503
+    if service is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service is warming up, retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    return service
+
+
+def _lookup_response(cache, rag_pipeline, query: str, tenant_id: Optional[str]):
+    generation = rag_pipeline.corpus_generation(tenant_id)
+    return get_cached_response(cache, query, tenant_id, generation), generation
+
+
+def _overloaded(error: OverloadedError) -> HTTPException:
+    # shed fast: the client retries later instead of waiting out a timeout
+    logger.warning(
+        "Request shed by admission control",
+        extra={"stage": error.stage, "reason": error.reason},
+    )
+    # full wait queue -> 429; a wait that would overrun the deadline -> 503
+    code = (
+        status.HTTP_429_TOO_MANY_REQUESTS
+        if error.reason == "queue_full"
+        else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    return HTTPException(
+        status_code=code,
+        detail=f"Server is overloaded ({error.stage}), retry later",
+        headers={"Retry-After": str(math.ceil(error.retry_after))},
+    )
+
 
 # -------------------------------------------------
 # Request / Response Schemas
@@ -35,6 +90,11 @@ class ChatRequest(BaseModel):
     session_id: Optional[str] = Field(
         None, description="Optional session identifier"
     )
+    tenant_id: Optional[str] = Field(
+        None,
+        pattern=TENANT_ID_PATTERN,
+        description="Tenant whose documents answer the query",
+    )
 
 
 class ChatResponse(BaseModel):
@@ -56,7 +116,8 @@ async def chat(request: Request, payload: ChatRequest):
 
     Flow:
     - Validate input
-    - Check response cache
+    - Check response cache while the query is being embedded
+      (a hit cancels the embedding)
     - Call RAG pipeline
     - Cache and return response
     """
@@ -69,40 +130,88 @@ async def chat(request: Request, payload: ChatRequest):
         )
 
     cache = request.app.state.cache
-    rag_pipeline = request.app.state.rag_pipeline
+    rag_pipeline = _require(request.app.state.rag_pipeline)
 
     # -------------------------
-    # Cache lookup
-    # -------------------------
-    cached_answer = get_cached_response(cache, query)
-    if cached_answer:
-        logger.info("Cache hit for query")
-        return ChatResponse(answer=cached_answer)
-
+    # Cache lookup + query embedding
     # -------------------------
-    # RAG pipeline invocation
-    # -------------------------
-    try:
-        answer = await rag_pipeline.run(query)
-    except Exception as e:
-        logger.error(
-            "RAG pipeline execution failed",
-            extra={"error": str(e)},
+    # The query is embedded while the cache is checked; a hit cancels the
+    # embedding, a miss awaits it. Every stage below shares the request
+    # deadline, so admission control can shed work that would not finish in
+    # time.
+    timings = {}
+    with request_deadline(CHAT_DEADLINE_SECONDS):
+        embedding = asyncio.create_task(rag_pipeline.embed_query(query, timings))
+        try:
+            lookup = await asyncio.to_thread(
+                _lookup_response, cache, rag_pipeline, query, payload.tenant_id
+            )
+        except asyncio.CancelledError:
+            embedding.cancel()
+            raise
+        except Exception as e:
+            lookup = e
+        # without a generation to key on, the answer is not cached either
+        cached_answer, generation = (
+            (None, None) if isinstance(lookup, Exception) else lookup
         )
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to generate response",
+        if cached_answer:
+            embedding.cancel()
+            logger.info("Cache hit for query")
+            tracing.set_attribute("cache.response", "hit")
+            return ChatResponse(answer=cached_answer)
+        tracing.set_attribute(
+            "cache.response",
+            "error" if isinstance(lookup, Exception) else "miss",
         )
+        try:
+            query_vector = await embedding
+        except OverloadedError as e:
+            raise _overloaded(e)
+        except Exception as e:
+            # let the pipeline embed again rather than failing outright
+            logger.warning(
+                "Query embedding failed, retrying inside pipeline",
+                extra={"error": str(e)},
+            )
+            query_vector = None
+
+        # -------------------------
+        # RAG pipeline invocation
+        # -------------------------
+        try:
+            answer = await rag_pipeline.run(
+                query,
+                query_vector=query_vector,
+                timings=timings,
+                tenant_id=payload.tenant_id,
+            )
+        except OverloadedError as e:
+            raise _overloaded(e)
+        except Exception as e:
+            logger.error(
+                "RAG pipeline execution failed",
+                extra={"error": str(e)},
+            )
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to generate response",
+            )
 
     # -------------------------
     # Cache response
     # -------------------------
-    set_cached_response(
-        cache=cache,
-        prompt=query,
-        response=answer,
-        ttl=300,  # 5 minutes
-    )
+    # keyed on the generation read before answering: if an ingest landed
+    # meanwhile, the entry is simply never looked up
+    if not isinstance(lookup, Exception):
+        set_cached_response(
+            cache=cache,
+            prompt=query,
+            response=answer,
+            ttl=RESPONSE_CACHE_TTL,
+            tenant_id=payload.tenant_id,
+            generation=generation,
+        )
 
     return ChatResponse(answer=answer)
 
@@ -117,13 +226,22 @@ async def chat(request: Request, payload: ChatRequest):
 async def upload_document(
     request: Request,
     file: UploadFile = File(...),
+    priority: int = Form(0),
+    tenant_id: Optional[str] = Form(None, pattern=TENANT_ID_PATTERN),
+    replaces: Optional[str] = Form(None, pattern=DOC_ID_PATTERN),
 ):
     """
     Upload document for ingestion.
 
     This endpoint:
     - validates file
-    - delegates ingestion to pipeline
+    - spools it to local disk
+    - enqueues an ingestion job and returns its id immediately
+
+    Uploads add documents. To update one, pass the `doc_id` of the version
+    it supersedes as `replaces`; chunks only that version had are removed.
+
+    Poll `/jobs/{job_id}` for progress and the new document's `doc_id`.
     """
 
     if not file.filename:
@@ -132,29 +250,72 @@ async def upload_document(
             detail="Invalid file",
         )
 
-    rag_pipeline = request.app.state.rag_pipeline
+    jobs = _require(request.app.state.jobs)
 
+    suffix = os.path.splitext(file.filename)[1]
+    fd, path = tempfile.mkstemp(dir=jobs.upload_dir, suffix=suffix)
     try:
-        await rag_pipeline.ingest(file)
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                out.write(chunk)
+        job_id = jobs.submit(
+            path,
+            file.filename,
+            priority=priority,
+            tenant_id=tenant_id,
+            replaces=replaces,
+        )
+    except QueueFullError:
+        os.remove(path)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Ingestion queue is full, retry later",
+        )
     except Exception as e:
+        os.remove(path)
         logger.error(
-            "Document ingestion failed",
-            extra={"filename": file.filename, "error": str(e)},
+            "Failed to queue document for ingestion",
+            extra={"upload": file.filename, "error": str(e)},
         )
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to ingest document",
+            detail="Failed to queue document",
         )
 
     return JSONResponse(
-        status_code=status.HTTP_201_CREATED,
+        status_code=status.HTTP_202_ACCEPTED,
         content={
-            "status": "success",
+            "status": "queued",
+            "job_id": job_id,
             "filename": file.filename,
+            "tenant_id": tenant_id,
+            "replaces": replaces,
         },
     )
 
 
+# -------------------------------------------------
+# Ingestion Job Status
+# -------------------------------------------------
+@router.get(
+    "/jobs/{job_id}",
+    summary="Ingestion job status",
+)
+async def job_status(request: Request, job_id: str):
+    """
+    Status and progress (pages, chunks, vectors indexed) of an ingestion job.
+    """
+
+    job = _require(request.app.state.jobs).get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found",
+        )
+
+    return job
+
+
 
 @router.get(
     "/status",
@@ -0,0 +1,89 @@
+# warmup.py
+"""
+Startup warm-up tracking.
+
+Responsibilities:
+- Record which startup steps (model/index load, cache, job queue,
+  warm-up queries) have finished
+- Expose a progress snapshot for the readiness probe
+
+The steps themselves run in `app.lifespan`; this module only keeps score.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_WARMUP_QUERIES = [
+    "What is this document about?",
+    "Summarize the main findings.",
+    "Which risks are mentioned?",
+]
+
+
+class WarmupState:
+    """
+    Thread-safe progress of the startup steps, in order.
+
+    A step may report partial progress (`advance`), e.g. warm-up queries
+    done out of total, which is folded into the overall fraction.
+    """
+
+    def __init__(self, steps: Iterable[str]):
+        self.steps: List[str] = list(steps)
+        self._lock = threading.Lock()
+        self._completed: List[str] = []
+        self._current: Optional[str] = None
+        self._partial = 0.0
+        self._error: Optional[str] = None
+        self._started = time.monotonic()
+        self._finished: Optional[float] = None
+
+    def start(self, step: str):
+        with self._lock:
+            self._current = step
+            self._partial = 0.0
+
+    def advance(self, done: int, total: int):
+        with self._lock:
+            self._partial = done / total if total else 1.0
+
+    def done(self, step: str):
+        with self._lock:
+            if step not in self._completed:
+                self._completed.append(step)
+            self._current = None
+            self._partial = 0.0
+            if len(self._completed) == len(self.steps):
+                self._finished = time.monotonic()
+
+    def skip(self, step: str):
+        self.done(step)
+
+    def fail(self, error: str):
+        with self._lock:
+            self._error = error
+            self._finished = time.monotonic()
+
+    @property
+    def ready(self) -> bool:
+        return self._error is None and len(self._completed) == len(self.steps)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            if self._error is not None:
+                status = "failed"
+            elif len(self._completed) == len(self.steps):
+                status = "ready"
+            else:
+                status = "warming"
+            finished = self._finished or time.monotonic()
+            progress = (len(self._completed) + self._partial) / len(self.steps)
+            return {
+                "status": status,
+                "progress": round(progress, 3),
+                "current_step": self._current,
+                "completed_steps": list(self._completed),
+                "elapsed_s": round(finished - self._started, 3),
+                "error": self._error,
+            }
@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+SRC = os.path.join(ROOT, "src")
+sys.path.insert(0, SRC)
+sys.path.insert(0, os.path.join(SRC, "server"))
+# offline stand-ins for the models and Redis
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
@@ -0,0 +1,95 @@
+"""
+Admission control: calls beyond the wait queue or the request deadline are
+rejected at once, and a rejected async stage never starts.
+"""
+
+import asyncio
+import gc
+import warnings
+
+import pytest
+
+from common.admission import AdmissionController, OverloadedError, request_deadline
+from engine.scheduler import StageScheduler
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        admission = AdmissionController({"generate": 1}, max_waiting=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with admission.slot("generate"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        limiter = admission.limiters["generate"]
+        assert (limiter.in_flight, limiter.waiting) == (1, 1)
+        with pytest.raises(OverloadedError) as rejected:
+            async with admission.slot("generate"):
+                pass
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return rejected.value
+
+    error = asyncio.run(scenario())
+    assert error.reason == "queue_full"
+    assert error.retry_after >= 1.0
+
+
+def test_wait_past_the_deadline_is_rejected_up_front():
+    async def scenario():
+        admission = AdmissionController({"generate": 1}, max_waiting=8)
+        limiter = admission.limiters["generate"]
+        # one call in flight, and calls are known to take 2s
+        limiter.service_time = 2.0
+        await limiter._semaphore.acquire()
+        limiter.in_flight = 1
+        with request_deadline(1.0):
+            with pytest.raises(OverloadedError) as rejected:
+                async with admission.slot("generate"):
+                    pass
+        return rejected.value
+
+    error = asyncio.run(scenario())
+    assert error.reason == "deadline"
+    assert error.retry_after >= 2.0
+
+
+def test_rejected_async_stage_is_never_created():
+    created = []
+
+    async def generate(query):
+        created.append(query)
+        return query
+
+    async def scenario():
+        admission = AdmissionController({"generate": 1}, max_waiting=0)
+        scheduler = StageScheduler(admission=admission)
+        release = asyncio.Event()
+
+        async def hold():
+            async with admission.slot("generate"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        timings = {}
+        with pytest.raises(OverloadedError):
+            await scheduler.timed(timings, "generate", generate, "rejected")
+        release.set()
+        await holder
+        answer = await scheduler.timed(timings, "generate", generate, "admitted")
+        scheduler.shutdown()
+        return answer, timings
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        answer, timings = asyncio.run(scenario())
+        gc.collect()
+    assert answer == "admitted"
+    assert created == ["admitted"]
+    assert "generate" in timings
+    assert not [w for w in caught if issubclass(w.category, RuntimeWarning)]
@@ -0,0 +1,205 @@
+"""
+Smoke test for the served app.
+
+Imports `app` as gunicorn does and lets its lifespan build the pipeline
+with `build_rag_pipeline`; only the models and Redis are swapped for the
+offline stand-ins in benchmarks/fakes.py.
+"""
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fakes import FakeLLM, FakeRedis, HashingEmbedder, OverlapReranker, load_tokenizer
+
+DIMS = 64
+DOCUMENT = (
+    "Refund policy.\n\n"
+    "Customers may return any product within thirty days of purchase for a "
+    "full refund. Refunds are issued to the original payment method.\n\n"
+    "Shipping costs are not refunded unless the product arrived damaged."
+)
+
+
+def wait_for(client, check, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = check()
+        if result:
+            return result
+        time.sleep(0.05)
+    raise AssertionError("timed out")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    import app as app_module
+    from cache import Cache_client
+    from engine import pipeline
+    from settings import load_settings
+
+    settings = load_settings(
+        {
+            "RAG_INDEX_DIR": str(tmp_path / "index"),
+            "RAG_UPLOAD_DIR": str(tmp_path / "uploads"),
+            "RAG_JOBS_DB_PATH": str(tmp_path / "jobs.db"),
+            "RAG_EMBEDDING_DIMS": str(DIMS),
+            "RAG_CHUNK_SIZE": "200",
+            "RAG_CHUNK_OVERLAP": "20",
+            "RAG_WARMUP_QUERIES": "1",
+        }
+    )
+    monkeypatch.setattr(app_module, "settings", settings)
+    monkeypatch.setattr(app_module, "init_cache", lambda _: Cache_client(FakeRedis()))
+    monkeypatch.setattr(pipeline, "load_embedding_model", lambda _: HashingEmbedder(DIMS))
+    monkeypatch.setattr(pipeline, "load_reranker", lambda s: OverlapReranker(s.rerank_top_n))
+    monkeypatch.setattr(pipeline, "load_llm", lambda _: FakeLLM(latency=0.0, jitter=0.0))
+    monkeypatch.setattr(pipeline, "load_tokenizer", lambda _: load_tokenizer())
+
+    with TestClient(app_module.create_app()) as client:
+        wait_for(client, lambda: client.get("/health/ready").status_code == 200)
+        yield client
+
+
+def test_upload_then_chat(client):
+    response = client.post(
+        "/api/upload",
+        files={"file": ("refunds.txt", DOCUMENT.encode(), "text/plain")},
+    )
+    assert response.status_code == 202, response.text
+    job_id = response.json()["job_id"]
+
+    def finished():
+        job = client.get(f"/api/jobs/{job_id}").json()
+        return job if job["status"] in ("succeeded", "failed") else None
+
+    job = wait_for(client, finished)
+    assert job["status"] == "succeeded", job
+
+    response = client.post("/api/chat", json={"query": "How long do refunds take?"})
+    assert response.status_code == 200, response.text
+    # FakeLLM answers with the prompt size, so retrieved context reached it
+    assert response.json()["answer"].startswith("answer (")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert "# TYPE rag_stage_latency_seconds histogram" in body
+    # rerank is timed inside Reranker, which OverlapReranker stands in for
+    for stage in ("embed", "search", "fetch_docs", "generate"):
+        assert f'rag_stage_latency_seconds_count{{stage="{stage}"}}' in body
+    assert "rag_ingested_chunks_total" in body
+    index_size = next(line for line in body.splitlines() if line.startswith("rag_index_vectors "))
+    assert float(index_size.split()[1]) > 0
+
+
+@pytest.mark.parametrize(
+    "reason, code",
+    [("queue_full", 429), ("deadline", 503)],
+)
+def test_shed_chat_gets_retry_after(client, reason, code):
+    limiter = client.app.state.rag_pipeline.scheduler.admission.limiters["embed"]
+    # every slot taken by calls known to take 60s
+    limiter.in_flight = limiter.limit
+    limiter.service_time = 60.0
+    if reason == "queue_full":
+        limiter.waiting = limiter.max_waiting
+    try:
+        response = client.post("/api/chat", json={"query": "How long do refunds take?"})
+    finally:
+        limiter.in_flight = limiter.waiting = 0
+    assert response.status_code == code, response.text
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def upload(client, name, text):
+    response = client.post("/api/upload", files={"file": (name, text.encode(), "text/plain")})
+    job_id = response.json()["job_id"]
+    job = wait_for(
+        client,
+        lambda: (lambda job: job if job["status"] in ("succeeded", "failed") else None)(
+            client.get(f"/api/jobs/{job_id}").json()
+        ),
+    )
+    assert job["status"] == "succeeded", job
+
+
+class Spy:
+    """Wraps a callable, counting calls and keeping their keyword arguments."""
+
+    def __init__(self, fn, delay=0.0):
+        self.fn = fn
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append(kwargs)
+        if self.delay:
+            time.sleep(self.delay)
+        return self.fn(*args, **kwargs)
+
+
+class AsyncSpy(Spy):
+    async def __call__(self, *args, **kwargs):
+        self.calls.append(kwargs)
+        return await self.fn(*args, **kwargs)
+
+
+def test_chat_embeds_once_and_cache_hits_skip_the_pipeline(client, monkeypatch):
+    upload(client, "refunds.txt", DOCUMENT)
+    rag = client.app.state.rag_pipeline
+    run = AsyncSpy(rag.run)
+    embed = Spy(rag.retriver.embed_query)
+    monkeypatch.setattr(rag, "run", run)
+    monkeypatch.setattr(rag.retriver, "embed_query", embed)
+
+    query = {"query": "Can I return a product?"}
+    first = client.post("/api/chat", json=query)
+    assert first.status_code == 200, first.text
+    # the vector embedded alongside the cache lookup is handed to the pipeline
+    assert len(run.calls) == 1 and run.calls[0]["query_vector"] is not None
+    assert len(embed.calls) == 1
+
+    # a hit answers without waiting for the embedding, which it cancels
+    embed.delay = 2.0
+    start = time.monotonic()
+    second = client.post("/api/chat", json=query)
+    assert time.monotonic() - start < 1.5
+    assert second.json() == first.json()
+    assert len(run.calls) == 1
+
+
+def test_chat_answers_when_the_cache_lookup_fails(client, monkeypatch):
+    import ui
+
+    def broken_lookup(*args):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(ui, "get_cached_response", broken_lookup)
+    upload(client, "refunds.txt", DOCUMENT)
+    for _ in range(2):
+        response = client.post("/api/chat", json={"query": "Are shipping costs refunded?"})
+        assert response.status_code == 200, response.text
+        assert response.json()["answer"].startswith("answer (")
+
+
+def test_ingest_retires_cached_answers(client, monkeypatch):
+    upload(client, "refunds.txt", DOCUMENT)
+    rag = client.app.state.rag_pipeline
+    run = AsyncSpy(rag.run)
+    monkeypatch.setattr(rag, "run", run)
+
+    query = {"query": "Can I return a product?"}
+    for _ in range(2):
+        assert client.post("/api/chat", json=query).status_code == 200
+    assert len(run.calls) == 1
+    generation = rag.corpus_generation()
+
+    upload(client, "returns.txt", "Returned products must be unused and in their original box.")
+    assert rag.corpus_generation() == generation + 1
+    # the new corpus answers afresh, then is cached under its own generation
+    for _ in range(2):
+        assert client.post("/api/chat", json=query).status_code == 200
+    assert len(run.calls) == 2
@@ -0,0 +1,85 @@
+"""
+Token-window chunking in DocumentPreprocessor: chunks sliced through the
+token offsets match decoding each window, and the windows tile the text.
+"""
+
+import random
+import re
+
+import pytest
+
+from data_pipeline.preprocessor import DocumentPreprocessor
+
+
+class OffsetTokenizer:
+    """tiktoken-shaped: words and the whitespace between them are tokens."""
+
+    def encode(self, text):
+        return re.findall(r"\S+|\s+", text)
+
+    def encode_batch(self, texts, num_threads=1):
+        return [self.encode(text) for text in texts]
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+    def decode_with_offsets(self, tokens):
+        offsets = []
+        position = 0
+        for token in tokens:
+            offsets.append(position)
+            position += len(token)
+        return self.decode(tokens), offsets
+
+
+@pytest.fixture
+def make_preprocessor(monkeypatch):
+    import tiktoken
+
+    # the BPE files are not available offline
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: OffsetTokenizer())
+    return DocumentPreprocessor
+
+
+def random_text(seed, words=2000):
+    rng = random.Random(seed)
+    vocab = ["alpha", "beta", "gamma", "délta", "ε", "zeta", "eta", "theta"]
+    separators = [" "] * 8 + ["\n", "  ", "\n\n"]
+    return "".join(rng.choice(vocab) + rng.choice(separators) for _ in range(words))
+
+
+@pytest.mark.parametrize("chunk_size, overlap", [(50, 0), (64, 16), (7, 6)])
+def test_chunks_match_decoded_windows(make_preprocessor, chunk_size, overlap):
+    pre = make_preprocessor(chunk_size=chunk_size, chunk_overlap=overlap, min_chars=0)
+    text = random_text(chunk_size)
+    tokens = pre.tokenizer.encode(text)
+    chunks = pre.chunk_text(text, "doc", "Doc")
+
+    starts = list(range(0, len(tokens), chunk_size - overlap))
+    assert [chunk["offset_tokens"][0] for chunk in chunks] == starts
+    for chunk in chunks:
+        start, end = chunk["offset_tokens"]
+        char_start, char_end = chunk["offset_chars"]
+        assert end - start == chunk["token_count"] <= chunk_size
+        assert chunk["text"] == pre.tokenizer.decode(tokens[start:end]).strip()
+        assert chunk["text"] == text[char_start:char_end].strip()
+        assert chunk["char_count"] == len(chunk["text"])
+
+
+def test_windows_without_overlap_tile_the_text(make_preprocessor):
+    pre = make_preprocessor(chunk_size=40, chunk_overlap=0, min_chars=0)
+    text = random_text(1)
+    chunks = pre.chunk_text(text, "doc", "Doc")
+    assert "".join(text[slice(*chunk["offset_chars"])] for chunk in chunks) == text
+
+
+def test_batched_documents_chunk_like_single_ones(make_preprocessor):
+    pre = make_preprocessor(chunk_size=60, chunk_overlap=10, min_chars=20)
+    docs = [
+        {"raw_text": random_text(seed, words=300), "doc_id": f"d{seed}", "title": f"T{seed}"}
+        for seed in range(5)
+    ]
+    batched = list(pre.process_documents(docs, batch_size=2))
+    single = [chunk for doc in docs for chunk in pre.process_document(doc)]
+    assert batched == single
+    assert all(len(chunk["text"]) >= 20 for chunk in batched)
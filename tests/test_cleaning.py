@@ -0,0 +1,183 @@
+"""
+Golden tests for the cleaning engine.
+
+`clean_text` must stay byte-identical to the original seven-pass cleaner,
+and streamed cleaning must match whole-text cleaning up to whitespace at
+the segment cuts.
+"""
+
+import random
+import re
+import unicodedata
+
+import pytest
+
+from data_pipeline import cleaning
+from data_pipeline.cleaning import (
+    clean_segment,
+    clean_text,
+    clean_text_stream,
+    remove_page_boilerplate,
+)
+
+
+def legacy_clean(text):
+    """The cleaner as it was before precompiled patterns, kept as the reference."""
+    text = unicodedata.normalize("NFKC", text)
+    text = text.replace("\x00", "").replace("\x0c", "")
+    text = re.sub(r"<script.*?>.*?</script>", "", text, flags=re.DOTALL)
+    text = re.sub(r"<style.*?>.*?</style>", "", text, flags=re.DOTALL)
+    text = re.sub(r"<[^>]+>", "", text)
+    text = re.sub(r"(\w+)-\s*\n\s*(\w+)", r"\1\2", text)
+    text = re.sub(r"Page\s+\d+(\s+of\s+\d+)?", "", text, flags=re.IGNORECASE)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = re.sub(r"[ \t]{2,}", " ", text)
+    text = text.strip()
+    lines = text.splitlines()
+    if len(lines) > 4:
+        header = lines[0]
+        footer = lines[-1]
+        lines = [
+            line for line in lines
+            if line.strip() != header.strip() and line.strip() != footer.strip()
+        ]
+        text = "\n".join(lines)
+    return text.strip()
+
+
+FRAGMENTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Revenue grew by 12% year over year",
+    "inter-\nnational", "multi-  \n  line", "a-\nbc-\nd", "state-of-the-art",
+    "Page 3 of 10", "page 7", "PAGE  12", "Page\n4",
+    "<p>para</p>", "<script>var x = 1;</script>", "<style>p {}</style>",
+    "<style><script></style>x</script>", "<<script>y</script>b>", "a < b > c",
+    "\x00", "\x0c", "ﬁnance", "Ⅻ", "café", "ｆｕｌｌｗｉｄｔｈ",
+    "  ", "\t\t", " \t ", "\n", "\n\n", "\n\n\n\n", "\r\n", " ",
+]
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog revenue grew by twelve percent "
+    "year over international multi-line agreement policy section"
+).split()
+SEPARATORS = [" "] * 20 + ["\n", "  ", "-\n", "\n\n\n"]
+
+
+def random_document(rng, n_fragments):
+    parts = ["ACME Corp Annual Report", "\n"]
+    for _ in range(n_fragments):
+        parts.append(rng.choice(FRAGMENTS))
+        parts.append(rng.choice([" ", "\n", "", "  "]))
+    parts.extend(["\n", "Confidential"])
+    return "".join(parts)
+
+
+def random_prose(rng, n_chars, separators=SEPARATORS):
+    parts = []
+    size = 0
+    while size < n_chars:
+        word = rng.choice(WORDS)
+        sep = rng.choice(separators)
+        parts.append(word)
+        parts.append(sep)
+        size += len(word) + len(sep)
+    return "".join(parts)
+
+
+def pieces_of(text, rng, max_piece=300):
+    start = 0
+    while start < len(text):
+        end = start + rng.randint(1, max_piece)
+        yield text[start:end]
+        start = end
+
+
+def test_clean_text_matches_legacy():
+    rng = random.Random(0)
+    for i in range(500):
+        if i % 10:
+            doc = random_document(rng, rng.randint(0, 200))
+        else:
+            doc = random_prose(rng, rng.randint(0, 5000))
+        assert clean_text(doc) == legacy_clean(doc), doc
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_stream_matches_whole_text(seed):
+    rng = random.Random(seed)
+    doc = random_prose(rng, 50_000)
+    segments = list(clean_text_stream(pieces_of(doc, rng), segment_size=2_000))
+    assert len(segments) > 1
+    assert "\n\n".join(segments).split() == clean_segment(doc).split()
+
+
+def test_stream_never_cuts_a_hyphen_join_or_open_tag():
+    doc = "alpha inter-\n\nnational beta " * 200 + "<p\n\nclass=x>gamma</p> " * 200
+    segments = list(clean_text_stream(pieces_of(doc, random.Random(1)), segment_size=500))
+    assert "\n\n".join(segments).split() == clean_segment(doc).split()
+
+
+def test_stream_never_cuts_a_page_number():
+    rng = random.Random(3)
+    parts = []
+    for n in range(1, 400):
+        parts.append(random_prose(rng, 120, separators=[" "]))
+        parts.append(rng.choice(["Page\n\n%d", "Page %d\n\nof 400", "\n\n%d\n\n"]) % n)
+        parts.append(rng.choice([" ", "\n\n"]))
+    doc = "".join(parts)
+    segments = list(clean_text_stream(pieces_of(doc, rng), segment_size=500))
+    assert len(segments) > 1
+    assert "\n\n".join(segments).split() == clean_segment(doc).split()
+    # page-number-only lines stay with the text before them
+    assert not any(re.match(r"\d+\s", segment + " ") for segment in segments)
+
+
+class CountingPattern:
+    """Wraps the segment-break pattern and counts the characters it scans."""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.scanned = 0
+
+    def finditer(self, text, pos=0):
+        self.scanned += len(text) - pos
+        return self.pattern.finditer(text, pos)
+
+
+def test_stream_without_blank_lines_scans_in_linear_time(monkeypatch):
+    counter = CountingPattern(cleaning._SEGMENT_BREAK_RE)
+    monkeypatch.setattr(cleaning, "_SEGMENT_BREAK_RE", counter)
+    rng = random.Random(2)
+    doc = random_prose(rng, 200_000, separators=[" "] * 20 + ["\n"])
+    segments = list(clean_text_stream(pieces_of(doc, rng, 100), segment_size=1_000))
+    assert segments == [clean_segment(doc)]
+    # a rescan per piece would be ~2000x the document; allow the newline backoff
+    assert counter.scanned < 2 * len(doc)
+
+
+def test_running_header_and_page_numbers_are_stripped():
+    pages = [
+        f"ACME Corp Annual Report\nBody text of page {n}.\nMore about item {n * 3}.\nPage {n} of 5"
+        for n in range(1, 6)
+    ]
+    stripped = remove_page_boilerplate(pages)
+    assert stripped == [
+        f"Body text of page {n}.\nMore about item {n * 3}." for n in range(1, 6)
+    ]
+
+
+def test_numbered_headings_are_content():
+    pages = [
+        f"Article {n}.\nThe parties agree to clause {n}.\nSigned at the end.\nQuarter {n} revenue"
+        for n in range(1, 6)
+    ]
+    assert remove_page_boilerplate(pages) == pages
+
+
+def test_short_pages_keep_their_body():
+    # a slide deck: every page is a title and a line or two
+    pages = [f"Slide title\nPoint {n}\nFooter" for n in range(1, 8)]
+    pages += ["Closing remarks", "Questions\nThanks"]
+    stripped = remove_page_boilerplate(pages)
+    assert stripped[:7] == [f"Point {n}" for n in range(1, 8)]
+    assert stripped[7:] == pages[7:]
@@ -0,0 +1,41 @@
+"""
+SQLite stores built before fork() (gunicorn preload) reconnect in the child.
+"""
+
+import os
+
+from data_pipeline.docs_store import DocsStore
+
+
+def run_in_child(fn):
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            code = 0 if fn() else 1
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status)
+
+
+def test_child_process_opens_its_own_connection(tmp_path):
+    store = DocsStore(str(tmp_path / "docs.db"))
+    parent_conn = store.conn
+    records = [{"text": "parent", "metadata": {"doc_id": "d", "chunk_hash": "h0"}}]
+    store.add_chunks([0], records)
+
+    def child():
+        assert store.conn is not parent_conn
+        assert store.get_document_by_id(0)["text"] == "parent"
+        store.add_chunks(
+            [1], [{"text": "child", "metadata": {"doc_id": "d", "chunk_hash": "h1"}}]
+        )
+        store.close()
+        return True
+
+    assert run_in_child(child) == 0
+    # the parent's connection is untouched and sees the child's write
+    assert store.conn is parent_conn
+    assert store.get_document_by_id(1)["text"] == "child"
+    store.close()
@@ -0,0 +1,94 @@
+"""
+MMR diversification in engine.diversify: the vectorized selection matches
+the textbook greedy loop, near-duplicates of a more relevant candidate are
+collapsed, and Retriever.diversify reorders docs from the index's vectors.
+"""
+
+import numpy as np
+import pytest
+from langchain.schema import Document
+
+from data_pipeline.docs_store import DocsStore
+from data_pipeline.indexer import Indexer
+from engine.diversify import Diversifier, mmr, near_duplicate_mask
+from engine.retriver import Retriever
+
+
+def unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def reference_mmr(query, vectors, k, lambda_):
+    query, vectors = unit(query), unit(vectors)
+    # the first pick is the most relevant candidate, whatever lambda_
+    selected = [int(np.argmax(vectors @ query))]
+    candidates = [i for i in range(len(vectors)) if i not in selected]
+    while candidates and len(selected) < k:
+        def score(i):
+            redundancy = max(float(vectors[i] @ vectors[j]) for j in selected)
+            return lambda_ * float(vectors[i] @ query) - (1 - lambda_) * redundancy
+
+        best = max(candidates, key=score)
+        selected.append(best)
+        candidates.remove(best)
+    return selected
+
+
+@pytest.mark.parametrize("lambda_", [0.0, 0.3, 0.7, 1.0])
+def test_matches_the_greedy_definition(lambda_):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(100, 16))
+    query = rng.normal(size=16)
+    assert mmr(query, vectors, 10, lambda_) == reference_mmr(query, vectors, 10, lambda_)
+
+
+def test_pure_relevance_is_score_order():
+    rng = np.random.default_rng(1)
+    vectors = unit(rng.normal(size=(20, 8)))
+    query = unit(rng.normal(size=8))
+    assert mmr(query, vectors, 20, lambda_=1.0) == list(np.argsort(-(vectors @ query)))
+
+
+def test_diverse_candidate_beats_a_second_copy():
+    query = [1.0, 0.0]
+    vectors = [[1.0, 0.1], [1.0, 0.12], [0.6, -0.8]]
+    assert mmr(query, vectors, 2, lambda_=1.0) == [0, 1]
+    assert mmr(query, vectors, 2, lambda_=0.5) == [0, 2]
+
+
+def test_near_duplicates_keep_the_most_relevant_copy():
+    vectors = unit([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.99, 0.01, 0.0], [0.0, 0.0, 1.0]])
+    similarity = vectors @ vectors.T
+    # candidate 2 ranks above its twin 0
+    order = np.array([2, 1, 0, 3])
+    assert near_duplicate_mask(similarity, order, 0.95).tolist() == [True, False, False, False]
+
+    query = [1.0, 0.0, 0.1]
+    assert sorted(mmr(query, vectors, 4, lambda_=1.0, duplicate_threshold=0.95)) == [0, 1, 3]
+    assert len(mmr(query, vectors, 4, lambda_=1.0)) == 4
+
+
+def test_empty_and_small_inputs():
+    assert mmr([1.0, 0.0], np.zeros((0, 2)), 5) == []
+    assert mmr([1.0, 0.0], [[1.0, 0.0], [0.0, 1.0]], 5) == [0, 1]
+
+
+def test_retriever_diversifies_indexed_docs(tmp_path):
+    dims = 8
+    vectors = unit(np.eye(dims)[[0, 0, 1, 2]] + 0.01 * np.arange(4)[:, None])
+    indexer = Indexer(dims, "IVF", "cosine", n_list=1, m=1)
+    indexer.train(vectors)
+    indexer.add(vectors)
+    docs_store = DocsStore(str(tmp_path / "docs.db"))
+    retriever = Retriever(
+        None, indexer, top_k=4, docs_store=docs_store, score_threshold=None,
+        diversifier=Diversifier(lambda_=0.5, duplicate_threshold=0.95),
+    )
+    docs = [Document(page_content=f"c{i}", metadata={"vector_id": i}) for i in range(4)]
+    loose = Document(page_content="from qdrant", metadata={})
+
+    kept = retriever.diversify(vectors[0], docs + [loose])
+    # c1 duplicates c0; the doc without a vector goes last
+    assert [doc.page_content for doc in kept] == ["c0", "c2", "c3", "from qdrant"]
+    assert retriever.diversify(vectors[0], docs[:1]) == docs[:1]
@@ -0,0 +1,95 @@
+"""
+Corpus generations: bumps are atomic across connections, a process
+serving a saved index reloads it once another one bumps the generation,
+and each tenant counts its own.
+"""
+
+import threading
+
+import numpy as np
+
+from common.locks import ReadWriteLock
+from data_pipeline.generation import CorpusGeneration, IndexReloader
+from data_pipeline.indexer import Indexer
+from data_pipeline.tenants import TenantIndexManager
+
+DIMS = 8
+
+
+def make_indexer(tenant_dir=None):
+    return Indexer(DIMS, "IVF", "cosine", n_list=1, m=1)
+
+
+def vectors(n, seed):
+    return np.random.default_rng(seed).random((n, DIMS), dtype="float32")
+
+
+def test_concurrent_bumps_are_not_lost(tmp_path):
+    path = str(tmp_path / "generation.db")
+    assert CorpusGeneration(path).current() == 0
+
+    def bump():
+        # a counter per thread, as each worker process opens its own
+        generation = CorpusGeneration(path)
+        for _ in range(25):
+            generation.bump()
+
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert CorpusGeneration(path).current() == 100
+
+
+def test_reader_reloads_only_after_a_bump(tmp_path):
+    index_path = str(tmp_path / "index.faiss")
+    generation = CorpusGeneration(str(tmp_path / "generation.db"))
+    writer = IndexReloader(make_indexer(), index_path, generation, ReadWriteLock(), mmap=False)
+    reader = IndexReloader(make_indexer(), index_path, generation, ReadWriteLock())
+
+    assert reader.refresh()
+    assert not reader.refresh()
+    assert reader.indexer.ntotal == 0
+
+    writer.refresh(writable=True)
+    writer.indexer.add(vectors(10, 0))
+    writer.indexer.save(index_path)
+    # saved but not bumped yet: the reader keeps its copy
+    assert not reader.refresh()
+    assert writer.bump() == 1
+    # the writer's own copy is already the newest
+    assert not writer.refresh(writable=True)
+
+    assert reader.refresh()
+    assert reader.loaded == 1
+    assert reader.indexer.ntotal == 10
+    assert not reader.refresh()
+
+
+def test_tenants_count_their_own_generation(tmp_path):
+    manager = TenantIndexManager(str(tmp_path / "tenants"), make_indexer, memory_budget=1 << 30)
+    assert manager.generation("a") is manager.generation("a")
+
+    with manager.use("a") as tenant:
+        tenant.refresh(writable=True)
+        tenant.indexer.add(vectors(5, 1))
+        tenant.save()
+        tenant.reloader.bump()
+
+    assert manager.loaded_generation("a") == 1
+    # b is not loaded: its generation is read without loading it
+    assert manager.loaded_generation("b") == 0
+    assert manager.stats()["resident"] == ["a"]
+
+    # another process bumps a's generation after saving a bigger index
+    other = TenantIndexManager(str(tmp_path / "tenants"), make_indexer, memory_budget=1 << 30)
+    with other.use("a") as tenant:
+        tenant.refresh(writable=True)
+        tenant.indexer.add(vectors(5, 2))
+        tenant.save()
+        tenant.reloader.bump()
+
+    assert manager.loaded_generation("a") == 2
+    with manager.use("a") as tenant:
+        assert tenant.indexer.ntotal == 10
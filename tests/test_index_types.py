@@ -0,0 +1,122 @@
+"""
+Ingest then query through `build_rag_pipeline` for every index type the
+factory accepts, with the offline model stand-ins.
+"""
+
+import asyncio
+import io
+import random
+
+import pytest
+
+from fakes import FakeLLM, HashingEmbedder, OverlapReranker, load_tokenizer
+
+DIMS = 64
+INDEX_TYPES = ["IVF", "HNSW", "IVF_PQ", "BINARY", "BINARY_HNSW"]
+
+
+def paragraphs(seed, count):
+    rng = random.Random(seed)
+    vocab = ["".join(rng.choice("abcdefghijklmnop") for _ in range(7)) for _ in range(4000)]
+    return [" ".join(rng.choice(vocab) for _ in range(12)) + "." for _ in range(count)]
+
+
+def build(tmp_path, monkeypatch, index_type, train_size=300, compact_tombstones=1000):
+    from engine import pipeline
+    from settings import load_settings
+
+    settings = load_settings(
+        {
+            "RAG_INDEX_DIR": str(tmp_path / "index"),
+            "RAG_EMBEDDING_DIMS": str(DIMS),
+            "RAG_INDEX_TYPE": index_type,
+            "RAG_INDEX_N_LIST": "4",
+            "RAG_INDEX_PQ_M": "8",
+            "RAG_INDEX_TRAIN_SIZE": str(train_size),
+            "RAG_INDEX_COMPACT_TOMBSTONES": str(compact_tombstones),
+            "RAG_CHUNK_SIZE": "120",
+            "RAG_CHUNK_OVERLAP": "0",
+            "RAG_EMBEDDING_CACHE": "0",
+        }
+    )
+    monkeypatch.setattr(pipeline, "load_embedding_model", lambda _: HashingEmbedder(DIMS))
+    monkeypatch.setattr(pipeline, "load_reranker", lambda s: OverlapReranker(s.rerank_top_n))
+    monkeypatch.setattr(pipeline, "load_llm", lambda _: FakeLLM(latency=0.0, jitter=0.0))
+    monkeypatch.setattr(pipeline, "load_tokenizer", lambda _: load_tokenizer())
+    return pipeline.build_rag_pipeline(settings)
+
+
+def ingest(rag, texts, name, replaces=None):
+    data = "\n\n".join(texts).encode()
+    return rag.ingest_stream(io.BytesIO(data), name, replaces=replaces)
+
+
+def found(rag, text):
+    """True if a retrieved chunk contains `text` (chunks may join paragraphs)."""
+    docs = rag.retriver.retrieve_by_vector(rag.retriver.embed_query(text))
+    return any(text in doc.page_content for doc in docs)
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_ingest_then_query(tmp_path, monkeypatch, index_type):
+    rag = build(tmp_path, monkeypatch, index_type)
+    # a first upload far smaller than IVF_PQ needs to train
+    small = paragraphs(0, 15)
+    stats = ingest(rag, small, "small.txt")
+    assert stats["vectors"] == rag.indexer.ntotal > 0
+    assert found(rag, small[3])
+
+    # a restarted worker serves the saved index
+    reopened = build(tmp_path, monkeypatch, index_type)
+    assert reopened.indexer.ntotal == rag.indexer.ntotal
+    assert found(reopened, small[3])
+
+    # enough to train IVF_PQ; the first upload's vectors keep their ids
+    large = paragraphs(1, 400)
+    ingest(reopened, large, "large.txt")
+    assert reopened.indexer.is_trained
+    for text in (small[3], large[200]):
+        assert found(reopened, text)
+
+    answer = asyncio.run(reopened.run(large[10]))
+    assert answer.startswith("answer (")
+
+
+@pytest.mark.parametrize("compact_tombstones", [0, 50])
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_replaced_chunks_do_not_take_result_slots(
+    tmp_path, monkeypatch, index_type, compact_tombstones
+):
+    rag = build(tmp_path, monkeypatch, index_type, compact_tombstones=compact_tombstones)
+    top_k = rag.retriver.top_k
+    # trains IVF_PQ, which can only be compacted once trained
+    ingest(rag, paragraphs(1, 300), "large.txt")
+
+    # every version changes every chunk a little, so the vectors of the
+    # previous one's stay close to the query
+    base = paragraphs(0, 40)
+    doc_id = None
+    for version in range(5):
+        texts = [f"{text} v{version}" for text in base]
+        doc_id = ingest(rag, texts, "doc.txt", replaces=doc_id)["doc_id"]
+
+    docs = rag.retriver.retrieve_by_vector(rag.retriver.embed_query(texts[5]))
+    assert len(docs) == top_k
+    assert any(texts[5] in doc.page_content for doc in docs)
+    assert not any(" v3" in doc.page_content for doc in docs)
+
+    if not compact_tombstones:
+        assert rag.docs_store.tombstones() >= 4 * len(base)
+        return
+    # compacted: fewer vectors, same ids
+    assert rag.indexer.size < rag.indexer.ntotal
+    assert rag.docs_store.tombstones() < compact_tombstones
+    reopened = build(tmp_path, monkeypatch, index_type, compact_tombstones=compact_tombstones)
+    assert reopened.indexer.ntotal == rag.indexer.ntotal
+    assert reopened.indexer.size == rag.indexer.size
+    assert found(reopened, texts[5])
+    # new vectors get ids after the highest one ever used
+    more = paragraphs(2, 10)
+    ingest(reopened, more, "more.txt")
+    assert found(reopened, more[4])
+    assert found(reopened, texts[7])
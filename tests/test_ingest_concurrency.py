@@ -0,0 +1,79 @@
+"""
+Concurrent ingests into one index: dedup sees the other jobs' chunks, so
+overlapping uploads don't index the same chunk twice.
+"""
+
+import io
+import random
+import threading
+import time
+
+from data_pipeline.docs_store import DocsStore
+from data_pipeline.indexer import Indexer
+from data_pipeline.loader import DocumentLoader
+from data_pipeline.preprocessor import ChunkDocument, CleanDocument, EmbedDocument
+from engine.pipeline import RAGPipeline
+from engine.retriver import Retriever
+from fakes import HashingEmbedder
+
+DIMS = 32
+
+
+class SlowEmbedder(HashingEmbedder):
+    """Slow enough that two ingests are always embedding at the same time."""
+
+    def embed_documents(self, texts):
+        time.sleep(0.05)
+        return super().embed_documents(texts)
+
+
+def build(tmp_path):
+    embedder = EmbedDocument(SlowEmbedder(DIMS), batch_size=4)
+    indexer = Indexer(DIMS, "IVF", "cosine", n_list=1, m=1)
+    docs_store = DocsStore(str(tmp_path / "docs.db"))
+    retriever = Retriever(embedder, indexer, top_k=5, docs_store=docs_store, score_threshold=None)
+    return RAGPipeline(
+        loader=DocumentLoader({}),
+        cleaner=CleanDocument({}),
+        chunker=ChunkDocument({"chunk_size": 120, "chunk_overlap": 0}),
+        embedder=embedder,
+        indexer=indexer,
+        retriver=retriever,
+        reranker=None,
+        scorenormalizer=None,
+        generator=None,
+        docs_store=docs_store,
+    )
+
+
+def test_overlapping_uploads_index_each_chunk_once(tmp_path):
+    rng = random.Random(0)
+    shared = [
+        " ".join("".join(rng.choice("abcdefgh") for _ in range(6)) for _ in range(14)) + "."
+        for _ in range(30)
+    ]
+    # two revisions of one document, uploaded at the same time
+    files = {
+        "v1.txt": "\n\n".join(shared + ["first revision only."]),
+        "v2.txt": "\n\n".join(shared + ["second revision only."]),
+    }
+    rag = build(tmp_path)
+    results = {}
+
+    def ingest(name):
+        results[name] = rag.ingest_stream(io.BytesIO(files[name].encode()), name)
+
+    threads = [threading.Thread(target=ingest, args=(name,)) for name in files]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = list(results.values())
+    assert len(stats) == 2
+    # every chunk of the shared text was embedded by exactly one of them
+    assert sorted(s["skipped"] for s in stats)[0] == 0
+    assert sum(s["vectors"] for s in stats) == rag.indexer.ntotal
+    chunk_hashes = rag.docs_store.conn.execute("SELECT chunk_hash FROM chunks").fetchall()
+    assert len(chunk_hashes) == len(set(chunk_hashes)) == rag.indexer.ntotal
+    assert max(s["skipped"] for s in stats) > 0
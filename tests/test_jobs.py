@@ -0,0 +1,67 @@
+"""
+JobQueue across processes sharing one jobs DB: only the leader ingests.
+"""
+
+import asyncio
+
+from jobs import JobQueue
+
+
+class RecordingPipeline:
+    def __init__(self):
+        self.files = []
+
+    def ingest_stream(self, f, filename, **kwargs):
+        self.files.append(filename)
+        return {"pages": 1, "chunks": 1, "vectors": 1}
+
+
+async def wait_for(check, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not check():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_follower_uploads_run_on_the_leader(tmp_path):
+    async def scenario():
+        db_path = str(tmp_path / "jobs.db")
+        pipelines = [RecordingPipeline(), RecordingPipeline()]
+        queues = [
+            JobQueue(p, db_path, str(tmp_path / "uploads"), poll_interval=0.01)
+            for p in pipelines
+        ]
+        for queue in queues:
+            await queue.start()
+        leader, follower = queues
+        assert leader.leader and not follower.leader
+
+        paths = []
+        for name in ("a.txt", "b.txt"):
+            path = tmp_path / "uploads" / name
+            path.write_bytes(b"text")
+            paths.append(str(path))
+        job_ids = [
+            follower.submit(paths[0], "a.txt"),
+            leader.submit(paths[1], "b.txt"),
+        ]
+        await wait_for(
+            lambda: all(
+                leader.get(job_id)["status"] == "succeeded" for job_id in job_ids
+            )
+        )
+        assert sorted(pipelines[0].files) == ["a.txt", "b.txt"]
+        assert pipelines[1].files == []
+
+        # the follower takes over once the leader is gone
+        await leader.stop()
+        path = tmp_path / "uploads" / "c.txt"
+        path.write_bytes(b"text")
+        job_id = follower.submit(str(path), "c.txt")
+        await wait_for(lambda: follower.get(job_id)["status"] == "succeeded")
+        assert follower.leader
+        assert pipelines[1].files == ["c.txt"]
+        await follower.stop()
+
+    asyncio.run(scenario())
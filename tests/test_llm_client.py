@@ -0,0 +1,210 @@
+"""
+AsyncLLMClient: which errors are retried and how long it waits, the
+overall deadline, hedging and the concurrency limit.
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from engine.llm_client import AsyncLLMClient, LLMTimeoutError, is_transient, retry_after
+
+
+class StatusError(RuntimeError):
+    """Shaped like an SDK error for an HTTP response."""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class APIConnectionError(RuntimeError):
+    """Named like openai's, which is not installed here."""
+
+
+class ScriptedLLM:
+    """Raises the queued errors in turn, then answers; records call times."""
+
+    def __init__(self, errors=(), latency=0.0):
+        self.errors = list(errors)
+        self.latency = latency
+        self.calls = []
+
+    async def ainvoke(self, prompt):
+        self.calls.append(time.perf_counter())
+        await asyncio.sleep(self.latency)
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"answer to {prompt}"
+
+
+def run(client, prompt="q", **kwargs):
+    return asyncio.run(client.invoke(prompt, **kwargs))
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        StatusError(503),
+        StatusError(429),
+        ConnectionResetError(),
+        APIConnectionError(),
+        TimeoutError(),
+    ],
+)
+def test_transient_errors_are_retried(error):
+    llm = ScriptedLLM([error])
+    client = AsyncLLMClient(llm, backoff=0.0)
+    assert run(client) == "answer to q"
+    assert len(llm.calls) == 2
+    assert client.stats()["retries"] == 1
+
+
+@pytest.mark.parametrize("error", [StatusError(400), StatusError(401), ValueError()])
+def test_other_errors_are_raised_at_once(error):
+    llm = ScriptedLLM([error])
+    client = AsyncLLMClient(llm, backoff=0.0)
+    with pytest.raises(type(error)):
+        run(client)
+    assert len(llm.calls) == 1
+
+
+def test_retries_stop_after_max_retries():
+    llm = ScriptedLLM([StatusError(503)] * 5)
+    client = AsyncLLMClient(llm, max_retries=2, backoff=0.0)
+    with pytest.raises(StatusError):
+        run(client)
+    assert len(llm.calls) == 3
+
+
+def test_retry_after_is_honoured():
+    llm = ScriptedLLM([StatusError(429, {"Retry-After": "0.3"})])
+    client = AsyncLLMClient(llm, backoff=0.0)
+    assert run(client) == "answer to q"
+    assert llm.calls[1] - llm.calls[0] >= 0.3
+
+
+def test_retry_after_past_the_deadline_is_not_waited_for():
+    llm = ScriptedLLM([StatusError(429, {"retry-after": "30"})])
+    client = AsyncLLMClient(llm, timeout=1.0, backoff=0.0)
+    start = time.perf_counter()
+    with pytest.raises(StatusError):
+        run(client)
+    assert time.perf_counter() - start < 0.5
+    assert len(llm.calls) == 1
+
+
+def test_retry_after_formats():
+    assert retry_after(StatusError(429, {"retry-after-ms": "250"})) == 0.25
+    assert retry_after(StatusError(429, {"Retry-After": "2"})) == 2.0
+    assert retry_after(StatusError(429, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert retry_after(StatusError(429, {"Retry-After": "soon"})) is None
+    assert retry_after(StatusError(429)) is None
+    assert is_transient(StatusError(429)) and not is_transient(StatusError(404))
+
+
+def test_deadline_covers_retries():
+    llm = ScriptedLLM([StatusError(503)] * 10, latency=0.05)
+    client = AsyncLLMClient(llm, timeout=0.3, max_retries=10, backoff=0.05)
+    start = time.perf_counter()
+    with pytest.raises(LLMTimeoutError):
+        run(client)
+    assert time.perf_counter() - start < 0.6
+
+
+def test_slow_call_hits_the_deadline():
+    client = AsyncLLMClient(ScriptedLLM(latency=5.0), timeout=0.2)
+    start = time.perf_counter()
+    with pytest.raises(LLMTimeoutError):
+        run(client)
+    assert time.perf_counter() - start < 1.0
+
+
+class StragglerLLM:
+    """Answers in `latency` seconds, except call number `slow_call`, which takes `slow`."""
+
+    def __init__(self, latency, slow_call, slow):
+        self.latency = latency
+        self.slow_call = slow_call
+        self.slow = slow
+        self.calls = 0
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        call = self.calls
+        await asyncio.sleep(self.slow if call == self.slow_call else self.latency)
+        return f"call {call}"
+
+
+def test_hedge_answers_a_straggler():
+    llm = StragglerLLM(latency=0.01, slow_call=6, slow=5.0)
+    client = AsyncLLMClient(llm, hedge=True, hedge_min_samples=5)
+
+    async def scenario():
+        # no hedging until the latency window has enough samples
+        for _ in range(5):
+            await client.invoke("q")
+        assert client.stats()["hedges"] == 0
+        start = time.perf_counter()
+        answer = await client.invoke("q")
+        return answer, time.perf_counter() - start
+
+    answer, elapsed = asyncio.run(scenario())
+    assert answer == "call 7"
+    assert elapsed < 1.0
+    assert client.stats()["hedges"] == 1
+    assert client.stats()["hedge_wins"] == 1
+
+
+class CountingLLM:
+    """Tracks the most calls in flight at once; `invoke` is blocking, `ainvoke` async."""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def _enter(self):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def _exit(self):
+        with self.lock:
+            self.active -= 1
+
+
+class AsyncCountingLLM(CountingLLM):
+    async def ainvoke(self, prompt):
+        self._enter()
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self._exit()
+        return prompt
+
+
+class BlockingCountingLLM(CountingLLM):
+    def invoke(self, prompt):
+        self._enter()
+        try:
+            time.sleep(self.latency)
+        finally:
+            self._exit()
+        return prompt
+
+
+@pytest.mark.parametrize("llm_class", [AsyncCountingLLM, BlockingCountingLLM])
+def test_concurrency_is_limited(llm_class):
+    llm = llm_class()
+    client = AsyncLLMClient(llm, max_concurrency=3)
+
+    async def scenario():
+        return await asyncio.gather(*(client.invoke(str(i)) for i in range(12)))
+
+    assert asyncio.run(scenario()) == [str(i) for i in range(12)]
+    assert llm.peak == 3
@@ -0,0 +1,29 @@
+"""
+Sections of non-PDF files go through the cleaner whole.
+"""
+
+import io
+
+from data_pipeline.loader import DocumentLoader
+from data_pipeline.preprocessor import CleanDocument
+from fakes import make_docx
+
+
+def test_docx_chapter_headings_survive_cleaning(tmp_path):
+    chapters = [
+        (
+            f"Chapter {n}",
+            [f"Paragraph {i} of chapter {n}, about topic {n * 7 + i}." for i in range(5)],
+        )
+        for n in range(1, 9)
+    ]
+    loader = DocumentLoader({"temp_dir": str(tmp_path)})
+    docs = list(loader.iter_file_pages(io.BytesIO(make_docx(chapters)), "book.docx"))
+    assert all("page" not in doc.metadata for doc in docs)
+    assert [doc.metadata["section"] for doc in docs] == list(range(1, len(docs) + 1))
+
+    text = "\n".join(doc.page_content for doc in CleanDocument({}).clean_stream(docs))
+    for heading, paragraphs in chapters:
+        assert heading in text
+        for paragraph in paragraphs:
+            assert paragraph in text
@@ -0,0 +1,67 @@
+"""
+Prometheus text exposition in common.metrics: headers, label escaping,
+cumulative histogram buckets, scrape-time gauges and the `timed` decorator.
+"""
+
+import asyncio
+
+import pytest
+
+from common import metrics
+from common.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_counter_lines_and_label_escaping():
+    registry = Registry()
+    requests = registry.register(Counter("requests_total", "Requests", ["path"]))
+    requests.inc(path='/a"b\\c')
+    requests.inc(2, path='/a"b\\c')
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{path="/a\\"b\\\\c"} 3.0',
+    ]
+    with pytest.raises(ValueError):
+        registry.register(Counter("requests_total", "Again"))
+    with pytest.raises(ValueError):
+        requests.inc(route="/")
+
+
+def test_histogram_buckets_are_cumulative():
+    latency = Histogram("latency_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, stage="rerank")
+    assert latency.collect()[2:] == [
+        'latency_seconds_bucket{stage="rerank",le="0.1"} 2',
+        'latency_seconds_bucket{stage="rerank",le="1.0"} 3',
+        'latency_seconds_bucket{stage="rerank",le="+Inf"} 4',
+        'latency_seconds_sum{stage="rerank"} 3.65',
+        'latency_seconds_count{stage="rerank"} 4',
+    ]
+    assert latency.summary()["rerank"]["count"] == 4
+
+
+def test_gauge_function_is_read_at_scrape_time():
+    depth = Gauge("depth", "Depth", ["queue"])
+    items = []
+    depth.set_function(lambda: len(items), queue="ingest")
+    depth.set_function(lambda: 1 / 0, queue="broken")
+    items.extend([1, 2])
+    # a failing callback drops its series instead of the whole scrape
+    assert depth.collect()[2:] == ['depth{queue="ingest"} 2.0']
+
+
+def test_timed_records_sync_and_async_calls():
+    @metrics.timed("test_sync")
+    def work():
+        return 1
+
+    @metrics.timed("test_async")
+    async def async_work():
+        return 2
+
+    before = metrics.STAGE_LATENCY.count(stage="test_sync")
+    assert work() == 1
+    assert asyncio.run(async_work()) == 2
+    assert metrics.STAGE_LATENCY.count(stage="test_sync") == before + 1
+    assert metrics.STAGE_LATENCY.count(stage="test_async") >= 1
@@ -0,0 +1,31 @@
+"""
+NearDuplicateIndex candidate filtering.
+"""
+
+from data_pipeline.near_duplicates import NearDuplicateIndex
+
+TEXT = "Customers may return any product within thirty days for a full refund."
+
+
+def make_index(tmp_path, **kwargs):
+    index = NearDuplicateIndex(str(tmp_path / "lsh.db"), **kwargs)
+    signature = index.signature(TEXT)
+    # every key shares all buckets with the query
+    index.add_many([(f"old-{i}", signature) for i in range(10)] + [("kept", signature)])
+    return index, signature
+
+
+def test_exclude_applies_before_the_candidate_limit(tmp_path):
+    index, signature = make_index(tmp_path, max_candidates=4)
+    with index.excluding({f"old-{i}" for i in range(10)}) as excluded:
+        assert index.query(signature, exclude=excluded) == "kept"
+    # the temporary table is gone afterwards
+    assert index.query(signature) is not None
+    index.close()
+
+
+def test_rejected_candidates_are_passed_over(tmp_path):
+    index, signature = make_index(tmp_path)
+    assert index.query(signature, accept=lambda key: key == "kept") == "kept"
+    assert index.query(signature, accept=lambda key: False) is None
+    index.close()
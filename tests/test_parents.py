@@ -0,0 +1,93 @@
+"""
+Small-to-big retrieval: chunks cut inside parent sections are indexed
+small, and expand_to_parents swaps them for their sections after ranking.
+"""
+
+import io
+
+from langchain.schema import Document
+
+from data_pipeline.docs_store import DocsStore
+from data_pipeline.indexer import Indexer
+from data_pipeline.loader import DocumentLoader
+from data_pipeline.preprocessor import ChunkDocument, CleanDocument, EmbedDocument
+from engine.pipeline import RAGPipeline
+from engine.retriver import Retriever
+from fakes import HashingEmbedder
+
+DIMS = 32
+
+
+def section(name, sentences=6):
+    return " ".join(f"{name} sentence {i} about {name}." for i in range(sentences))
+
+
+def build(tmp_path, parent_chunk_size):
+    embedder = EmbedDocument(HashingEmbedder(DIMS))
+    indexer = Indexer(DIMS, "IVF", "cosine", n_list=1, m=1)
+    docs_store = DocsStore(str(tmp_path / "docs.db"))
+    retriever = Retriever(embedder, indexer, top_k=10, docs_store=docs_store, score_threshold=None)
+    chunker = ChunkDocument(
+        {"chunk_size": 80, "chunk_overlap": 10, "parent_chunk_size": parent_chunk_size}
+    )
+    return RAGPipeline(
+        loader=DocumentLoader({}),
+        cleaner=CleanDocument({}),
+        chunker=chunker,
+        embedder=embedder,
+        indexer=indexer,
+        retriver=retriever,
+        reranker=None,
+        scorenormalizer=None,
+        generator=None,
+        docs_store=docs_store,
+    )
+
+
+def test_children_expand_to_their_sections(tmp_path):
+    names = ["alpha", "bravo", "delta"]
+    text = "\n\n".join(section(name) for name in names)
+    rag = build(tmp_path, parent_chunk_size=len(section("alpha")) + 10)
+    rag.ingest_stream(io.BytesIO(text.encode()), "doc.txt")
+
+    docs = rag.retriver.retrieve("bravo sentence 3 about bravo")
+    # the index holds small chunks, each linked to its section
+    assert all(len(doc.page_content) <= 80 + 1 + 10 for doc in docs)
+    assert all(doc.metadata.get("parent_id") for doc in docs)
+
+    expanded = rag.retriver.expand_to_parents(docs)
+    sections = [doc.page_content for doc in expanded]
+    # one entry per section, ranked by its best child
+    assert len(sections) == len(set(sections))
+    assert set(sections) <= {section(name) for name in names}
+    assert sections[0] == section("bravo")
+    top_parent = expanded[0].metadata["parent_id"]
+    children = [doc.metadata["chunk_id"] for doc in docs if doc.metadata["parent_id"] == top_parent]
+    assert expanded[0].metadata["child_chunk_ids"] == children
+
+
+def test_docs_without_a_parent_pass_through(tmp_path):
+    docs_store = DocsStore(str(tmp_path / "docs.db"))
+    docs_store.add_chunks(
+        [0],
+        [{"text": "child", "metadata": {"chunk_hash": "h0", "parent_id": "p1", "parent_text": "the parent"}}],
+    )
+    retriever = Retriever(None, None, top_k=5, docs_store=docs_store, score_threshold=None)
+    docs = [
+        Document(page_content="loose", metadata={"chunk_id": 9}),
+        Document(page_content="child", metadata={"chunk_id": 0, "parent_id": "p1"}),
+        Document(page_content="orphan", metadata={"chunk_id": 1, "parent_id": "gone"}),
+    ]
+    expanded = retriever.expand_to_parents(docs)
+    assert [doc.page_content for doc in expanded] == ["loose", "the parent", "orphan"]
+    # the matched child's metadata is kept, the input left untouched
+    assert expanded[1].metadata["chunk_id"] == 0
+    assert "child_chunk_ids" not in docs[1].metadata
+
+
+def test_without_parents_chunks_are_returned_as_indexed(tmp_path):
+    rag = build(tmp_path, parent_chunk_size=0)
+    rag.ingest_stream(io.BytesIO(section("echo").encode()), "doc.txt")
+    docs = rag.retriver.retrieve("echo sentence 2")
+    assert docs
+    assert rag.retriver.expand_to_parents(docs) == docs
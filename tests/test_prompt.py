@@ -0,0 +1,63 @@
+"""
+PromptBuilder: the context budget is counted in tokens, and the prompt
+layout depends on the document set, not on the order retrieval returned it in.
+"""
+
+import random
+
+from langchain.schema import Document
+
+from engine.prompt import PromptBuilder
+from fakes import WhitespaceTokenizer
+
+
+def doc(doc_id, chunk_id, words):
+    text = " ".join(f"{doc_id}{chunk_id}w{i}" for i in range(words))
+    return Document(page_content=text, metadata={"doc_id": doc_id, "chunk_id": chunk_id})
+
+
+def test_budget_is_counted_in_tokens():
+    # "[Document n]" is 2 tokens, so each block is 102 tokens but ~1000 characters
+    docs = [doc("d", i, 100) for i in range(5)]
+    builder = PromptBuilder(max_context_tokens=250, tokenizer=WhitespaceTokenizer())
+    prompt = builder.build("q", docs)
+    assert prompt.prefix.count("[Document ") == 2
+    # relevance order decides what fits
+    assert docs[0].page_content in prompt.prefix
+    assert docs[1].page_content in prompt.prefix
+
+
+def test_reordered_documents_give_byte_identical_prompts():
+    docs = [doc(doc_id, chunk_id, 20) for doc_id in "abc" for chunk_id in range(4)]
+    prompts = set()
+    for seed in range(5):
+        shuffled = list(docs)
+        random.Random(seed).shuffle(shuffled)
+        # a fresh builder each time: the memo must not be what makes them equal
+        builder = PromptBuilder(tokenizer=WhitespaceTokenizer())
+        prompts.add(builder.build("what?", shuffled).text.encode("utf-8"))
+    assert len(prompts) == 1
+
+    builder = PromptBuilder(tokenizer=WhitespaceTokenizer())
+    first = builder.build("what?", docs)
+    second = builder.build("what?", list(reversed(docs)))
+    assert first.text == second.text
+    assert builder.stats()["memo_hits"] == 1
+    assert builder.stats()["prefix_hits"] == 1
+
+
+def test_special_token_text_is_counted_as_text():
+    class StrictTokenizer(WhitespaceTokenizer):
+        """Raises on special tokens in encode(), as tiktoken does."""
+
+        def encode(self, text):
+            if "<|endoftext|>" in text:
+                raise ValueError("special token")
+            return super().encode(text)
+
+        def encode_ordinary(self, text):
+            return super().encode(text)
+
+    builder = PromptBuilder(tokenizer=StrictTokenizer())
+    docs = [Document(page_content="ends here <|endoftext|>", metadata={"chunk_id": 1})]
+    assert "<|endoftext|>" in builder.build("q", docs).prefix
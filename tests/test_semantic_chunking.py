@@ -0,0 +1,80 @@
+"""
+Semantic chunking in ChunkDocument: cuts fall where neighbouring sentences
+change topic, never leave a chunk under `min_tokens` at a topic cut, and
+never let one grow past `max_tokens`.
+"""
+
+import numpy as np
+from langchain.schema import Document
+
+from data_pipeline.preprocessor import ChunkDocument
+from fakes import WhitespaceTokenizer
+
+TOPICS = ["apple", "rocket", "violin"]
+
+
+class TopicEmbedder:
+    """Embeds a sentence as the one-hot vector of the topic word it contains."""
+
+    def embed_documents(self, texts):
+        vectors = np.zeros((len(texts), len(TOPICS)), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for j, topic in enumerate(TOPICS):
+                if topic in text:
+                    vectors[i, j] = 1.0
+        return vectors.tolist()
+
+
+def sentences(topic, count, words=5):
+    return [f"The {topic} " + " ".join(f"w{i}" for i in range(words - 2)) + "." for _ in range(count)]
+
+
+def chunker(**configs):
+    configs = {"mode": "semantic", "min_tokens": 1, "max_tokens": 1000, **configs}
+    return ChunkDocument(configs, embedding_model=TopicEmbedder(), tokenizer=WhitespaceTokenizer())
+
+
+def test_cuts_fall_on_topic_changes():
+    groups = [sentences(topic, 4) for topic in TOPICS]
+    text = " ".join(sentence for group in groups for sentence in group)
+    chunks = chunker(breakpoint_percentile=10)._split(text)
+    assert chunks == [" ".join(group) for group in groups]
+
+
+def test_single_topic_is_not_cut():
+    text = " ".join(sentences("apple", 6))
+    assert chunker()._split(text) == [text]
+
+
+def test_no_topic_cut_before_min_tokens():
+    groups = [sentences("apple", 1), sentences("rocket", 4), sentences("violin", 4)]
+    text = " ".join(sentence for group in groups for sentence in group)
+    # the lone apple sentence is 5 tokens, under min_tokens: it joins the rocket ones
+    chunks = chunker(breakpoint_percentile=10, min_tokens=10)._split(text)
+    assert chunks == [" ".join(groups[0] + groups[1]), " ".join(groups[2])]
+
+
+def test_chunks_never_exceed_max_tokens():
+    tokenizer = WhitespaceTokenizer()
+    text = " ".join(sentences("apple", 30))
+    chunks = chunker(max_tokens=22)._split(text)
+    assert len(chunks) > 1
+    assert all(len(tokenizer.encode(chunk)) <= 22 for chunk in chunks)
+    assert " ".join(chunks) == text
+
+
+def test_oversized_sentence_is_split_by_tokens():
+    sentence = "The apple " + " ".join(f"w{i}" for i in range(48)) + "."
+    chunks = chunker(max_tokens=20)._split(sentence)
+    assert [len(chunk.split()) for chunk in chunks] == [20, 20, 10]
+    assert " ".join(chunks) == sentence
+
+
+def test_chunk_ids_count_across_pages():
+    pages = [
+        Document(page_content=" ".join(sentences(topic, 3)), metadata={"doc_id": "d", "page": i})
+        for i, topic in enumerate(TOPICS)
+    ]
+    chunks = list(chunker().chunk_stream(pages))
+    assert [chunk.metadata["chunk_id"] for chunk in chunks] == list(range(len(chunks)))
+    assert [chunk.metadata["page"] for chunk in chunks] == [0, 1, 2]
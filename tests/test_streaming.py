@@ -0,0 +1,98 @@
+"""
+run_stages: items flow through every stage in order, bounded queues hold
+back a fast producer, and the first error reaches the caller and stops
+every stage thread.
+"""
+
+import itertools
+import threading
+import time
+
+import pytest
+
+from data_pipeline.streaming import run_stages
+
+
+class CountingSource:
+    """Endless source that counts the items taken from it."""
+
+    def __init__(self):
+        self.produced = 0
+
+    def __iter__(self):
+        for i in itertools.count():
+            self.produced += 1
+            yield i
+
+
+def double(items):
+    for item in items:
+        yield item * 2
+
+
+def batch(items, size=3):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stage_threads():
+    return {thread for thread in threading.enumerate() if thread.daemon}
+
+
+def test_items_pass_through_every_stage_in_order():
+    assert list(run_stages(range(10), [double, batch])) == [
+        [0, 2, 4],
+        [6, 8, 10],
+        [12, 14, 16],
+        [18],
+    ]
+    assert list(run_stages([], [double])) == []
+
+
+def test_slow_consumer_holds_back_the_source():
+    before = stage_threads()
+    source = CountingSource()
+    maxsize = 4
+    stream = run_stages(source, [double, double], maxsize=maxsize)
+    assert [next(stream) for _ in range(5)] == [0, 4, 8, 12, 16]
+    time.sleep(0.3)
+    # each of the three queues holds maxsize items, each thread one more in hand
+    assert source.produced <= 5 + 3 * (maxsize + 1)
+    stream.close()
+    # closing the stream stops and joins every stage thread
+    assert stage_threads() == before
+
+
+@pytest.mark.parametrize("failing", [0, 1, 2])
+def test_first_error_is_raised_and_stops_every_stage(failing):
+    before = stage_threads()
+    source = CountingSource()
+
+    def fail_on_eighth(items):
+        for n, item in enumerate(items):
+            if n == 7:
+                raise ValueError("bad item")
+            yield item
+
+    def failing_source():
+        yield from range(7)
+        raise ValueError("bad item")
+
+    stages = [double, double]
+    if failing == 0:
+        stream = run_stages(failing_source(), stages)
+    else:
+        stages.insert(failing - 1, fail_on_eighth)
+        stream = run_stages(source, stages)
+    seen = []
+    with pytest.raises(ValueError, match="bad item"):
+        for item in stream:
+            seen.append(item)
+    assert seen == [4 * i for i in range(7)]
+    assert stage_threads() == before
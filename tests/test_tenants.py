@@ -0,0 +1,118 @@
+"""
+TenantIndexManager: LRU eviction under the memory budget, pinned tenants
+staying resident, and one load per cold tenant.
+"""
+
+import threading
+
+import numpy as np
+import pytest
+
+from data_pipeline.indexer import Indexer
+from data_pipeline.tenants import TenantIndexManager
+
+DIMS = 8
+VECTORS = 100
+
+
+class CountingFactory:
+    """make_indexer that counts the indexes it builds and can be made to fail."""
+
+    def __init__(self):
+        self.built = 0
+        self.fail = False
+        self.lock = threading.Lock()
+
+    def __call__(self, tenant_dir):
+        with self.lock:
+            self.built += 1
+        if self.fail:
+            raise OSError("disk gone")
+        return Indexer(DIMS, "IVF", "cosine", n_list=1, m=1)
+
+
+def populate(manager, tenant_id):
+    with manager.use(tenant_id) as tenant:
+        tenant.indexer.add(np.random.default_rng(0).random((VECTORS, DIMS), dtype="float32"))
+        tenant.save()
+        return tenant.nbytes
+
+
+@pytest.fixture
+def sizes(tmp_path):
+    """Bytes one populated tenant takes."""
+    manager = TenantIndexManager(str(tmp_path / "probe"), CountingFactory(), 1 << 30, mmap=False)
+    return populate(manager, "probe")
+
+
+def make_manager(tmp_path, budget, factory=None):
+    return TenantIndexManager(str(tmp_path / "tenants"), factory or CountingFactory(), budget, mmap=False)
+
+
+def test_least_recently_used_tenant_is_evicted(tmp_path, sizes):
+    manager = make_manager(tmp_path, budget=2 * sizes)
+    for tenant_id in ("a", "b", "c"):
+        populate(manager, tenant_id)
+    assert manager.stats()["resident"] == ["b", "c"]
+    assert manager.resident_bytes <= manager.memory_budget
+
+    # using b makes c the least recently used
+    with manager.use("b"):
+        pass
+    with manager.use("a") as tenant:
+        assert tenant.indexer.ntotal == VECTORS
+    assert manager.stats()["resident"] == ["b", "a"]
+
+
+def test_pinned_tenants_are_not_evicted(tmp_path, sizes):
+    manager = make_manager(tmp_path, budget=sizes)
+    for tenant_id in ("a", "b", "c"):
+        populate(manager, tenant_id)
+    assert manager.stats()["resident"] == ["c"]
+
+    with manager.use("a"), manager.use("b"):
+        # over budget: c goes, a and b are in use
+        assert manager.stats()["resident"] == ["a", "b"]
+        assert manager.resident_bytes > manager.memory_budget
+    # b is released first, and evicted while a is still in use
+    assert manager.stats()["resident"] == ["a"]
+    assert manager.resident_bytes <= manager.memory_budget
+
+
+def test_concurrent_cold_acquires_load_once(tmp_path, sizes):
+    factory = CountingFactory()
+    manager = make_manager(tmp_path, budget=10 * sizes, factory=factory)
+    populate(manager, "a")
+    manager.close()
+    factory.built = 0
+
+    barrier = threading.Barrier(8)
+    tenants = []
+
+    def worker():
+        barrier.wait()
+        tenant = manager.acquire("a")
+        tenants.append(tenant)
+        manager.release(tenant)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert factory.built == 1
+    assert len({id(tenant) for tenant in tenants}) == 1
+    assert manager._load_locks == {}
+
+
+def test_load_locks_do_not_outlive_loads(tmp_path, sizes):
+    factory = CountingFactory()
+    manager = make_manager(tmp_path, budget=sizes, factory=factory)
+    for i in range(20):
+        populate(manager, f"t{i}")
+    assert manager._load_locks == {}
+
+    factory.fail = True
+    with pytest.raises(OSError):
+        manager.acquire("broken")
+    assert manager._load_locks == {}
@@ -0,0 +1,119 @@
+"""
+Tail-based sampling in common.tracing: slow and failed traces are always
+kept, the rest at `sample_rate`; spans nest across awaits and the
+StageScheduler's threads, and the file exporter writes OTLP/JSON lines.
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from common import tracing
+from engine.scheduler import StageScheduler
+
+
+class ListExporter:
+    def __init__(self):
+        self.payloads = []
+
+    def export(self, payload):
+        self.payloads.append(payload)
+
+
+def spans(payload):
+    return payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+
+
+def run_request(tracer, delay=0.0, fail=False):
+    with tracer.trace("POST /api/chat"):
+        with tracing.span("rag.run"):
+            time.sleep(delay)
+            if fail:
+                raise RuntimeError("boom")
+
+
+def test_slow_traces_are_kept_and_fast_ones_sampled():
+    exporter = ListExporter()
+    tracer = tracing.Tracer(exporter, slow_threshold=0.05, sample_rate=0.0)
+    for _ in range(20):
+        run_request(tracer)
+    run_request(tracer, delay=0.06)
+    assert tracer.stats() == {"kept": 1, "dropped": 20}
+    [payload] = exporter.payloads
+    root = spans(payload)[0]
+    assert int(root["endTimeUnixNano"]) - int(root["startTimeUnixNano"]) >= 0.05e9
+
+    tracer = tracing.Tracer(ListExporter(), slow_threshold=60.0, sample_rate=1.0)
+    for _ in range(5):
+        run_request(tracer)
+    assert tracer.stats() == {"kept": 5, "dropped": 0}
+
+
+def test_failed_traces_are_kept_with_an_error_status():
+    exporter = ListExporter()
+    tracer = tracing.Tracer(exporter, slow_threshold=60.0, sample_rate=0.0)
+    with pytest.raises(RuntimeError):
+        run_request(tracer, fail=True)
+    [root, child] = spans(exporter.payloads[0])
+    assert child["status"] == {"code": tracing.STATUS_ERROR, "message": "RuntimeError('boom')"}
+    assert root["status"]["code"] == tracing.STATUS_ERROR
+
+
+def test_spans_nest_across_awaits_and_stage_threads():
+    exporter = ListExporter()
+    tracer = tracing.Tracer(exporter, slow_threshold=0.0)
+    scheduler = StageScheduler(max_workers=2)
+
+    def search():
+        tracing.set_attribute("retrieve.candidates", 7)
+        with tracing.span("fetch_docs"):
+            pass
+
+    async def request():
+        with tracer.trace("POST /api/chat", **{"http.method": "POST"}):
+            timings = {}
+            await asyncio.gather(
+                scheduler.run(timings, "embed", lambda: None),
+                scheduler.run(timings, "search", search),
+            )
+
+    try:
+        asyncio.run(request())
+    finally:
+        scheduler.shutdown()
+
+    by_name = {span["name"]: span for span in spans(exporter.payloads[0])}
+    root = by_name["POST /api/chat"]
+    assert "parentSpanId" not in root
+    assert root["kind"] == tracing.SPAN_KIND_SERVER
+    assert by_name["embed"]["parentSpanId"] == root["spanId"]
+    assert by_name["search"]["parentSpanId"] == root["spanId"]
+    assert by_name["fetch_docs"]["parentSpanId"] == by_name["search"]["spanId"]
+    assert {"key": "retrieve.candidates", "value": {"intValue": "7"}} in by_name["search"]["attributes"]
+    assert len({span["traceId"] for span in by_name.values()}) == 1
+
+
+def test_file_exporter_writes_one_otlp_trace_per_line(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    tracer = tracing.Tracer(tracing.FileExporter(str(path)), slow_threshold=0.0)
+    for _ in range(3):
+        run_request(tracer)
+    lines = path.read_text().splitlines()
+    assert len(lines) == 3
+    resource = json.loads(lines[0])["resourceSpans"][0]
+    assert resource["resource"]["attributes"] == [
+        {"key": "service.name", "value": {"stringValue": "rag-api"}}
+    ]
+    assert [span["name"] for span in spans(json.loads(lines[0]))] == ["POST /api/chat", "rag.run"]
+
+
+def test_untraced_code_records_nothing():
+    tracer = tracing.Tracer(exporter=None)
+    with tracer.trace("POST /api/chat") as root:
+        assert root is None
+        with tracing.span("rag.run") as child:
+            assert child is None
+        tracing.set_attribute("ignored", 1)
+        assert not tracing.is_recording()